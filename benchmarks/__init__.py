@@ -0,0 +1,2 @@
+# מדידות ביצועים של הבוט והספרייה. כל מודול רץ בנפרד, למשל:
+#   python -m benchmarks.bench_intent_parser
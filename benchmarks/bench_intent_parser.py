@@ -0,0 +1,47 @@
+import re
+import timeit
+from intent_parser import parse_message
+
+# הודעות אופייניות שנשלחות לבוט
+CORPUS = [
+    'חלב', 'חלב 2', '3 עגבניות', 'לחם אחיד', 'ביצים 12', 'קניתי חלב', 'מחק לחם 2',
+    'הסרתי גבינה צהובה', 'רשימה', 'הצג רשימה', 'מחק רשימה', 'קטגוריות', 'שנה קטגוריה',
+    'עוגה: מאפים', 'שוקולד מריר 70%', '7up 6', 'נייר טואלט 32', 'קנינו במבה', 'פסטה פנה 2',
+    'שמן זית כתית מעולה', 'מחק קטגוריה', 'תפוחי אדמה 3', 'קנו אבטיח', 'חומוס',
+]
+
+
+# המימוש הקודם מתוך handle_message, להשוואה
+def legacy_parse(text):
+    for phrases in (['רשימה', 'הצג רשימה', 'הראה רשימה'], ['מחק רשימה', 'נקה רשימה', 'אפס רשימה'],
+                    ['קטגוריות', 'הצג קטגוריות', 'הראה קטגוריות'], ['החלף קטגוריה', 'שנה קטגוריה', 'עדכן קטגוריה'],
+                    ['מחק קטגוריה', 'הסר קטגוריה', 'הסר קטגוריות']):
+        if text.lower() in phrases:
+            return 'command', text
+    if ':' in text:
+        item_name, category = text.split(':', 1)
+        return item_name.strip(), category.strip()
+    lowered = text.lower()
+    remove_words = ['קניתי', 'קנית', 'קנו', 'קנתה', 'קנו', 'מחק', 'הסר', 'הסרתי', 'הסיר', 'קנה', 'קנתה']
+    action = 'remove' if any(word in lowered for word in remove_words) else 'add'
+    clean_text = re.sub(r'קניתי|קנית|קנו|קנתה|קנו|מחק|הסר|הסרתי|הסיר|קנה|קנתה', '', text, flags=re.IGNORECASE).strip()
+    if action == 'remove':
+        return action, clean_text
+    quantity = int(re.findall(r'\d+', clean_text)[0]) if re.search(r'\d+', clean_text) else 1
+    return action, clean_text.replace(str(quantity), '').strip(), quantity
+
+
+def run_corpus(parse):
+    for text in CORPUS:
+        parse(text)
+
+
+def main(repeat=5, number=2000):
+    messages = len(CORPUS) * number
+    for name, parse in (('legacy', legacy_parse), ('intent_parser', parse_message)):
+        best = min(timeit.repeat(lambda: run_corpus(parse), repeat=repeat, number=number))
+        print(f"{name:>14}: {best / messages * 1e6:.2f} µs/message ({messages} messages)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""Offline load test: synthetic updates through the real handlers, no network.
+
+    python -m benchmarks.load_test [--workload add-heavy] [--items 10,1000,100000]
+                                   [--updates 500] [--output results.json] [--compare old.json]
+
+Each (workload, list size) scenario runs in a fresh process and a temporary
+directory, with the list preloaded to the given size. Reported per scenario:
+throughput, p50/p99 latency of a single update, Bot API calls and bytes, file
+I/O bytes and traced memory per update. Results are written as JSON so that
+runs from different commits can be compared with --compare.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_ID = 100
+USER = {'id': CHAT_ID, 'is_bot': False, 'first_name': 'Load'}
+DEFAULT_ITEMS = (10, 1000, 100000)
+DEFAULT_UPDATES = 500
+TRACED_UPDATES = 200  # עדכונים שנמדדים עם tracemalloc (איטי, ולכן בנפרד מהמדידה המתוזמנת)
+
+CATEGORY_NAMES = ['מוצרי חלב', 'ירקות', 'פירות', 'מצרכי יסוד', 'ניקיון', 'קפואים', 'משקאות', 'מאפים']
+
+
+# שם הפריט ה-i ברשימה שנטענת מראש
+def preload_name(i):
+    return f"מוצר_{i}"
+
+
+# הטקסט וכפתורי המקלדת של הקריאה האחרונה ל-API שהייתה בה הודעה
+def last_reply(calls):
+    for method, parameters in reversed(calls):
+        if 'text' in parameters:
+            markup = parameters.get('reply_markup') or {}
+            buttons = [button for row in markup.get('inline_keyboard', []) for button in row]
+            return parameters['text'], buttons
+    return None, []
+
+
+# פעולות המשך שהבוט מבקש: תשובה לשאלת קטגוריה ואישור/ביטול של פריט קיים
+def follow_ups(rng, calls):
+    while True:
+        text, buttons = last_reply(calls)
+        if text and 'מה הקטגוריה' in text:
+            calls = yield ('text', rng.choice(CATEGORY_NAMES))
+        elif text and text.startswith('⚠️') and buttons:
+            calls = yield ('press', rng.choice(buttons)['callback_data'])
+        else:
+            return
+
+
+def press_page_buttons(rng, calls, presses):
+    for _ in range(presses):
+        _, buttons = last_reply(calls)
+        forward = [button for button in buttons if button['text'].startswith('הבא')]
+        if not forward:
+            return
+        calls = yield ('press', forward[0]['callback_data'])
+
+
+# עומסי עבודה: גנרטורים שמחזירים ('text', הודעה) או ('press', callback_data)
+# ומקבלים בחזרה את הקריאות ל-API שהעדכון הקודם גרם להן
+def add_heavy(rng, names):
+    for new in itertools.count():
+        r = rng.random()
+        if r < 0.45:
+            text = f"{rng.choice(names)} {rng.randint(1, 5)}"
+        elif r < 0.75:
+            text = f"חדש_{new}"
+        elif r < 0.9:
+            text = f"קניתי {rng.choice(names)}"
+        else:
+            text = ", ".join(rng.sample(names, 3))
+        calls = yield ('text', text)
+        yield from follow_ups(rng, calls)
+
+
+def list_heavy(rng, names):
+    while True:
+        r = rng.random()
+        if r < 0.5:
+            calls = yield ('text', 'רשימה')
+            yield from press_page_buttons(rng, calls, rng.randint(0, 3))
+        elif r < 0.8:
+            calls = yield ('text', 'קטגוריות')
+            _, buttons = last_reply(calls)
+            if buttons:
+                calls = yield ('press', rng.choice(buttons)['callback_data'])
+                yield from press_page_buttons(rng, calls, 1)
+        else:
+            calls = yield ('text', rng.choice(names))
+            yield from follow_ups(rng, calls)
+
+
+def category_churn(rng, names):
+    while True:
+        r = rng.random()
+        if r < 0.35:
+            yield ('text', f"{rng.choice(names)}: {rng.choice(CATEGORY_NAMES)}")
+        elif r < 0.6:
+            calls = yield ('text', 'החלף קטגוריה')
+            _, buttons = last_reply(calls)
+            if buttons:
+                calls = yield ('press', rng.choice(buttons)['callback_data'])
+                _, buttons = last_reply(calls)
+                if buttons:
+                    yield ('press', rng.choice(buttons)['callback_data'])
+        elif r < 0.8:
+            calls = yield ('text', 'מחק קטגוריה')
+            _, buttons = last_reply(calls)
+            if buttons:
+                yield ('press', buttons[0]['callback_data'])
+        else:
+            calls = yield ('text', 'קטגוריות')
+            _, buttons = last_reply(calls)
+            if buttons:
+                yield ('press', rng.choice(buttons)['callback_data'])
+
+
+WORKLOADS = {
+    'add-heavy': add_heavy,
+    'list-heavy': list_heavy,
+    'category-churn': category_churn,
+}
+
+
+# בניית עדכון טלגרם (כמו שמגיע מ-getUpdates או מה-webhook) מפעולה של עומס העבודה
+def make_update(update_id, kind, value):
+    chat = {'id': CHAT_ID, 'type': 'private'}
+    if kind == 'text':
+        return {'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': 0, 'chat': chat, 'from': USER, 'text': value,
+        }}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': USER, 'chat_instance': '1', 'data': value,
+        'message': {'message_id': update_id, 'date': 0, 'chat': chat, 'text': '.'},
+    }}
+
+
+# מוני קריאה/כתיבה לקבצים של התהליך (לינוקס בלבד)
+def io_counters():
+    try:
+        with open('/proc/self/io', 'r') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def percentile(samples, p):
+    return statistics.quantiles(samples, n=100, method='inclusive')[p - 1] if len(samples) > 1 else samples[0]
+
+
+# מזין את העדכונים של עומס העבודה ל-Application ומודד כל אחד
+class Driver:
+    def __init__(self, application, stub, workload):
+        self.application = application
+        self.stub = stub
+        self.workload = workload
+        self.update_id = 0
+        self.calls = None  # הקריאות ל-API של העדכון הקודם (None לפני העדכון הראשון)
+
+    async def run(self, count):
+        """Run count updates and return their latencies in seconds"""
+        from telegram import Update
+        latencies = []
+        for _ in range(count):
+            kind, value = next(self.workload) if self.calls is None else self.workload.send(self.calls)
+            self.update_id += 1
+            update = Update.de_json(make_update(self.update_id, kind, value), self.application.bot)
+            before = len(self.stub.calls)
+            start = time.perf_counter()
+            await self.application.process_update(update)
+            latencies.append(time.perf_counter() - start)
+            self.calls = self.stub.calls[before:]
+        return latencies
+
+
+async def run_async(workload_name, items, updates, seed):
+    from telegram.ext import Application
+    import telegram_bot
+    from outbound import TelegramRateLimiter
+    from benchmarks.stub_transport import StubRequest
+
+    store = telegram_bot.get_store()
+    shopping_list = telegram_bot.load_shopping_list(CHAT_ID)
+    shopping_list.add_items(
+        (preload_name(i), 1 + i % 5, CATEGORY_NAMES[i % len(CATEGORY_NAMES)], None) for i in range(items)
+    )
+    telegram_bot.save_shopping_list(shopping_list, CHAT_ID)
+    store.flush()
+
+    stub = StubRequest()
+    builder = Application.builder().request(stub).get_updates_request(stub)
+    # מגבלות הקצב של טלגרם היו הופכות את המדידה למדידה של המגביל
+    unlimited = TelegramRateLimiter(global_rate=1e9, global_burst=1e9, chat_rate=1e9, chat_burst=1e9)
+    application = telegram_bot.build_application('123456:load', builder=builder, use_updater=False,
+                                                  rate_limiter=unlimited)
+    rng = random.Random(seed)
+    names = [preload_name(i) for i in range(min(items, 500))] + list(telegram_bot.load_categories(CHAT_ID))
+    driver = Driver(application, stub, WORKLOADS[workload_name](rng, names))
+
+    async with application:
+        await application.start()
+        io_before = io_counters()
+        calls_before, bytes_before = len(stub.calls), stub.bytes_sent
+        start = time.perf_counter()
+        latencies = await driver.run(updates)
+        store.flush()
+        elapsed = time.perf_counter() - start
+        io_after = io_counters()
+        api_calls, api_bytes = len(stub.calls) - calls_before, stub.bytes_sent - bytes_before
+
+        tracemalloc.start()
+        traced = min(TRACED_UPDATES, updates)
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await driver.run(traced)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await application.stop()
+        await telegram_bot.drain_outbound(application)
+
+    result = {
+        'workload': workload_name,
+        'items': items,
+        'updates': updates,
+        'seconds': round(elapsed, 4),
+        'updates_per_second': round(updates / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'max': round(max(latencies) * 1000, 3),
+        },
+        'api_calls_per_update': round(api_calls / updates, 3),
+        'api_bytes_per_update': round(api_bytes / updates, 1),
+        'retained_bytes_per_update': round((current - baseline) / traced, 1),
+        'peak_traced_kib': round((peak - baseline) / 1024, 1),
+    }
+    if io_before and io_after:
+        result['io_read_bytes_per_update'] = round((io_after[0] - io_before[0]) / updates, 1)
+        result['io_write_bytes_per_update'] = round((io_after[1] - io_before[1]) / updates, 1)
+    return result
+
+
+def run_scenario(workload_name, items, updates, seed):
+    """Run one scenario in a temporary directory (called in a fresh process)"""
+    os.environ['PARTNER_CHAT_ID'] = str(CHAT_ID)
+    os.environ.setdefault('BOT_TOKEN', '123456:load')
+    workdir = tempfile.mkdtemp(prefix='load_')
+    shutil.copy(os.path.join(REPO_DIR, 'categories.json'), workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        result = asyncio.run(run_async(workload_name, items, updates, seed))
+        import telegram_bot
+        telegram_bot.get_store().close()
+        return result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# השוואה לתוצאות של ריצה קודמת (למשל מ-commit אחר)
+def compare(results, previous_path):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    old = {(r['workload'], r['items']): r for r in previous['results']}
+    print(f"\ncompared to {previous_path} (commit {previous.get('commit')}):")
+    for result in results:
+        before = old.get((result['workload'], result['items']))
+        if before is None:
+            continue
+        throughput = (result['updates_per_second'] / before['updates_per_second'] - 1) * 100
+        p99 = (result['latency_ms']['p99'] / before['latency_ms']['p99'] - 1) * 100
+        print(f"{result['workload']:>15} {result['items']:>7} items: "
+              f"throughput {throughput:+.1f}%, p99 {p99:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workload', choices=sorted(WORKLOADS) + ['all'], default='all')
+    parser.add_argument('--items', default=','.join(map(str, DEFAULT_ITEMS)),
+                        help='comma separated list sizes to preload')
+    parser.add_argument('--updates', type=int, default=DEFAULT_UPDATES)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='load_test_results.json')
+    parser.add_argument('--compare', help='previous results file to compare against')
+    args = parser.parse_args()
+
+    workloads = sorted(WORKLOADS) if args.workload == 'all' else [args.workload]
+    sizes = [int(size) for size in args.items.split(',')]
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for workload_name, items in itertools.product(workloads, sizes):
+        # תהליך חדש לכל תרחיש: מאגר, טבלת כפתורים וזיכרון נקיים
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_scenario, workload_name, items, args.updates, args.seed).result()
+        results.append(result)
+        print(f"{workload_name:>15} {items:>7} items: {result['updates_per_second']:>8} updates/s, "
+              f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms, "
+              f"{result['api_calls_per_update']} calls/update, "
+              f"{result.get('io_write_bytes_per_update', '?')} bytes written/update")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\nresults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Replay recorded Telegram updates against the webhook server, fully offline.
+
+    python -m benchmarks.replay_webhook [updates.json]
+
+The bot runs in a temporary directory with a stubbed Telegram transport; the
+updates are POSTed to the aiohttp app through a local test server.
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_UPDATES = os.path.join(REPO_DIR, 'benchmarks', 'updates', 'recorded_updates.json')
+CHAT_ID = '100'
+SECRET = 'replay-secret'
+
+os.environ.setdefault('PARTNER_CHAT_ID', CHAT_ID)
+os.environ.setdefault('BOT_TOKEN', '123456:replay')
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+from telegram.ext import Application  # noqa: E402
+import telegram_bot  # noqa: E402
+from webhook_server import create_web_app, SECRET_TOKEN_HEADER  # noqa: E402
+from benchmarks.stub_transport import StubRequest  # noqa: E402
+
+
+# המתנה עד שכל העדכונים בתור טופלו
+async def wait_for_idle(application, stub, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    calls = -1
+    while asyncio.get_running_loop().time() < deadline:
+        if application.update_queue.empty() and len(stub.calls) == calls:
+            return
+        calls = len(stub.calls)
+        await asyncio.sleep(0.05)
+
+
+async def replay(updates):
+    stub = StubRequest()
+    builder = Application.builder().request(stub).get_updates_request(stub)
+    application = telegram_bot.build_application(os.environ['BOT_TOKEN'], builder=builder, use_updater=False)
+    client = TestClient(TestServer(create_web_app(application, secret_token=SECRET)))
+    await client.start_server()
+    async with application:
+        await application.start()
+
+        # עדכון בלי הסוד הנכון נדחה
+        response = await client.post('/telegram', json=updates[0])
+        assert response.status == 403, response.status
+
+        for update in updates:
+            response = await client.post('/telegram', json=update, headers={SECRET_TOKEN_HEADER: SECRET})
+            assert response.status == 200, response.status
+            await wait_for_idle(application, stub)
+
+        response = await client.get('/health')
+        health = await response.json()
+        await application.stop()
+    await client.close()
+    return stub, health
+
+
+def main(path=DEFAULT_UPDATES):
+    with open(path, 'r', encoding='utf-8') as f:
+        updates = json.load(f)
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    shutil.copy(os.path.join(REPO_DIR, 'categories.json'), workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        stub, health = asyncio.run(replay(updates))
+        telegram_bot.get_store().close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+    for text in stub.sent_texts():
+        print(f"--- {text}")
+    print(f"\n{len(updates)} updates replayed, {len(stub.calls)} Bot API calls, health: {health}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,96 @@
+"""Startup benchmark: import time of each entry point, with a regression budget.
+
+    python -m benchmarks.startup_time [--repeat 7] [--top 8] [--budget-scale 1.0]
+
+Each entry point is imported in a fresh interpreter under `python -X importtime`
+and the median cumulative import time is compared with its budget. Entry
+points must also not load the modules listed in FORBIDDEN_IMPORTS (heavy
+dependencies that should only load on first use). Exits with status 1 when
+a budget is exceeded or a forbidden module is imported, so it can gate CI.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# תקציב זמן ייבוא (מילישניות) לכל נקודת כניסה. זמני מכונה משתנים - ההגבלה החשובה היא FORBIDDEN_IMPORTS
+BUDGETS_MS = {
+    'shopping_list': 40,
+    'shopping_list_gui': 80,
+    'telegram_bot': 600,
+}
+
+# מודולים שנקודת הכניסה לא אמורה לטעון בהפעלה
+FORBIDDEN_IMPORTS = {
+    'shopping_list': ('telegram', 'sqlite3', 'argparse', 'tkinter'),
+    'shopping_list_gui': ('telegram', 'httpx', 'asyncio', 'sqlite3'),
+    'telegram_bot': ('aiohttp', 'sqlite3', 'cProfile', 'pstats', 'tkinter'),
+}
+
+
+# ייבוא אחד בתהליך חדש. מחזיר את זמן הייבוא המצטבר של המודול (מיקרו-שניות) ואת
+# {מודול: זמן מצטבר} של כל מה שנטען בגללו (בלי הייבואים של הפעלת המפרש עצמו)
+def import_times(module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_DIR, capture_output=True, text=True,
+        # בלי טוקן, כדי שהבוט לא יתחבר לשום מקום גם אם משהו ירוץ בזמן הייבוא
+        env={**os.environ, 'BOT_TOKEN': ''},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    subtree = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # הפלט מסודר כך שכל מודול מופיע אחרי מה שהוא טען; שורה ברמה העליונה סוגרת עץ
+        top_level = not name.startswith('  ')
+        if top_level and name.strip() == module:
+            return int(cumulative_us), subtree
+        if top_level:
+            subtree = {}
+        else:
+            subtree.setdefault(name.strip(), int(cumulative_us))
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def measure(module, repeat):
+    runs = sorted((import_times(module) for _ in range(repeat)), key=lambda run: run[0])
+    total_us, subtree = runs[len(runs) // 2]
+    # הייבואים הכבדים ביותר של הריצה החציונית
+    slowest = sorted(subtree.items(), key=lambda entry: entry[1], reverse=True)
+    return total_us / 1000, set(subtree), slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--top', type=int, default=8, help='slowest imports to list per entry point')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='multiply every budget (for slow CI machines)')
+    args = parser.parse_args()
+
+    failures = []
+    for module, budget in BUDGETS_MS.items():
+        budget *= args.budget_scale
+        total_ms, loaded, slowest = measure(module, args.repeat)
+        status = 'ok' if total_ms <= budget else 'OVER BUDGET'
+        print(f"{module:>18}: {total_ms:8.1f} ms (budget {budget:.0f} ms) {status}")
+        if total_ms > budget:
+            failures.append(f"{module} took {total_ms:.1f} ms, budget {budget:.0f} ms")
+        for name in FORBIDDEN_IMPORTS.get(module, ()):
+            if name in loaded:
+                failures.append(f"{module} imports {name} at startup")
+        for name, cumulative_us in slowest[:args.top]:
+            print(f"{'':>20}{cumulative_us / 1000:8.1f} ms  {name}")
+
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
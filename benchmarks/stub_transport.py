@@ -0,0 +1,46 @@
+import json
+import time
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'ShoppingListBot', 'username': 'shopping_list_bot'}
+
+
+# תחליף לשכבת ה-HTTP של python-telegram-bot: לא יוצא לרשת, רושם כל קריאה ומחזיר תשובה מזויפת
+class StubRequest(BaseRequest):
+    def __init__(self):
+        self.calls = []  # (method, parameters)
+        self.bytes_sent = 0
+        self._message_id = 1000
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data is not None else {}
+        if request_data is not None:
+            self.bytes_sent += len(request_data.json_payload)
+        self.calls.append((api_method, parameters))
+        return 200, json.dumps({'ok': True, 'result': self._result(api_method, parameters)}).encode()
+
+    def _result(self, api_method, parameters):
+        if api_method == 'getMe':
+            return BOT_USER
+        if api_method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+            if api_method == 'sendMessage':
+                self._message_id += 1
+            return {
+                'message_id': parameters.get('message_id', self._message_id),
+                'date': int(time.time()),
+                'chat': {'id': int(parameters.get('chat_id', 0)), 'type': 'private'},
+                'from': BOT_USER,
+                'text': parameters.get('text', ''),
+            }
+        return True
+
+    def sent_texts(self):
+        return [parameters.get('text') for method, parameters in self.calls if 'text' in parameters]
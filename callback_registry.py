@@ -0,0 +1,57 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# מגבלת טלגרם על אורך callback_data (בבתים)
+CALLBACK_DATA_LIMIT = 64
+
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+# טבלת אסימונים קצרים בצד השרת: כל כפתור נושא רק אסימון, והפעולה והנתונים נשמרים כאן.
+# הטבלה מוגבלת בגודל (הישן ביותר נזרק) ובזמן (אסימון פג אחרי ttl שניות).
+class CallbackRegistry:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token -> (expires_at, action, payload)
+        self._tokens = {}  # (action, payload items) -> token, כדי שאותו כפתור יקבל אותו אסימון
+
+    def __len__(self):
+        return len(self._entries)
+
+    def register(self, action, **payload):
+        """Return a short token for (action, payload) to use as callback_data"""
+        key = (action, tuple(sorted(payload.items())))
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None:
+                token = secrets.token_urlsafe(8)
+                while token in self._entries:
+                    token = secrets.token_urlsafe(8)
+                self._tokens[key] = token
+            self._entries[token] = (expires_at, action, payload)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+        return token
+
+    def resolve(self, token):
+        """Return (action, payload) for a token, or None if it is unknown or expired"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, action, payload = entry
+            if expires_at < time.monotonic():
+                self._evict(token)
+                return None
+            return action, payload
+
+    def _evict(self, token):
+        _, action, payload = self._entries.pop(token)
+        self._tokens.pop((action, tuple(sorted(payload.items()))), None)
@@ -0,0 +1,105 @@
+import math
+from collections import defaultdict
+from fuzzy_index import normalize
+
+# החלקת Laplace לספירות של מאפיינים שלא נראו בקטגוריה
+DEFAULT_ALPHA = 0.5
+
+# הביטחון מחושב רק יחסית לקטגוריות שכבר נלמדו (עם קטגוריה אחת הוא תמיד 1), ולכן ניחוש
+# מוחזר רק כשיש מספיק קטגוריות ופריטים, לפריט יש מאפיין משותף עם הקטגוריה שנבחרה,
+# והיא עדיפה בבירור על הקטגוריה השנייה
+DEFAULT_MIN_CATEGORIES = 3
+DEFAULT_MIN_ITEMS = 10
+DEFAULT_MIN_MARGIN = 0.5
+
+_NGRAM = 3
+
+
+# מאפייני שם פריט: המילים אחרי נרמול, ו-3-grams של אותיות (עם רווח בקצוות)
+def _features(name):
+    normalized = normalize(name)
+    features = {f"w:{word}" for word in normalized.split(' ')}
+    padded = f" {normalized} "
+    features.update(padded[i:i + _NGRAM] for i in range(len(padded) - _NGRAM + 1))
+    return features
+
+
+# מסווג naive Bayes שמנחש קטגוריה לפריט חדש לפי מילון הקטגוריות הקבועות.
+# לומד בהדרגה - כל הוספה או מחיקה במילון מעדכנת ספירות, בלי אימון מחדש.
+class CategoryPredictor:
+    def __init__(self, items=(), alpha=DEFAULT_ALPHA, min_categories=DEFAULT_MIN_CATEGORIES,
+                 min_items=DEFAULT_MIN_ITEMS, min_margin=DEFAULT_MIN_MARGIN):
+        """items is an iterable of (item name, category) pairs to learn from"""
+        self.alpha = alpha
+        self.min_categories = min_categories
+        self.min_items = min_items
+        self.min_margin = min_margin
+        self._labels = {}  # שם פריט -> קטגוריה
+        self._postings = defaultdict(dict)  # מאפיין -> {קטגוריה: מספר פריטים}
+        self._category_items = {}  # קטגוריה -> מספר פריטים
+        self._category_features = {}  # קטגוריה -> סך המאפיינים של הפריטים שלה
+        for name, category in items:
+            self.learn(name, category)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def learn(self, name, category):
+        """Learn that name belongs to category (None forgets the name)"""
+        self.forget(name)
+        if category is None:
+            return
+        features = _features(name)
+        self._labels[name] = category
+        self._category_items[category] = self._category_items.get(category, 0) + 1
+        self._category_features[category] = self._category_features.get(category, 0) + len(features)
+        for feature in features:
+            counts = self._postings[feature]
+            counts[category] = counts.get(category, 0) + 1
+
+    def forget(self, name):
+        category = self._labels.pop(name, None)
+        if category is None:
+            return
+        features = _features(name)
+        self._category_features[category] -= len(features)
+        self._category_items[category] -= 1
+        if not self._category_items[category]:
+            del self._category_items[category]
+            del self._category_features[category]
+        for feature in features:
+            counts = self._postings[feature]
+            counts[category] -= 1
+            if not counts[category]:
+                del counts[category]
+                if not counts:
+                    del self._postings[feature]
+
+    # הסתברות a posteriori של כל קטגוריה, עם חישוב דליל: רק קטגוריות שבהן מאפיין מופיע
+    # מקבלות תוספת, כך שהעלות היא בערך מספר הקטגוריות + אורך הרשימות של המאפיינים
+    def predict(self, name):
+        """Return (category, confidence) of the most likely category, or (None, 0.0) when unsure"""
+        if len(self._category_items) < self.min_categories or len(self._labels) < self.min_items:
+            return None, 0.0
+        features = _features(name)
+        vocabulary = len(self._postings) * self.alpha
+        scores = {
+            category: math.log(count) - len(features) * math.log(self._category_features[category] + vocabulary)
+            for category, count in self._category_items.items()
+        }
+        log_alpha = math.log(self.alpha)
+        for feature in features:
+            counts = self._postings.get(feature)
+            if counts is None:
+                continue
+            for category, count in counts.items():
+                scores[category] += math.log(count + self.alpha) - log_alpha
+        best = max(scores, key=scores.get)
+        if not any(best in self._postings.get(feature, ()) for feature in features):
+            return None, 0.0
+        top = scores[best]
+        confidence = 1 / sum(math.exp(score - top) for score in scores.values())
+        runner_up = max((score for category, score in scores.items() if category != best), default=-math.inf)
+        if confidence * (1 - math.exp(runner_up - top)) < self.min_margin:
+            return None, 0.0
+        return best, confidence
@@ -0,0 +1,190 @@
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from shopping_list import write_json_atomic
+
+# סוגי השאלות שהבוט יכול לחכות לתשובה עליהן
+PROMPT_CATEGORY = 'category'
+
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_CLEANUP_INTERVAL = 60
+
+# קבצים עם הסיומות האלה נשמרים כמסד SQLite, כל שם אחר כ-JSON
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# שאלה שממתינה לתשובה: סוג, נתונים (למשל שם הפריט) וזמן התפוגה (שניות מ-epoch)
+Prompt = namedtuple('Prompt', ['kind', 'data', 'expires_at'])
+
+
+# שמירה של כל השאלות לקובץ JSON אחד: כל שאלה ותשובה כותבות את כל הקובץ מחדש,
+# ולכן זה מתאים רק למעט משתמשים (ל-SQLite נכתבת שורה אחת לכל שינוי)
+class _JsonPersistence:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return {}
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            return {tuple(key.split(':', 1)): Prompt(*value) for key, value in json.load(f).items()}
+
+    def save(self, changes, prompts):
+        write_json_atomic(self.filename, {f"{chat_id}:{user_id}": list(value)
+                                          for (chat_id, user_id), value in prompts.items()})
+
+    def close(self):
+        pass
+
+
+# שמירה ב-SQLite: כל שינוי כותב או מוחק שורה אחת, ו-commit אחד לכל קבוצת שינויים
+class _SQLitePersistence:
+    def __init__(self, filename):
+        import sqlite3  # נטען רק כשבוחרים בשמירה ל-SQLite
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS prompts ("
+            "chat_id TEXT NOT NULL, user_id TEXT NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (chat_id, user_id))"
+        )
+        self._connection.commit()
+
+    def load(self):
+        rows = self._connection.execute(
+            "SELECT chat_id, user_id, kind, data, expires_at FROM prompts ORDER BY expires_at"
+        )
+        return {(chat_id, user_id): Prompt(kind, json.loads(data), expires_at)
+                for chat_id, user_id, kind, data, expires_at in rows}
+
+    def save(self, changes, prompts):
+        for key, prompt in changes:
+            if prompt is None:
+                self._connection.execute("DELETE FROM prompts WHERE chat_id = ? AND user_id = ?", key)
+            else:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO prompts (chat_id, user_id, kind, data, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (*key, prompt.kind, json.dumps(prompt.data, ensure_ascii=False), prompt.expires_at),
+                )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+# מצב השיחה: שאלה אחת שממתינה לתשובה לכל (צ'אט, משתמש), כך שכמה משתמשים באותו צ'אט
+# יכולים לענות כל אחד על השאלה שלו. השאלות פגות אחרי ttl שניות, ומספרן חסום -
+# כשעוברים את max_entries נמחקת השאלה הוותיקה ביותר.
+class ConversationState:
+    def __init__(self, filename=None, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        """filename ending with .db/.sqlite/.sqlite3 persists to SQLite, any other name to JSON, None keeps memory only"""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # לפי סדר התפוגה: כל שאלה חדשה נכנסת לסוף עם אותו ttl, ולכן הפגות נמצאות תמיד בהתחלה
+        self._prompts = OrderedDict()
+        self._persistence = None
+        if filename:
+            if filename.endswith(SQLITE_EXTENSIONS):
+                self._persistence = _SQLitePersistence(filename)
+            else:
+                self._persistence = _JsonPersistence(filename)
+            try:
+                loaded = self._persistence.load()
+            except (OSError, ValueError, TypeError) as e:
+                print(f"Error loading conversation state: {str(e)}")
+                loaded = {}
+            for key, prompt in sorted(loaded.items(), key=lambda entry: entry[1].expires_at):
+                self._prompts[key] = prompt
+            self.expire()
+
+    def __len__(self):
+        return len(self._prompts)
+
+    def ask(self, chat_id, user_id, kind, **data):
+        """Remember that the bot asked user_id in chat_id a question of the given kind"""
+        key = (str(chat_id), str(user_id))
+        prompt = Prompt(kind, data, time.time() + self.ttl)
+        with self._lock:
+            self._prompts.pop(key, None)
+            self._prompts[key] = prompt
+            changes = [(key, prompt)]
+            while len(self._prompts) > self.max_entries:
+                oldest, _ = self._prompts.popitem(last=False)
+                changes.append((oldest, None))
+            self._save(changes)
+
+    def pending(self, chat_id, user_id):
+        """Return the Prompt waiting for an answer from user_id in chat_id, or None"""
+        key = (str(chat_id), str(user_id))
+        prompt = self._prompts.get(key)
+        if prompt is not None and prompt.expires_at <= time.time():
+            self.resolve(chat_id, user_id)
+            return None
+        return prompt
+
+    def resolve(self, chat_id, user_id):
+        """Forget the question asked of user_id in chat_id and return it"""
+        key = (str(chat_id), str(user_id))
+        with self._lock:
+            prompt = self._prompts.pop(key, None)
+            if prompt is not None:
+                self._save([(key, None)])
+            return prompt
+
+    def expire(self, now=None):
+        """Drop every expired question and return how many were dropped"""
+        now = now if now is not None else time.time()
+        changes = []
+        with self._lock:
+            while self._prompts:
+                key, prompt = next(iter(self._prompts.items()))
+                if prompt.expires_at > now:
+                    break
+                del self._prompts[key]
+                changes.append((key, None))
+            if changes:
+                self._save(changes)
+        return len(changes)
+
+    def _save(self, changes):
+        """changes is a list of (key, Prompt) pairs, with None for removed keys"""
+        if self._persistence is None:
+            return
+        try:
+            self._persistence.save(changes, self._prompts)
+        except Exception as e:
+            print(f"Error saving conversation state: {str(e)}")
+
+    def close(self):
+        if self._persistence is not None:
+            self._persistence.close()
+            self._persistence = None
+
+
+# ניקוי תקופתי של שאלות שפג תוקפן
+async def expire_periodically(state, interval=DEFAULT_CLEANUP_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        state.expire()
+
+
+_conversations = None
+
+
+# קבלת מצב השיחה המשותף לתהליך (נוצר בפעם הראשונה לפי משתני הסביבה).
+# כברירת מחדל השאלות נשמרות רק בזיכרון; CONVERSATION_STATE_FILE=<שם>.db שומר אותן גם
+# אחרי הפעלה מחדש
+def get_conversations():
+    global _conversations
+    if _conversations is None:
+        _conversations = ConversationState(
+            filename=os.getenv('CONVERSATION_STATE_FILE'),
+            ttl=int(os.getenv('CONVERSATION_TTL_SECONDS', DEFAULT_TTL_SECONDS)),
+            max_entries=int(os.getenv('CONVERSATION_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        )
+        atexit.register(_conversations.close)
+    return _conversations
@@ -0,0 +1,132 @@
+import re
+from collections import defaultdict
+
+# ציון מינימלי כדי להתייחס להתאמה כאל אותו פריט
+DEFAULT_THRESHOLD = 0.7
+
+# ציון של שמות שונים רק בכתיב (רווחים, ניקוד, אותיות סופיות) - בוודאות אותו פריט
+FOLDED_MATCH_SCORE = 0.99
+
+# ציון של שמות שזהים רק אחרי הורדת סיומת רבים או ה' הידיעה. ההורדה לא תמיד נכונה
+# ("פירות" הופך ל"פירה"), ולכן זו רק הצעה ולא זהות
+NORMALIZED_MATCH_SCORE = 0.95
+
+_FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+_NIQQUD_RE = re.compile(r'[\u0591-\u05C7]')
+_SPACES_RE = re.compile(r'\s+')
+# סיומת רבים -> צורת היחיד המשותפת (אחרי החלפת אותיות סופיות)
+_PLURAL_SUFFIXES = (('ימ', ''), ('ות', 'ה'))
+_NGRAM = 3
+
+
+# אחידות כתיב בלבד (רווחים, ניקוד, אותיות סופיות, אותיות כפולות) - שומר על התחלת השם,
+# ולכן מתאים גם להשלמה בזמן הקלדה
+def fold(name):
+    """Return name without niqqud, final letters, doubled vav/yod or extra spaces"""
+    name = _NIQQUD_RE.sub('', name)
+    name = _SPACES_RE.sub(' ', name).strip().lower().translate(_FINAL_LETTERS)
+    return name.replace('יי', 'י').replace('וו', 'ו')
+
+
+# נרמול שם פריט בעברית: רווחים, ניקוד, אותיות סופיות, ה' הידיעה וסיומות יחיד/רבים
+def normalize(name):
+    """Return the form of a Hebrew item name that spelling variants share"""
+    words = fold(name).split(' ')
+    last = words[-1]
+    for suffix, singular in _PLURAL_SUFFIXES:
+        if last.endswith(suffix) and len(last) - len(suffix) >= 2:
+            last = last[:-len(suffix)] + singular
+            break
+    words[-1] = last
+    if len(words[0]) >= 4 and words[0].startswith('ה'):
+        words[0] = words[0][1:]
+    return ' '.join(words)
+
+
+# כל הצורות המנורמלות שתחתן שם נחשב לאותו פריט. רבים בסיומת ים יכול להיות גם של
+# יחיד בסיומת ה ("ביצים" - "ביצה"), אבל לא כל שם שנגמר ב-ה הוא יחיד של משהו ("חלבה" אינה "חלב"),
+# ולכן הצורה הנוספת נוצרת רק מהרבים
+def normalized_forms(name):
+    normalized = normalize(name)
+    last = fold(name).split(' ')[-1]
+    if last.endswith('ימ') and len(last) >= 4:
+        return normalized, normalized + 'ה'
+    return (normalized,)
+
+
+def _ngrams(normalized):
+    padded = f" {normalized} "
+    return {padded[i:i + _NGRAM] for i in range(len(padded) - _NGRAM + 1)}
+
+
+# אינדקס n-grams של אותיות לחיפוש שמות דומים, עם עדכון בהוספה ובמחיקה
+class FuzzyIndex:
+    def __init__(self, names=()):
+        self._by_folded = defaultdict(set)
+        self._by_normalized = defaultdict(set)
+        self._postings = defaultdict(set)
+        self._gram_counts = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._gram_counts)
+
+    def add(self, name):
+        if name in self._gram_counts:
+            return
+        forms = normalized_forms(name)
+        grams = _ngrams(forms[0])
+        self._by_folded[fold(name)].add(name)
+        for form in forms:
+            self._by_normalized[form].add(name)
+        for gram in grams:
+            self._postings[gram].add(name)
+        self._gram_counts[name] = len(grams)
+
+    def discard(self, name):
+        if name not in self._gram_counts:
+            return
+        del self._gram_counts[name]
+        folded = fold(name)
+        self._by_folded[folded].discard(name)
+        if not self._by_folded[folded]:
+            del self._by_folded[folded]
+        forms = normalized_forms(name)
+        for form in forms:
+            self._by_normalized[form].discard(name)
+            if not self._by_normalized[form]:
+                del self._by_normalized[form]
+        for gram in _ngrams(forms[0]):
+            postings = self._postings[gram]
+            postings.discard(name)
+            if not postings:
+                del self._postings[gram]
+
+    def match(self, query, threshold=DEFAULT_THRESHOLD):
+        """Return (name, score) of the closest indexed name, or (None, 0.0) below threshold"""
+        if query in self._gram_counts:
+            return query, 1.0
+        same = self._by_folded.get(fold(query))
+        if same:
+            return min(same), FOLDED_MATCH_SCORE
+        forms = normalized_forms(query)
+        for form in forms:
+            same = self._by_normalized.get(form)
+            if same:
+                return min(same), NORMALIZED_MATCH_SCORE
+        normalized = forms[0]
+        # מקדם Dice על n-grams משותפים, רק למועמדים שחולקים לפחות n-gram אחד
+        grams = _ngrams(normalized)
+        shared = defaultdict(int)
+        for gram in grams:
+            for name in self._postings.get(gram, ()):
+                shared[name] += 1
+        best_name, best_score = None, 0.0
+        for name, count in shared.items():
+            score = 2 * count / (len(grams) + self._gram_counts[name])
+            if score > best_score:
+                best_name, best_score = name, score
+        if best_score < threshold:
+            return None, 0.0
+        return best_name, best_score
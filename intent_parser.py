@@ -0,0 +1,154 @@
+import re
+from collections import namedtuple
+
+# פעולות אפשריות של הודעה
+ACTION_ADD = 'add'
+ACTION_REMOVE = 'remove'
+ACTION_BUY = 'buy'  # הסרה של פריט שנקנה ("קניתי חלב") - נרשמת גם בהיסטוריית הקניות
+ACTION_SET_CATEGORY = 'set_category'
+ACTION_COMMAND = 'command'
+
+# פקודות מיוחדות
+COMMAND_LIST = 'list'
+COMMAND_CLEAR = 'clear'
+COMMAND_CATEGORIES = 'categories'
+COMMAND_CHANGE_CATEGORY = 'change_category'
+COMMAND_DELETE_CATEGORY = 'delete_category'
+COMMAND_SUMMARY = 'summary'
+COMMAND_SUGGEST = 'suggest'
+
+COMMAND_PHRASES = {
+    COMMAND_LIST: ['רשימה', 'הצג רשימה', 'הראה רשימה'],
+    COMMAND_CLEAR: ['מחק רשימה', 'נקה רשימה', 'אפס רשימה'],
+    COMMAND_CATEGORIES: ['קטגוריות', 'הצג קטגוריות', 'הראה קטגוריות'],
+    COMMAND_CHANGE_CATEGORY: ['החלף קטגוריה', 'שנה קטגוריה', 'עדכן קטגוריה'],
+    COMMAND_DELETE_CATEGORY: ['מחק קטגוריה', 'הסר קטגוריה', 'הסר קטגוריות'],
+    COMMAND_SUMMARY: ['סכום', 'סכום כולל', 'סיכום'],
+    COMMAND_SUGGEST: ['הצעות', 'מה חסר', 'מה צריך לקנות'],
+}
+
+# מילים שמסמנות הסרה של פריט מהרשימה; מילות הקנייה מסמנות גם שהפריט נקנה
+PURCHASE_WORDS = ['קניתי', 'קנית', 'קנינו', 'קנו', 'קנתה', 'קנה']
+REMOVE_WORDS = PURCHASE_WORDS + ['מחק', 'מחקתי', 'הסר', 'הסרתי', 'הסיר']
+_PURCHASE_WORDS = frozenset(PURCHASE_WORDS)
+
+# יחידות מידה שנכתבות מיד אחרי הכמות ("חלב 2 ליטר"): צורת כתיבה -> השם שנשמר בפריט
+UNIT_WORDS = {
+    'ליטר': 'ליטר', 'ליטרים': 'ליטר',
+    'ק"ג': 'ק"ג', 'ק״ג': 'ק"ג', 'קג': 'ק"ג', 'קילו': 'ק"ג', 'קילוגרם': 'ק"ג',
+    'גרם': 'גרם',
+    'יחידה': 'יחידות', 'יחידות': 'יחידות',
+    'חבילה': 'חבילות', 'חבילות': 'חבילות',
+}
+
+# מיפוי ביטוי (אחרי נרמול רווחים ואותיות) -> פקודה, לבדיקה ב-O(1)
+_COMMANDS = {
+    phrase: command
+    for command, phrases in COMMAND_PHRASES.items()
+    for phrase in phrases
+}
+
+def _alternatives(words):
+    return '|'.join(sorted(map(re.escape, words), key=len, reverse=True))
+
+
+# ביטוי אחד שמזהה במעבר יחיד גם מילות הסרה וגם מספרים שעומדים בפני עצמם (עם יחידת מידה
+# אחריהם, אם יש). מספר שצמוד לאותיות (למשל "7up") נשאר חלק משם הפריט.
+# שבר נכתב עם נקודה או פסיק ("1.5", "1,5").
+_TOKEN_RE = re.compile(
+    r'(?<!\S)(?:(?P<verb>' + _alternatives(REMOVE_WORDS) + r')'
+    r'|(?P<number>\d+(?:[.,]\d+)?)(?:\s+(?P<unit>' + _alternatives(UNIT_WORDS) + r'))?)(?!\S)'
+)
+_SPACES_RE = re.compile(r'\s+')
+# פסיק בין שתי ספרות הוא נקודה עשרונית ולא מפריד בין פריטים
+_SEPARATORS_RE = re.compile(r'(?<!\d),|,(?!\d)|\n')
+
+Intent = namedtuple('Intent', ['action', 'item', 'quantity', 'category', 'command', 'unit'], defaults=(None,))
+
+
+# פענוח הודעה חופשית לכוונה מובנית
+def parse_message(text):
+    """Parse a free-text message into an Intent(action, item, quantity, category, command, unit)
+
+    quantity is None when the message gives a quantity that is not positive.
+    """
+    text = text.strip()
+    command = _COMMANDS.get(_SPACES_RE.sub(' ', text).lower())
+    if command is not None:
+        return Intent(ACTION_COMMAND, None, None, None, command)
+
+    # "פריט: קטגוריה"
+    if ':' in text:
+        item_name, category = text.split(':', 1)
+        return Intent(ACTION_SET_CATEGORY, item_name.strip(), 1, category.strip(), None)
+
+    action, item_name, quantity, unit = _parse_item(text)
+    return Intent(action, item_name, quantity, None, None, unit)
+
+
+# פענוח קטע טקסט של פריט בודד: (פעולה, שם פריט, כמות, יחידה)
+# כמות שאינה גדולה מאפס ("חלב 0") מוחזרת כ-None, כדי שהבוט יענה עליה ולא יוסיף את הפריט
+def _parse_item(text):
+    action = ACTION_ADD
+    quantity = 1
+    unit = None
+    has_quantity = False
+    parts = []
+    position = 0
+    for match in _TOKEN_RE.finditer(text):
+        verb = match.group('verb')
+        if verb is not None:
+            # מילת מחיקה גוברת על מילת קנייה
+            action = ACTION_BUY if verb in _PURCHASE_WORDS and action != ACTION_REMOVE else ACTION_REMOVE
+        elif not has_quantity:
+            has_quantity = True
+            quantity = _quantity(match.group('number'))
+            unit = UNIT_WORDS.get(match.group('unit'))
+        else:
+            # רק המספר הראשון הוא הכמות - שאר המספרים שייכים לשם הפריט
+            continue
+        parts.append(text[position:match.start()])
+        position = match.end()
+    parts.append(text[position:])
+    item_name = _SPACES_RE.sub(' ', ''.join(parts)).strip()
+    return action, item_name, quantity, unit
+
+
+# כמות שלמה נשארת int (כדי שתוצג "2" ולא "2.0"), ושבר הופך ל-float
+def _quantity(number):
+    number = number.replace(',', '.')
+    quantity = float(number) if '.' in number else int(number)
+    return quantity if quantity > 0 else None
+
+
+# פיצול הודעה עם כמה פריטים ("חלב 2, לחם, ביצים 12") לרשימת כוונות
+def parse_items(text, is_known=None):
+    """Split a multi-item message on commas, new lines and "ו" into one Intent per item
+
+    A word starting with "ו" is split off only when is_known(word without the "ו")
+    is true and is_known(word) is not, so items like "ופל" stay whole.
+    A remove word anywhere in the message applies to all of its items.
+    """
+    fragments = []
+    for fragment in _SEPARATORS_RE.split(text):
+        fragments.extend(_split_conjunctions(fragment, is_known))
+    parsed = [_parse_item(fragment) for fragment in fragments]
+    actions = {p[0] for p in parsed}
+    action = next((a for a in (ACTION_REMOVE, ACTION_BUY) if a in actions), ACTION_ADD)
+    return [
+        Intent(action, item_name, quantity, None, None, unit)
+        for _, item_name, quantity, unit in parsed if item_name
+    ]
+
+
+def _split_conjunctions(fragment, is_known):
+    if is_known is None:
+        return [fragment]
+    words = fragment.split()
+    pieces = [[]]
+    for word in words:
+        if pieces[-1] and len(word) > 2 and word.startswith('ו') and is_known(word[1:]) and not is_known(word):
+            pieces.append([word[1:]])
+        else:
+            pieces[-1].append(word)
+    return [' '.join(piece) for piece in pieces]
@@ -0,0 +1,85 @@
+import time
+from decimal import Decimal
+
+# גרסת המבנה של קובץ הרשימה. גרסה 1 (בלי שדה version): items הוא שם -> כמות
+# (או שם -> מילון, בקבצים ישנים של הממשק הגרפי), והקטגוריות במילון categories נפרד.
+SCHEMA_VERSION = 2
+
+
+# המרה ל-Decimal דרך המחרוזת, כדי ש-6.1 יישאר 6.1 ולא 6.0999999999999996447...
+def to_decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+# פריט ברשימת הקניות. __slots__ חוסך את מילון התכונות של כל מופע
+class Item:
+    __slots__ = ('quantity', 'category', 'price', 'unit', 'added_by', 'added_at', 'updated_at')
+
+    def __init__(self, quantity=1, category=None, price=None, unit=None, added_by=None,
+                 added_at=None, updated_at=None):
+        self.quantity = quantity
+        self.category = category
+        self.price = price  # מחיר ליחידה
+        self.unit = unit  # למשל "ק\"ג" או "ליטר"
+        self.added_by = added_by
+        self.added_at = added_at if added_at is not None else int(time.time())
+        self.updated_at = updated_at if updated_at is not None else self.added_at
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Item({fields})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Item):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def total(self):
+        """Decimal price of the whole quantity, or None when the item has no price"""
+        return to_decimal(self.price) * to_decimal(self.quantity) if self.price is not None else None
+
+    def to_dict(self):
+        """Return the on-disk form: quantity always, other fields only when set"""
+        data = {'quantity': self.quantity}
+        for name in self.__slots__[1:]:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+
+# המרה של קובץ רשימה מכל גרסה קודמת לגרסה הנוכחית
+def migrate_snapshot(data):
+    """Return snapshot data in the SCHEMA_VERSION layout"""
+    version = data.get('version', 1)
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"Shopping list file version {version} is newer than supported ({SCHEMA_VERSION})")
+    while version < SCHEMA_VERSION:
+        data = MIGRATIONS[version](data)
+        version = data['version']
+    return data
+
+
+def _migrate_v1(data):
+    categories = data.get('categories', {})
+    items = {}
+    for name, value in data.get('items', {}).items():
+        if isinstance(value, dict):
+            item = {key: value[key] for key in Item.__slots__ if value.get(key) is not None}
+        else:
+            item = {'quantity': value}
+        item.setdefault('quantity', 1)
+        category = item.get('category', categories.get(name))
+        if category is not None:
+            item['category'] = category
+        items[name] = item
+    return {'version': 2, 'seq': data.get('seq', 0), 'items': items}
+
+
+MIGRATIONS = {
+    1: _migrate_v1,
+}
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+from shopping_list import ShoppingList, CHANGE_CLEARED, write_json_atomic
+
+DEFAULT_INTERVAL = 2
+
+OUTBOX_EXTENSION = '.changes'
+STATE_EXTENSION = '.state.json'
+
+# שדות הפריט שמסונכרנים; זמני ההוספה והעדכון הם מקומיים לכל עותק
+SYNCED_FIELDS = ('quantity', 'category', 'price', 'unit')
+
+
+def _content(item):
+    return {name: getattr(item, name) for name in SYNCED_FIELDS if getattr(item, name) is not None}
+
+
+# סנכרון של רשימה אחת בין כמה עותקים (הבוט, ממשק גרפי אחד או יותר) דרך תיקייה משותפת.
+#
+# כל עותק מחזיק לכל פריט את המצב האחרון שלו (או None לפריט שנמחק) עם חותמת
+# (שעון Lamport, מזהה עותק), והמצב עם החותמת הגדולה יותר גובר (last writer wins).
+# הכמות מסונכרנת כחלק מהמצב ולא כמונה: מחיקה "של הכל" בשני עותקים במקביל לא
+# מסתכמת לכמות שלילית, וכל העותקים מגיעים לאותה רשימה בכל סדר של קבלת השינויים.
+#
+# כל עותק כותב את השינויים שלו (רק הפריטים שהשתנו) כשורת JSON בסוף הקובץ
+# <תיקייה>/<מזהה>.changes, וקורא את הקבצים של האחרים מהמקום שבו עצר בפעם הקודמת.
+# המצב של העותק (החותמות והמקומות בקבצים) נשמר ב-<מזהה>.state.json.
+class ListSync:
+    def __init__(self, directory, replica):
+        self.directory = directory
+        self.replica = replica
+        self.shopping_list = None
+        self.clock = 0  # שעון Lamport: גדול מכל חותמת שהעותק ראה
+        self.seq = 0  # מספר קבוצת השינויים האחרונה שהעותק כתב
+        self._entries = {}  # שם -> [שעון, עותק, מצב או None]
+        self._offsets = {}  # קובץ של עותק אחר -> כמה בתים כבר נקראו ממנו
+        self._pending = {}  # שינויים מקומיים שעוד לא נכתבו: שם -> רשומה
+        self._applying = False
+        os.makedirs(directory, exist_ok=True)
+        self._outbox = os.path.join(directory, replica + OUTBOX_EXTENSION)
+        self._state_filename = os.path.join(directory, replica + STATE_EXTENSION)
+        if os.path.exists(self._state_filename):
+            try:
+                with open(self._state_filename, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.clock = state['clock']
+                self.seq = state['seq']
+                self._entries = state['entries']
+                self._offsets = state['offsets']
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading sync state: {str(e)}")
+
+    def materialize(self):
+        """Return a new ShoppingList holding the synced state (for a replica without its own file)"""
+        shopping_list = ShoppingList()
+        for name, (_, _, state) in self._entries.items():
+            if state is not None:
+                shopping_list.add_item(name, state['quantity'], state.get('category'), state.get('price'),
+                                       state.get('unit'))
+        return shopping_list
+
+    def attach(self, shopping_list, merge=False):
+        """Sync shopping_list from now on; where it differs from the synced state it counts as a local edit.
+        With merge, synced items missing from shopping_list are added to it instead of being deleted."""
+        if self.shopping_list is not None:
+            self.shopping_list.unsubscribe(self.on_list_change)
+        self.shopping_list = shopping_list
+        shopping_list.subscribe(self.on_list_change)
+        for name, item in shopping_list.items.items():
+            self._stamp(name)
+        for name, entry in list(self._entries.items()):
+            if entry[2] is not None and name not in shopping_list.items:
+                if merge:
+                    # רשימה שנטענה מקובץ (למשל גיבוי ישן) לא מוחקת פריטים שנוספו בעותקים האחרים
+                    self._applying = True
+                    try:
+                        self._apply(name, entry[2])
+                    finally:
+                        self._applying = False
+                else:
+                    self._stamp(name)
+
+    def on_list_change(self, change):
+        if self._applying:
+            return
+        if change.kind == CHANGE_CLEARED:
+            for name, entry in list(self._entries.items()):
+                if entry[2] is not None:
+                    self._stamp(name)
+        else:
+            self._stamp(change.name)
+
+    # חותמת חדשה לפריט שהשתנה ברשימה המקומית (אם המצב שלו באמת שונה)
+    def _stamp(self, name):
+        item = self.shopping_list.items.get(name)
+        state = _content(item) if item is not None else None
+        entry = self._entries.get(name)
+        if entry is not None and entry[2] == state:
+            return
+        if entry is None and state is None:
+            return
+        self.clock += 1
+        entry = self._entries[name] = [self.clock, self.replica, state]
+        self._pending[name] = entry
+
+    def sync(self):
+        """Write pending local changes, merge the other replicas' new changes; return how many were applied"""
+        if self._pending:
+            self.seq += 1
+            changes = [[name, *entry] for name, entry in self._pending.items()]
+            self._pending = {}
+            with open(self._outbox, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'replica': self.replica, 'seq': self.seq, 'changes': changes},
+                                   ensure_ascii=False) + "\n")
+            written = True
+        else:
+            written = False
+        applied = 0
+        offsets = dict(self._offsets)
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(OUTBOX_EXTENSION) or filename == self.replica + OUTBOX_EXTENSION:
+                continue
+            for changes in self._read_new(filename):
+                for name, clock, replica, state in changes:
+                    applied += self._merge(name, clock, replica, state)
+        if written or offsets != self._offsets:
+            self._save()
+        return applied
+
+    # שורות שלמות שנוספו לקובץ של עותק אחר מאז הקריאה הקודמת (שורה שנכתבת ברגע זה תיקרא בפעם הבאה)
+    def _read_new(self, filename):
+        offset = self._offsets.get(filename, 0)
+        with open(os.path.join(self.directory, filename), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return []
+        self._offsets[filename] = offset + end
+        result = []
+        for line in data[:end].decode('utf-8').splitlines():
+            if line.strip():
+                result.append(json.loads(line)['changes'])
+        return result
+
+    # מיזוג שינוי של עותק אחר: מוחל רק אם החותמת שלו חדשה יותר מזו שכבר ידועה
+    def _merge(self, name, clock, replica, state):
+        self.clock = max(self.clock, clock)
+        entry = self._entries.get(name)
+        if entry is not None and (entry[0], entry[1]) >= (clock, replica):
+            return 0
+        self._entries[name] = [clock, replica, state]
+        self._pending.pop(name, None)
+        if self.shopping_list is not None:
+            self._applying = True
+            try:
+                self._apply(name, state)
+            finally:
+                self._applying = False
+        return 1
+
+    # עדכון הרשימה המקומית למצב שהתקבל, דרך הפעולות הרגילות שלה (יומן, סכומים, אירועי שינוי)
+    def _apply(self, name, state):
+        shopping_list = self.shopping_list
+        item = shopping_list.items.get(name)
+        if state is None:
+            if item is not None:
+                shopping_list.remove_item(name, item.quantity)
+            return
+        if item is not None and ((item.price is not None and state.get('price') is None)
+                                 or (item.unit is not None and state.get('unit') is None)):
+            # add_item לא מוחק מחיר או יחידה, ולכן הפריט מוסר ונוסף מחדש
+            shopping_list.remove_item(name, item.quantity)
+            item = None
+        if item is None:
+            shopping_list.add_item(name, state['quantity'], state.get('category'), state.get('price'),
+                                   state.get('unit'))
+            return
+        difference = state['quantity'] - item.quantity
+        if difference > 0 or state.get('price') != item.price or state.get('unit') != item.unit:
+            shopping_list.add_item(name, max(difference, 0), price=state.get('price'), unit=state.get('unit'))
+        if difference < 0:
+            shopping_list.remove_item(name, -difference)
+        if state.get('category') != item.category:
+            shopping_list.set_category(name, state.get('category'))
+
+    def _save(self):
+        write_json_atomic(self._state_filename, {
+            'replica': self.replica,
+            'clock': self.clock,
+            'seq': self.seq,
+            'offsets': self._offsets,
+            'entries': self._entries,
+        })
+
+
+# סנכרון תקופתי ברקע (בבוט): on_change נקרא אחרי כל סנכרון שהחיל שינויים
+async def sync_periodically(sync, lock, on_change, interval=DEFAULT_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with lock:
+                if sync.sync():
+                    on_change()
+        except (OSError, ValueError) as e:
+            print(f"Error syncing shopping list: {str(e)}")
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+from telegram.error import BadRequest
+from shopping_list import write_json_atomic
+
+LIVE_MESSAGES_FILENAME = "live_messages.json"
+DEFAULT_DEBOUNCE_MS = 1500
+
+
+# מה שההודעה מציגה כרגע, לצורך השוואה
+def _shown(text, markup):
+    return text, markup.to_dict() if markup else None
+
+
+# הודעת "רשימה חיה" אחת לכל צ'אט: במקום לשלוח רשימה חדשה, ההודעה נערכת אחרי כל שינוי.
+# שינויים רצופים נאספים - העריכה יוצאת debounce שניות אחרי השינוי הראשון ומציגה את כולם.
+class LiveListMessages:
+    def __init__(self, outbound, load_list, render, filename=LIVE_MESSAGES_FILENAME,
+                 debounce_ms=DEFAULT_DEBOUNCE_MS):
+        """load_list(chat_id) returns the chat's ShoppingList; render(shopping_list, page) returns (text, markup)"""
+        self.outbound = outbound
+        self.load_list = load_list
+        self.render = render
+        self.filename = filename
+        self.debounce = debounce_ms / 1000
+        self._loop = asyncio.get_running_loop()
+        self._messages = {}  # chat_id -> {'message_id', 'page'}
+        self._watchers = {}  # id(רשימה) -> צ'אטים שההודעה החיה שלהם מציגה אותה
+        self._last_sent = {}  # chat_id -> (טקסט, מקלדת) האחרונים שנשלחו
+        self._pending = {}  # chat_id -> עריכה מתוזמנת
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    self._messages = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading live messages: {str(e)}")
+        for chat_id in self._messages:
+            self._watch(chat_id)
+
+    def message_id(self, chat_id):
+        entry = self._messages.get(str(chat_id))
+        return entry['message_id'] if entry else None
+
+    def attach(self, chat_id, message_id, text, markup, page=0):
+        """Make message_id (currently showing text and markup) the chat's live list message.
+        Return the previous live message id, if any."""
+        chat_id = str(chat_id)
+        previous = self.message_id(chat_id)
+        self._messages[chat_id] = {'message_id': message_id, 'page': page}
+        self._last_sent[chat_id] = _shown(text, markup)
+        self._watch(chat_id)
+        self._save()
+        return previous
+
+    def detach(self, chat_id):
+        chat_id = str(chat_id)
+        if self._messages.pop(chat_id, None) is not None:
+            self._last_sent.pop(chat_id, None)
+            handle = self._pending.pop(chat_id, None)
+            if handle is not None:
+                handle.cancel()
+            self._save()
+
+    def set_page(self, chat_id, message_id, text, markup, page):
+        """Remember the page shown when the live message itself was paged"""
+        chat_id = str(chat_id)
+        entry = self._messages.get(chat_id)
+        if entry is not None and entry['message_id'] == message_id:
+            entry['page'] = page
+            self._last_sent[chat_id] = _shown(text, markup)
+            self._save()
+
+    def _watch(self, chat_id):
+        shopping_list = self.load_list(chat_id)
+        chats = self._watchers.get(id(shopping_list))
+        if chats is None:
+            chats = self._watchers[id(shopping_list)] = set()
+            shopping_list.subscribe(lambda change: self._on_change(chats))
+        chats.add(chat_id)
+
+    def _on_change(self, chats):
+        for chat_id in chats:
+            if chat_id in self._messages and chat_id not in self._pending:
+                self._pending[chat_id] = self._loop.call_later(self.debounce, self._flush, chat_id)
+
+    def _flush(self, chat_id):
+        self._pending.pop(chat_id, None)
+        entry = self._messages.get(chat_id)
+        if entry is None:
+            return
+        text, markup = self.render(self.load_list(chat_id), entry['page'])
+        shown = _shown(text, markup)
+        # טלגרם דוחה עריכה שלא משנה כלום
+        if self._last_sent.get(chat_id) == shown:
+            return
+        self._last_sent[chat_id] = shown
+        future = self.outbound.edit_message_text(
+            chat_id, entry['message_id'], text, parse_mode='Markdown', reply_markup=markup
+        )
+        future.add_done_callback(lambda f: self._edited(chat_id, entry['message_id'], f))
+
+    def _edited(self, chat_id, message_id, future):
+        error = future.exception()
+        if error is None:
+            return
+        if isinstance(error, BadRequest) and 'not modified' in error.message:
+            return
+        print(f"Error updating live list in {chat_id}: {str(error)}")
+        if isinstance(error, BadRequest) and self.message_id(chat_id) == message_id:
+            # ההודעה נמחקה או שאי אפשר לערוך אותה יותר
+            self._loop.call_soon_threadsafe(self.detach, chat_id)
+
+    def _save(self):
+        try:
+            write_json_atomic(self.filename, self._messages)
+        except OSError as e:
+            print(f"Error saving live messages: {str(e)}")
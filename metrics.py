@@ -0,0 +1,247 @@
+import asyncio
+import functools
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# גבולות ברירת המחדל של ההיסטוגרמות (שניות)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PROFILE_TOP_FUNCTIONS = 25
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in key) + '}'
+
+
+# מונה שרק עולה, עם תוויות
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+# ערך נוכחי (גודל רשימה, עומק תור)
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+# התפלגות ערכים (בעיקר זמני ריצה) בדליים מצטברים, כמו ב-Prometheus
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [מונים לכל דלי, סכום, כמות]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    result.append((self.name + '_bucket', key + (('le', repr(float(bound))),), bucket_count))
+                result.append((self.name + '_bucket', key + (('le', '+Inf'),), count))
+                result.append((self.name + '_sum', key, total))
+                result.append((self.name + '_count', key, count))
+        return result
+
+
+# כל המדדים של התהליך. collectors הם פונקציות שמחושבות רק בזמן הקריאה (גדלי רשימות, תורים)
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help):
+        return self._add(Gauge(name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """collect() is called on every read and updates gauges with current values"""
+        self._collectors.append(collect)
+
+    def _collect(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+
+    def exposition(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        self._collect()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Return a JSON-serializable dict of the current values (for structured logs)"""
+        self._collect()
+        result = {}
+        for metric in self._metrics:
+            for name, key, value in metric.samples():
+                # בלוג מספיקים הסכום והכמות של ההיסטוגרמה
+                if name.endswith('_bucket'):
+                    continue
+                label = ','.join(f"{k}={v}" for k, v in key)
+                result[f"{name}{{{label}}}" if label else name] = value
+        return result
+
+
+REGISTRY = Registry()
+
+handler_seconds = REGISTRY.histogram('bot_handler_seconds', 'Time spent in a bot handler, including lock waits')
+handler_errors = REGISTRY.counter('bot_handler_errors_total', 'Exceptions raised in bot handlers by type')
+persistence_seconds = REGISTRY.histogram('store_operation_seconds', 'Time spent loading and saving lists')
+bytes_written = REGISTRY.counter('store_bytes_written_total', 'Bytes written to data files')
+bytes_read = REGISTRY.counter('store_bytes_read_total', 'Bytes read from data files')
+telegram_seconds = REGISTRY.histogram('telegram_api_seconds', 'Duration of Bot API calls by method')
+telegram_errors = REGISTRY.counter('telegram_api_errors_total', 'Failed Bot API calls by method and type')
+# בלי תווית של משק בית או צ'אט: מספר הסדרות לא גדל עם מספר המשתמשים (ומזהי הצ'אטים לא נחשפים)
+lists_loaded = REGISTRY.gauge('shopping_lists_loaded', 'Number of lists loaded in memory')
+list_items = REGISTRY.gauge('shopping_list_items', 'Total number of items on the loaded lists')
+list_items_max = REGISTRY.gauge('shopping_list_items_max', 'Number of items on the largest loaded list')
+queue_depth = REGISTRY.gauge('queue_depth', 'Pending work in the update and outbound queues')
+
+
+def record_error(where, error):
+    handler_errors.inc(handler=where, type=type(error).__name__)
+
+
+# מדידת זמן ושגיאות של פונקציה (רגילה או async) תחת היסטוגרמה נתונה
+def timed(histogram, errors=None, **labels):
+    def decorator(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                except Exception as e:
+                    if errors is not None:
+                        errors.inc(type=type(e).__name__, **labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start, **labels)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                except Exception as e:
+                    if errors is not None:
+                        errors.inc(type=type(e).__name__, **labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+
+# הדפסה תקופתית של המדדים כשורת JSON (למצב polling, שאין בו שרת HTTP)
+async def log_metrics_periodically(interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps({'metrics': REGISTRY.snapshot(), 'time': time.time()}, ensure_ascii=False))
+
+
+# פרופיילינג לפי צ'אט, שאפשר להפעיל ולכבות בזמן ריצה.
+# שימו לב: cProfile מודד את כל ה-thread, ולכן בזמן await נמדדות גם משימות אחרות שרצות על הלולאה.
+class ChatProfiler:
+    def __init__(self):
+        self._profiles = {}  # chat_id -> cProfile.Profile
+
+    def is_enabled(self, chat_id):
+        return str(chat_id) in self._profiles
+
+    def toggle(self, chat_id):
+        """Start profiling the chat, or stop and return the report if it was already on"""
+        # cProfile ו-pstats נטענים רק כשמפעילים פרופיילינג - הם לא נחוצים בהפעלה רגילה
+        import cProfile
+        import pstats
+        chat_id = str(chat_id)
+        profile = self._profiles.pop(chat_id, None)
+        if profile is None:
+            self._profiles[chat_id] = cProfile.Profile()
+            return None
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        return output.getvalue()
+
+    @contextmanager
+    def profile(self, chat_id):
+        profile = self._profiles.get(str(chat_id))
+        if profile is None:
+            yield
+            return
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
@@ -0,0 +1,231 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict, deque
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.ext import BaseRateLimiter
+import metrics
+
+# מגבלות השליחה של טלגרם: כ-30 הודעות בשנייה בסך הכל, והודעה בשנייה לכל צ'אט
+GLOBAL_RATE = 30
+GLOBAL_BURST = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+DEFAULT_MAX_RETRIES = 3
+
+
+# דלי אסימונים: rate אסימונים בשנייה, עד capacity אסימונים שמורים
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def delay(self):
+        """Take one token and return how many seconds to wait before using it"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def refilled(self, now):
+        """Whether the bucket has been idle long enough to be full again, i.e. like a new bucket"""
+        return self._tokens + (now - self._updated) * self.rate >= self.capacity
+
+    async def acquire(self):
+        wait = self.delay()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# מגביל קצב לכל הקריאות של הבוט (גם תשובות רגילות של המטפלים): דלי גלובלי ודלי לכל צ'אט,
+# וניסיון חוזר אחרי RetryAfter (שגיאה 429) - זו השכבה היחידה שמנסה שוב אחרי 429.
+# דלי של צ'אט שהתמלא מחדש זהה לדלי חדש, ולכן הוא נמחק - מספר הדליים לא גדל עם מספר הצ'אטים
+class TelegramRateLimiter(BaseRateLimiter):
+    def __init__(self, global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST,
+                 chat_rate=CHAT_RATE, chat_burst=CHAT_BURST, max_retries=DEFAULT_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._chat_buckets = OrderedDict()  # chat_id -> דלי, מהשימוש הישן לחדש
+        self._retry_after = asyncio.Event()
+        self._retry_after.set()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id):
+        now = time.monotonic()
+        while self._chat_buckets and next(iter(self._chat_buckets.values())).refilled(now):
+            self._chat_buckets.popitem(last=False)
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_retries = rate_limit_args if rate_limit_args is not None else self.max_retries
+        chat_id = data.get('chat_id')
+        for attempt in range(max_retries + 1):
+            # בזמן המתנה אחרי 429 אף בקשה לא יוצאת
+            await self._retry_after.wait()
+            if chat_id is not None:
+                await self._chat_bucket(str(chat_id)).acquire()
+            await self._global_bucket.acquire()
+            start = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                metrics.telegram_errors.inc(method=endpoint, type='RetryAfter')
+                if attempt == max_retries:
+                    raise
+                self._retry_after.clear()
+                try:
+                    await asyncio.sleep(e.retry_after + 0.1)
+                finally:
+                    self._retry_after.set()
+            except Exception as e:
+                metrics.telegram_errors.inc(method=endpoint, type=type(e).__name__)
+                raise
+            finally:
+                metrics.telegram_seconds.observe(time.perf_counter() - start, method=endpoint)
+
+
+# פעולת שליחה אחת שממתינה בתור
+class _Job:
+    __slots__ = ('method', 'kwargs', 'futures', 'edit_key')
+
+    def __init__(self, method, kwargs, edit_key=None):
+        self.method = method
+        self.kwargs = kwargs
+        self.futures = [concurrent.futures.Future()]
+        self.edit_key = edit_key
+
+
+# תור שליחה יוצא: בוט אחד (מאגר חיבורי HTTP אחד) ולולאת asyncio אחת לכל השליחות.
+# הודעות לכל צ'אט נשלחות לפי הסדר, עריכות רצופות של אותה הודעה מתאחדות לעריכה אחת,
+# ושגיאות רשת זמניות מקבלות ניסיון חוזר עם המתנה הולכת וגדלה. RetryAfter (429) מטופל
+# במגביל הקצב של הבוט (TelegramRateLimiter) ולא כאן, כדי שבקשה לא תנוסה שוב בשתי שכבות.
+# אפשר לקרוא לכל הפונקציות מכל thread - הן מחזירות concurrent.futures.Future ולא חוסמות.
+class OutboundQueue:
+    def __init__(self, bot, max_retries=DEFAULT_MAX_RETRIES, backoff=0.5):
+        self.bot = bot
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._loop = None
+        self._thread = None
+        self._chat_jobs = {}  # chat_id -> deque של פעולות
+        self._workers = {}  # chat_id -> משימת asyncio ששולחת את התור של הצ'אט
+        self._pending_edits = {}  # (chat_id, message_id) -> עריכה שעוד לא נשלחה
+
+    def start(self, loop=None):
+        """Run on the given event loop, or on a new background thread when loop is None"""
+        if loop is not None:
+            self._loop = loop
+            return self
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="outbound", daemon=True)
+        self._thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.bot.initialize(), self._loop).result()
+        except Exception:
+            # למשל טוקן לא תקין - לא משאירים thread יתום
+            self._stop_thread()
+            raise
+        return self
+
+    def _stop_thread(self, timeout=None):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stop(self, timeout=10):
+        """Wait for queued messages to go out; stop the background thread if we own it"""
+        if self._loop is None:
+            return
+        if self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self.drain(), self._loop).result(timeout)
+            asyncio.run_coroutine_threadsafe(self.bot.shutdown(), self._loop).result(timeout)
+            self._stop_thread(timeout)
+
+    async def drain(self):
+        """Wait until every queued job has been sent (call from the queue's loop)"""
+        # פעולות שנשלחו ב-call_soon_threadsafe ועוד לא נכנסו לתור
+        await asyncio.sleep(0)
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    def pending(self):
+        """Number of jobs waiting to be sent"""
+        return sum(len(jobs) for jobs in self._chat_jobs.values())
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self._submit(_Job('send_message', dict(chat_id=chat_id, text=text, **kwargs)))
+
+    def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        job = _Job('edit_message_text', dict(chat_id=chat_id, message_id=message_id, text=text, **kwargs),
+                   edit_key=(str(chat_id), message_id))
+        return self._submit(job)
+
+    def broadcast(self, chat_ids, text, **kwargs):
+        """Queue the same message to several chats and return their futures"""
+        return [self.send_message(chat_id, text, **kwargs) for chat_id in chat_ids]
+
+    def _submit(self, job):
+        future = job.futures[0]
+        self._loop.call_soon_threadsafe(self._enqueue, job)
+        return future
+
+    def _enqueue(self, job):
+        if job.edit_key is not None:
+            pending = self._pending_edits.get(job.edit_key)
+            if pending is not None:
+                # עריכה שעוד לא נשלחה מוחלפת בתוכן החדש - נשלחת רק העריכה האחרונה
+                pending.kwargs = job.kwargs
+                pending.futures.extend(job.futures)
+                return
+            self._pending_edits[job.edit_key] = job
+        chat_id = str(job.kwargs['chat_id'])
+        self._chat_jobs.setdefault(chat_id, deque()).append(job)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = self._loop.create_task(self._run_chat(chat_id))
+
+    async def _run_chat(self, chat_id):
+        jobs = self._chat_jobs[chat_id]
+        try:
+            while jobs:
+                job = jobs.popleft()
+                if job.edit_key is not None:
+                    self._pending_edits.pop(job.edit_key, None)
+                try:
+                    result = await self._call(job)
+                except Exception as e:
+                    for future in job.futures:
+                        future.set_exception(e)
+                else:
+                    for future in job.futures:
+                        future.set_result(result)
+        finally:
+            del self._chat_jobs[chat_id]
+            del self._workers[chat_id]
+
+    async def _call(self, job):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await getattr(self.bot, job.method)(**job.kwargs)
+            except NetworkError as e:
+                # כולל TimedOut. BadRequest יורש מ-NetworkError אבל לא יצליח בניסיון חוזר
+                if isinstance(e, BadRequest) or attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
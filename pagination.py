@@ -0,0 +1,47 @@
+from itertools import islice
+
+# מגבלת האורך של הודעת טקסט בטלגרם
+MESSAGE_LIMIT = 4096
+
+# מספר הכפתורים בעמוד של מקלדת
+PAGE_SIZE = 20
+
+
+# פיצול טקסט ארוך לחלקים שכל אחד מהם נכנס בהודעה אחת (פיצול בסוף שורה)
+def split_message(text, limit=MESSAGE_LIMIT):
+    """Split text into chunks of at most limit characters, breaking between lines where possible"""
+    chunks = []
+    current = []
+    current_length = 0
+    for line in text.split('\n'):
+        # שורה ארוכה מדי נחתכת בכוח
+        while len(line) > limit:
+            if current:
+                chunks.append('\n'.join(current))
+                current, current_length = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        added_length = len(line) + (1 if current else 0)
+        if current and current_length + added_length > limit:
+            chunks.append('\n'.join(current))
+            current, current_length = [], 0
+            added_length = len(line)
+        current.append(line)
+        current_length += added_length
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+# מספר העמודים עבור count פריטים
+def page_count(count, page_size=PAGE_SIZE):
+    return max(1, -(-count // page_size))
+
+
+# הפריטים של עמוד אחד בלבד, בלי לבנות את שאר העמודים
+def page_slice(entries, count, page, page_size=PAGE_SIZE):
+    """Return (entries of the page, page clamped to range, number of pages)"""
+    pages = page_count(count, page_size)
+    page = min(max(page, 0), pages - 1)
+    start = page * page_size
+    return list(islice(entries, start, start + page_size)), page, pages
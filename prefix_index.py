@@ -0,0 +1,107 @@
+from bisect import bisect_left, insort
+from fuzzy_index import fold
+
+DEFAULT_LIMIT = 10
+
+
+# המפתחות של שם בחיפוש לפי התחלה: השם כולו, ועוד כל מילה שמתחילה באמצע השם
+# ("גבינה צהובה" נמצא גם כשמקלידים "צה")
+def _word_keys(text):
+    folded = fold(text)
+    keys = [folded]
+    position = folded.find(' ')
+    while position != -1:
+        keys.append(folded[position + 1:])
+        position = folded.find(' ', position + 1)
+    return keys
+
+
+# רשומה באינדקס: המפתח, NUL והשם. NUL קטן מכל תו, ולכן המיון הוא לפי המפתח ואז לפי השם,
+# ומחרוזת אחת מתמיינת מהר יותר מזוג
+def _entry(key, name):
+    return f"{key}\0{name}"
+
+
+# השלמה לפי התחלת המילה: מערך ממוין של רשומות (מפתח, שם) וחיפוש בינארי לתחילת הטווח.
+# שאילתה עולה O(log n) השוואות ועוד מספר התוצאות; הוספה ומחיקה מעדכנות את המערך
+# במקום (הזזת זיכרון רציפה, מהירה גם במאה אלף שמות) בלי בנייה מחדש.
+# לכל שם אפשר לצרף תווית (קטגוריה): התאמות לתווית מוחזרות אחרי ההתאמות לשמות.
+class PrefixIndex:
+    def __init__(self, entries=()):
+        """entries is an iterable of (name, label) pairs; label may be None"""
+        self._names = []  # רשומות של מפתחות השמות, ממוין
+        self._labels = []  # רשומות של מפתחות התוויות, ממוין
+        self._entries = {}  # שם -> תווית
+        self._label_keys = {}  # תווית -> המפתחות שלה (מעט תוויות שחוזרות על עצמן)
+        for name, label in entries:
+            self._entries[name] = label
+            self._names.extend(_entry(key, name) for key in _word_keys(name))
+            if label:
+                self._labels.extend(_entry(key, name) for key in self._keys_of_label(label))
+        # בנייה ראשונה במיון אחד, ולא הכנסה ממוינת לכל מפתח
+        self._names.sort()
+        self._labels.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def add(self, name, label=None):
+        """Index name under label, replacing the label it had before"""
+        if name in self._entries:
+            if self._entries[name] == label:
+                return
+            self.discard(name)
+        self._entries[name] = label
+        for key in _word_keys(name):
+            insort(self._names, _entry(key, name))
+        if label:
+            for key in self._keys_of_label(label):
+                insort(self._labels, _entry(key, name))
+
+    def discard(self, name):
+        if name not in self._entries:
+            return
+        label = self._entries.pop(name)
+        for key in _word_keys(name):
+            _remove(self._names, _entry(key, name))
+        if label:
+            for key in self._keys_of_label(label):
+                _remove(self._labels, _entry(key, name))
+
+    def label(self, name):
+        return self._entries.get(name)
+
+    def _keys_of_label(self, label):
+        keys = self._label_keys.get(label)
+        if keys is None:
+            keys = self._label_keys[label] = _word_keys(label)
+        return keys
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        """Return up to limit names that start with prefix (by word), then names whose label does"""
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        result = []
+        seen = set()
+        for keys in (self._names, self._labels):
+            index = bisect_left(keys, prefix)
+            while index < len(keys) and len(result) < limit:
+                entry = keys[index]
+                if not entry.startswith(prefix):
+                    break
+                name = entry[entry.index('\0') + 1:]
+                if name not in seen:
+                    seen.add(name)
+                    result.append(name)
+                index += 1
+        return result
+
+
+def _remove(keys, entry):
+    index = bisect_left(keys, entry)
+    if index < len(keys) and keys[index] == entry:
+        del keys[index]
@@ -0,0 +1,141 @@
+import atexit
+import os
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_DATABASE_FILENAME = "purchase_history.db"
+
+# סוגי האירועים בהיסטוריה
+KIND_BOUGHT = 'bought'
+KIND_REMOVED = 'removed'
+
+# פריט מוצע רק אחרי שנקנה בלפחות כמה ימים שונים (כלומר לפחות שני מרווחים)
+MIN_PURCHASE_DAYS = 3
+# פריט "צריך לקנות" כשעבר לפחות החלק הזה של המרווח הממוצע מאז הקנייה האחרונה
+DUE_RATIO = 0.9
+DEFAULT_SUGGESTIONS = 10
+
+SECONDS_PER_DAY = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchases (
+    household TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    at INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    quantity NUMERIC NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS purchases_by_day ON purchases (household, day);
+
+CREATE TABLE IF NOT EXISTS purchase_rollups (
+    household TEXT NOT NULL,
+    name TEXT NOT NULL,
+    purchase_days INTEGER NOT NULL,
+    first_day INTEGER NOT NULL,
+    last_day INTEGER NOT NULL,
+    quantity NUMERIC NOT NULL,
+    PRIMARY KEY (household, name)
+) WITHOUT ROWID;
+"""
+
+INSERT_EVENT = "INSERT INTO purchases (household, day, at, name, kind, quantity) VALUES (?, ?, ?, ?, ?, ?)"
+# כמה קניות באותו יום נספרות כיום קנייה אחד, כדי ששני בני הזוג שמסמנים "קניתי" לא ייצרו מרווח של 0 ימים
+UPSERT_ROLLUP = """
+INSERT INTO purchase_rollups (household, name, purchase_days, first_day, last_day, quantity)
+VALUES (?, ?, 1, ?, ?, ?)
+ON CONFLICT (household, name) DO UPDATE SET
+    purchase_days = purchase_days + (excluded.last_day > last_day),
+    last_day = MAX(last_day, excluded.last_day),
+    quantity = quantity + excluded.quantity
+"""
+# המרווח הממוצע בין ימי קנייה הוא (אחרון - ראשון) / (ימים - 1), כך שאין צורך לשמור את המרווחים עצמם
+SELECT_DUE = """
+SELECT name, purchase_days, last_day, CAST(last_day - first_day AS REAL) / (purchase_days - 1) AS interval_days
+FROM purchase_rollups
+WHERE household = ? AND purchase_days >= ? AND (? - last_day) >= ? * interval_days
+ORDER BY (? - last_day) / interval_days DESC
+"""
+# בנייה מחדש של כל הסיכומים מההיסטוריה הגולמית, בשאילתה אחת שמקבצת לפי ימים
+REBUILD_ROLLUPS = """
+DELETE FROM purchase_rollups;
+INSERT INTO purchase_rollups (household, name, purchase_days, first_day, last_day, quantity)
+SELECT household, name, COUNT(DISTINCT day), MIN(day), MAX(day), SUM(quantity)
+FROM purchases WHERE kind = 'bought'
+GROUP BY household, name;
+"""
+
+# פריט מוצע: כל כמה ימים הוא נקנה בממוצע, ולפני כמה ימים נקנה לאחרונה
+Suggestion = namedtuple('Suggestion', ['name', 'interval_days', 'days_since', 'purchase_days'])
+
+
+# היסטוריית קניות: כל קנייה והסרה נרשמת כשורה חדשה (לא מעדכנים ולא מוחקים),
+# ולצידה טבלת סיכום לכל פריט שמתעדכנת באותה טרנזקציה. ההצעות נקראות רק מהסיכום,
+# כך שזמן התשובה תלוי במספר הפריטים השונים ולא באורך ההיסטוריה.
+class PurchaseHistory:
+    def __init__(self, filename=DEFAULT_DATABASE_FILENAME):
+        self.filename = filename
+        import sqlite3  # נטען רק כשההיסטוריה נפתחת, לא בהפעלת הבוט
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def record(self, household, entries, kind=KIND_BOUGHT, at=None):
+        """Append (name, quantity) entries as one kind of event and update the rollups"""
+        at = at if at is not None else int(time.time())
+        day = at // SECONDS_PER_DAY
+        entries = list(entries)
+        with self._lock:
+            self._connection.executemany(
+                INSERT_EVENT, [(household, day, at, name, kind, quantity) for name, quantity in entries]
+            )
+            if kind == KIND_BOUGHT:
+                # הסיכום מניח שהאירועים מגיעים לפי סדר הזמן; rebuild_rollups מתקן אם לא
+                self._connection.executemany(
+                    UPSERT_ROLLUP, [(household, name, day, day, quantity) for name, quantity in entries]
+                )
+            self._connection.commit()
+
+    def suggestions(self, household, exclude=(), limit=DEFAULT_SUGGESTIONS, now=None):
+        """Return Suggestions for items that are usually bought by now, most overdue first"""
+        today = (now if now is not None else int(time.time())) // SECONDS_PER_DAY
+        with self._lock:
+            rows = self._connection.execute(SELECT_DUE, (household, MIN_PURCHASE_DAYS, today, DUE_RATIO, today))
+            result = []
+            for name, purchase_days, last_day, interval_days in rows:
+                if name in exclude:
+                    continue
+                result.append(Suggestion(name, interval_days, today - last_day, purchase_days))
+                if len(result) == limit:
+                    break
+            return result
+
+    def rebuild_rollups(self):
+        """Recompute every rollup from the raw history"""
+        with self._lock:
+            self._connection.executescript(REBUILD_ROLLUPS)
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_history = None
+
+
+# קבלת היסטוריית הקניות של התהליך (None אם PURCHASE_HISTORY_DB ריק - ההיסטוריה כבויה)
+def get_history():
+    global _history
+    if _history is None:
+        filename = os.getenv('PURCHASE_HISTORY_DB', DEFAULT_DATABASE_FILENAME)
+        if not filename:
+            return None
+        _history = PurchaseHistory(filename)
+        atexit.register(_history.close)
+    return _history
@@ -1,39 +1,403 @@
 import json
 import os
+import time
+from collections import namedtuple
+from collections.abc import MutableMapping
+from decimal import Decimal
+from shopping_list_journal import journal_filename, read_journal
+from fuzzy_index import FuzzyIndex
+from prefix_index import PrefixIndex, DEFAULT_LIMIT as DEFAULT_COMPLETIONS
+from category_predictor import CategoryPredictor
+from pagination import split_message, MESSAGE_LIMIT
+from item_model import Item, SCHEMA_VERSION, migrate_snapshot
+import snapshot_binary
+
+
+# כתיבה אטומית של JSON לקובץ (קובץ זמני ואז החלפה)
+def write_json_atomic(filename, data, fsync=False):
+    """Write data as JSON to filename without ever leaving a half-written file"""
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+# קריאה ושמירה של מילון הקטגוריות, ב-JSON או בפורמט הבינארי לפי סיומת הקובץ.
+# קובץ בינארי לא נטען לזיכרון אלא ממופה (MappedCategoryDictionary).
+def load_categories_file(filename):
+    """Return the CategoryDictionary stored in filename"""
+    if snapshot_binary.is_binary_filename(filename):
+        return MappedCategoryDictionary(filename)
+    with open(filename, 'r', encoding='utf-8') as f:
+        return CategoryDictionary(json.load(f))
+
+
+def save_categories_file(filename, categories, fsync=False):
+    if not snapshot_binary.is_binary_filename(filename):
+        write_json_atomic(filename, dict(categories), fsync=fsync)
+    elif isinstance(categories, MappedCategoryDictionary):
+        categories.save(filename, fsync=fsync)
+    else:
+        snapshot_binary.write_categories(filename, categories, fsync=fsync)
+
+# האינדקסים של מילון קטגוריות (שמות דומים, ניחוש קטגוריה, השלמה) והמאזינים לשינויים.
+# משותף למילון שבזיכרון ולמילון הממופה מקובץ בינארי.
+class _CategoryIndexes:
+    def _init_indexes(self):
+        self._listeners = []
+        self._index = None  # אינדקס לחיפוש שמות דומים, נבנה בשימוש הראשון
+        self._predictor = None  # מסווג לניחוש קטגוריה, נבנה בשימוש הראשון
+        self._prefixes = None  # אינדקס להשלמת שמות בזמן הקלדה, נבנה בשימוש הראשון
+
+    def subscribe(self, callback):
+        """Call callback(item_name, category) after every change; category is None on delete"""
+        self._listeners.append(callback)
+
+    def find(self, item_name):
+        """Return (known item name, score) of the closest match for item_name"""
+        if self._index is None:
+            self._index = FuzzyIndex(self)
+        return self._index.match(item_name)
+
+    def predict(self, item_name):
+        """Return (category, confidence) guessed for an unknown item from the known ones"""
+        if self._predictor is None:
+            self._predictor = CategoryPredictor(self.items())
+        return self._predictor.predict(item_name)
+
+    def complete(self, prefix, limit=DEFAULT_COMPLETIONS):
+        """Return up to limit known item names that start with prefix, then items of categories that do"""
+        if self._prefixes is None:
+            self._prefixes = PrefixIndex(self.items())
+        return self._prefixes.complete(prefix, limit)
+
+    def _assigned(self, item_name, category):
+        if self._index is not None:
+            self._index.add(item_name)
+        if self._prefixes is not None:
+            self._prefixes.add(item_name, category)
+        if self._predictor is not None:
+            self._predictor.learn(item_name, category)
+        for callback in self._listeners:
+            callback(item_name, category)
+
+    def _deleted(self, item_name):
+        if self._index is not None:
+            self._index.discard(item_name)
+        if self._predictor is not None:
+            self._predictor.forget(item_name)
+        if self._prefixes is not None:
+            self._prefixes.discard(item_name)
+        for callback in self._listeners:
+            callback(item_name, None)
+
+
+# מילון קטגוריות קבועות (פריט -> קטגוריה) שמודיע למאזינים על כל שינוי
+class CategoryDictionary(_CategoryIndexes, dict):
+    """dict of item -> category that reports item assignments and deletions to its listeners"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_indexes()
+
+    def __setitem__(self, item_name, category):
+        super().__setitem__(item_name, category)
+        self._assigned(item_name, category)
+
+    def __delitem__(self, item_name):
+        super().__delitem__(item_name)
+        self._deleted(item_name)
+
+
+_MISSING = object()
+
+
+# מילון קטגוריות מעל קובץ בינארי ממופה לזיכרון: חיפוש פריט (in, get, []) הוא חיפוש בינארי
+# בקובץ, ושינויים נשמרים בשכבה בזיכרון מעל הקובץ עד השמירה הבאה. מעבר על כל הפריטים
+# (האינדקסים, שמירה) מפענח את כל הקובץ.
+class MappedCategoryDictionary(_CategoryIndexes, MutableMapping):
+    """CategoryDictionary backed by a memory-mapped binary categories file"""
+
+    def __init__(self, filename):
+        self._init_indexes()
+        self._base = snapshot_binary.MappedCategories(filename)
+        self._overlay = {}  # פריטים שנוספו או שונו מאז השמירה האחרונה
+        self._removed = set()  # פריטים שנמחקו מאז השמירה האחרונה
+        self._length = len(self._base)
+
+    def _lookup(self, item_name):
+        category = self._overlay.get(item_name, _MISSING)
+        if category is _MISSING and item_name not in self._removed:
+            category = self._base.get(item_name, _MISSING)
+        return category
+
+    def __getitem__(self, item_name):
+        category = self._lookup(item_name)
+        if category is _MISSING:
+            raise KeyError(item_name)
+        return category
+
+    def __contains__(self, item_name):
+        return self._lookup(item_name) is not _MISSING
+
+    def __iter__(self):
+        yield from self._overlay
+        for item_name in self._base.to_dict():
+            if item_name not in self._overlay and item_name not in self._removed:
+                yield item_name
+
+    def items(self):
+        data = self._base.to_dict()
+        for item_name in self._removed:
+            data.pop(item_name, None)
+        data.update(self._overlay)
+        return data.items()
+
+    def __len__(self):
+        return self._length
+
+    def __setitem__(self, item_name, category):
+        if item_name not in self:
+            self._length += 1
+        self._overlay[item_name] = category
+        self._removed.discard(item_name)
+        self._assigned(item_name, category)
+
+    def __delitem__(self, item_name):
+        if item_name not in self:
+            raise KeyError(item_name)
+        self._length -= 1
+        self._overlay.pop(item_name, None)
+        self._removed.add(item_name)
+        self._deleted(item_name)
+
+    def save(self, filename, fsync=False):
+        """Write every item to filename and map the new file instead of the old one"""
+        data = dict(self.items())
+        # על Windows אי אפשר להחליף קובץ ממופה, ולכן המיפוי נסגר לפני הכתיבה
+        old_filename = self._base.filename
+        self._base.close()
+        try:
+            snapshot_binary.write_categories(filename, data, fsync=fsync)
+        except Exception:
+            self._base = snapshot_binary.MappedCategories(old_filename)
+            raise
+        self._base = snapshot_binary.MappedCategories(filename)
+        self._overlay.clear()
+        self._removed.clear()
+        self._length = len(self._base)
+
+    def close(self):
+        self._base.close()
+
+
+# סוגי האירועים שרשימת הקניות שולחת למאזינים
+CHANGE_ADDED = 'added'
+CHANGE_REMOVED = 'removed'
+CHANGE_QUANTITY = 'quantity'
+CHANGE_CATEGORY = 'category'
+CHANGE_CLEARED = 'cleared'
+
+# אירוע שינוי ברשימה: הכמות והקטגוריה הן הערכים אחרי השינוי (None לפריט שהוסר ולניקוי)
+Change = namedtuple('Change', ['seq', 'kind', 'name', 'quantity', 'category'])
+
+# סיכום הרשימה: סכום כולל (Decimal), מספר פריטים, כמה מהם בלי מחיר, ו-CategorySummary לכל קטגוריה
+Summary = namedtuple('Summary', ['total', 'items', 'unpriced', 'categories'])
+CategorySummary = namedtuple('CategorySummary', ['total', 'items', 'unpriced'])
+
+# השלמה של שם פריט: הקטגוריה שלו, והכמות ברשימה (None לפריט שמוכר רק ממילון הקטגוריות)
+Completion = namedtuple('Completion', ['name', 'category', 'quantity'])
+
 
 # מחלקה לניהול רשימת קניות
 class ShoppingList:
     # פונקציה שמתבצעת בעת יצירת אובייקט חדש של רשימת קניות
     def __init__(self):
-        self.items = {}  # Dictionary to store items and their quantities
-        self.categories = {}  # Dictionary to store item categories
+        self.items = {}  # שם הפריט -> Item (כמות, קטגוריה, מחיר...)
+        self.seq = 0  # מספר הפעולה האחרונה שבוצעה על הרשימה
+        self.loaded_version = SCHEMA_VERSION  # גרסת הקובץ שממנו הרשימה נטענה
+        self._journal = None  # יומן פעולות (אם מחובר)
+        self._index = None  # אינדקס לחיפוש שמות דומים, נבנה בשימוש הראשון
+        self._prefixes = None  # אינדקס להשלמת שמות בזמן הקלדה, נבנה בשימוש הראשון
+        self._groups = None  # קטגוריה -> פריטים, נבנה בשימוש הראשון
+        self._totals = None  # קטגוריה -> [סכום, פריטים, פריטים בלי מחיר], נבנה בשימוש הראשון
+        self._grand_total = [Decimal(0), 0, 0]  # אותו מבנה לכל הרשימה (תקף כש-_totals קיים)
+        self._rendered = {}  # תצוגות מוכנות של הרשימה, מתרוקן בכל שינוי
+        self._listeners = []  # מאזינים לאירועי שינוי
+
+    # חיבור יומן פעולות - כל שינוי ברשימה ייכתב אליו כרשומה קטנה
+    def attach_journal(self, journal):
+        """Append every following mutation to the given journal"""
+        self._journal = journal
+
+    # הרשמה לאירועי שינוי
+    def subscribe(self, callback):
+        """Call callback(change) with a Change after every mutation"""
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    @property
+    def watched(self):
+        """True while someone is subscribed to this list's changes"""
+        return bool(self._listeners)
+
+    def _notify(self, kind, name=None):
+        if not self._listeners:
+            return
+        item = self.items.get(name)
+        if item is None:
+            change = Change(self.seq, kind, name, None, None)
+        else:
+            change = Change(self.seq, kind, name, item.quantity, item.category)
+        for callback in list(self._listeners):
+            callback(change)
+
+    # רישום פעולה ביומן
+    def _record(self, op, **fields):
+        self.seq += 1
+        self._rendered.clear()
+        if self._journal is not None:
+            # שדות ריקים לא נכתבים - היומן נשאר קטן
+            self._journal.append({'seq': self.seq, 'op': op, **{k: v for k, v in fields.items() if v is not None}})
+
+    # חיפוש הפריט ברשימה שהכי דומה לשם הנתון (כתיב שונה, יחיד/רבים, רווחים)
+    def find_item(self, name):
+        """Return (item name on the list, score) of the closest match for name, or (None, 0.0)"""
+        if self._index is None:
+            self._index = FuzzyIndex(self.items)
+        return self._index.match(name)
+
+    # השלמת שם של פריט ברשימה לפי תחילת השם (או תחילת שם הקטגוריה)
+    def complete(self, prefix, limit=DEFAULT_COMPLETIONS):
+        """Return up to limit item names on the list that start with prefix, then items of categories that do"""
+        if self._prefixes is None:
+            self._prefixes = PrefixIndex((name, item.category) for name, item in self.items.items())
+        return self._prefixes.complete(prefix, limit)
 
     # פונקציה להוספת פריט לרשימה
-    def add_item(self, name, quantity=1, category=None):
-        """Add an item to the shopping list"""
-        if name in self.items:
-            self.items[name] += quantity
+    def add_item(self, name, quantity=1, category=None, price=None, unit=None, added_by=None, at=None):
+        """Add an item to the shopping list, or add quantity to an item already on it"""
+        at = at if at is not None else int(time.time())
+        item = self.items.get(name)
+        if item is not None:
+            kind = CHANGE_QUANTITY
+            self._tally(item, -1)
+            item.quantity += quantity
+            # מחיר ויחידה חדשים מחליפים את הקודמים; הקטגוריה של פריט קיים לא משתנה כאן
+            if price is not None:
+                item.price = price
+            if unit is not None:
+                item.unit = unit
+            item.updated_at = at
+            self._tally(item, 1)
         else:
-            self.items[name] = quantity
-            if category is not None:
-                self.categories[name] = category
+            kind = CHANGE_ADDED
+            self.items[name] = Item(quantity, category, price, unit, added_by, at)
+            self._group_add(name)
+            self._tally(self.items[name], 1)
+            if self._index is not None:
+                self._index.add(name)
+            if self._prefixes is not None:
+                self._prefixes.add(name, category)
+        self._record('add', name=name, quantity=quantity, category=category, price=price, unit=unit,
+                     added_by=added_by, at=at)
+        self._notify(kind, name)
 
     # פונקציה להסרת פריט מהרשימה
-    def remove_item(self, name, quantity=1):
+    def remove_item(self, name, quantity=1, at=None):
         """Remove an item from the shopping list"""
-        if name in self.items:
-            if quantity >= self.items[name]:
-                del self.items[name]
-                if name in self.categories:
-                    del self.categories[name]
+        item = self.items.get(name)
+        if item is None:
+            return
+        at = at if at is not None else int(time.time())
+        self._tally(item, -1)
+        if quantity >= item.quantity:
+            kind = CHANGE_REMOVED
+            self._group_remove(name)
+            del self.items[name]
+            if self._index is not None:
+                self._index.discard(name)
+            if self._prefixes is not None:
+                self._prefixes.discard(name)
+        else:
+            kind = CHANGE_QUANTITY
+            item.quantity -= quantity
+            item.updated_at = at
+            self._tally(item, 1)
+        self._record('remove', name=name, quantity=quantity, at=at)
+        self._notify(kind, name)
+
+    # הוספת כמה פריטים בפעולה אחת
+    def add_items(self, entries, added_by=None):
+        """Add (name, quantity, category, unit) entries; return the names that were not on the list before"""
+        new_items = []
+        for name, quantity, category, unit in entries:
+            if name not in self.items:
+                new_items.append(name)
+            self.add_item(name, quantity, category, unit=unit, added_by=added_by)
+        return new_items
+
+    # הסרת כמה פריטים בפעולה אחת
+    def remove_items(self, entries):
+        """Remove (name, quantity) entries; return the names that were not on the list"""
+        missing = []
+        for name, quantity in entries:
+            if name in self.items:
+                self.remove_item(name, quantity)
             else:
-                self.items[name] -= quantity
+                missing.append(name)
+        return missing
 
     # פונקציה לנקה את הרשימה
     def clear_list(self):
         """Clear the entire shopping list"""
         self.items.clear()
-        self.categories.clear()
+        self._index = None
+        self._prefixes = None
+        self._groups = None
+        self._totals = None
+        self._record('clear')
+        self._notify(CHANGE_CLEARED)
+
+    # פונקציה לעדכון (או מחיקה, עם None) של קטגוריית פריט
+    def set_category(self, name, category, at=None):
+        """Set the category of an item on the list, or remove it when category is None"""
+        item = self.items.get(name)
+        if item is None:
+            return
+        self._group_remove(name)
+        self._tally(item, -1)
+        item.category = category
+        item.updated_at = at if at is not None else int(time.time())
+        self._group_add(name)
+        self._tally(item, 1)
+        if self._prefixes is not None:
+            self._prefixes.add(name, category)
+        self._record('set_category', name=name, category=category, at=item.updated_at)
+        self._notify(CHANGE_CATEGORY, name)
+
+    # ביצוע מחדש של רשומה מהיומן
+    def apply_record(self, record):
+        """Replay one journal record without journaling it again"""
+        journal, self._journal = self._journal, None
+        try:
+            op = record['op']
+            if op == 'add':
+                self.add_item(record['name'], record['quantity'], record.get('category'), record.get('price'),
+                              record.get('unit'), record.get('added_by'), record.get('at'))
+            elif op == 'remove':
+                self.remove_item(record['name'], record['quantity'], record.get('at'))
+            elif op == 'clear':
+                self.clear_list()
+            elif op == 'set_category':
+                self.set_category(record['name'], record.get('category'), record.get('at'))
+        finally:
+            self._journal = journal
+        self.seq = record['seq']
 
     # פונקציה לקבלת הרשימה הנוכחית
     def get_list(self):
@@ -42,19 +406,85 @@ class ShoppingList:
 
     def get_category(self, item_name):
         """Get the category of an item"""
-        return self.categories.get(item_name)
+        item = self.items.get(item_name)
+        return item.category if item is not None else None
 
     # פונקציה לחישוב הסכום הכולל
     def calculate_total(self):
         """
         חישוב הסכום הכולל של רשימת הקניות
-        :return: סכום כולל
+        :return: סכום כולל (Decimal)
         """
-        total = 0
-        for item in self.items.values():
-            if item['price'] is not None:
-                total += item['price'] * item['quantity']
-        return total
+        return self.summary().total
+
+    # סיכום הרשימה - הסכומים מתעדכנים בכל שינוי, כך שהקריאה לא עוברת על הפריטים
+    def summary(self):
+        """Return a Summary of the total, item counts and per-category subtotals"""
+        self._build_totals()
+        categories = {category: CategorySummary(*entry) for category, entry in self._totals.items()}
+        return Summary(*self._grand_total, categories)
+
+    def _build_totals(self):
+        if self._totals is None:
+            self._totals = {}
+            self._grand_total = [Decimal(0), 0, 0]
+            for item in self.items.values():
+                self._tally(item, 1)
+
+    # הוספה (sign=1) או הורדה (sign=-1) של פריט מהסכומים. Decimal מבטיח שהוספה והורדה
+    # חוזרות לא יצברו שגיאות עיגול של float
+    def _tally(self, item, sign):
+        if self._totals is None:
+            return
+        entry = self._totals.get(item.category)
+        if entry is None:
+            entry = self._totals[item.category] = [Decimal(0), 0, 0]
+        total = item.total()
+        for aggregate in (entry, self._grand_total):
+            aggregate[1] += sign
+            if total is None:
+                aggregate[2] += sign
+            else:
+                aggregate[0] += sign * total
+        if not entry[1]:
+            del self._totals[item.category]
+
+    # קבלת הפריטים מקובצים לפי קטגוריה (קטגוריה -> שמות פריטים, None לפריטים בלי קטגוריה)
+    def grouped_items(self):
+        """Return the category -> {item name: None} view, built once and then kept up to date"""
+        if self._groups is None:
+            self._groups = {}
+            for name, item in self.items.items():
+                self._groups.setdefault(item.category, {})[name] = None
+        return self._groups
+
+    def _group_add(self, name):
+        if self._groups is not None:
+            self._groups.setdefault(self.items[name].category, {})[name] = None
+
+    def _group_remove(self, name):
+        if self._groups is not None:
+            category = self.items[name].category
+            group = self._groups.get(category)
+            if group is not None:
+                group.pop(name, None)
+                if not group:
+                    del self._groups[category]
+
+    # הקטגוריות לפי סדר התצוגה: לפי הא"ב, ופריטים בלי קטגוריה בסוף
+    def _sorted_groups(self):
+        groups = self.grouped_items()
+        for category in sorted(c for c in groups if c is not None):
+            yield category, groups[category]
+        if None in groups:
+            yield None, groups[None]
+
+    # תצוגה שמורה - נבנית מחדש רק אחרי שינוי ברשימה
+    def _cached_render(self, key, build):
+        text = self._rendered.get(key)
+        if text is None:
+            text = self._rendered[key] = build()
+        return text
 
     # פונקציה להצגת הרשימה בפורמט יפה
     def format_list(self):
@@ -62,80 +492,167 @@ class ShoppingList:
         הצגת רשימת הקניות בפורמט קריא
         :return: מחרוזת מעוצבת של רשימת הקניות
         """
+        return self._cached_render('text', self._build_text)
+
+    def _build_text(self):
         # אם הרשימה ריקה, מחזירים הודעה מתאימה
         if not self.items:
             return "הרשימה ריקה"
-        
-        # יצירת כותרת לרשימה
-        formatted_list = "רשימת הקניות שלך:\n"
-        
-        # מיון לפי קטגוריות אם יש
-        if self.categories:
-            for category in sorted(self.categories):
-                formatted_list += f"\nקטגוריה: {category}\n"
-                for item_name, details in self.items.items():
-                    if details['category'] == category:
-                        formatted_list += self._format_item(item_name, details)
-        else:
-            # אם אין קטגוריות, מציגים את כל הפריטים
-            for item_name, details in self.items.items():
-                formatted_list += self._format_item(item_name, details)
-        
-        # הוספת סכום כולל אם יש מחירים
-        total = self.calculate_total()
-        if total > 0:
-            formatted_list += f"\nסכום כולל: {total:.2f} ₪"
-        
-        return formatted_list
+
+        # כותרת, ואחריה הפריטים מקובצים לפי קטגוריה
+        lines = ["רשימת הקניות שלך:"]
+        for category, names in self._sorted_groups():
+            lines.append(f"\nקטגוריה: {category or 'ללא קטגוריה'}")
+            lines.extend(self._format_item(name, self.items[name]) for name in names)
+        lines.extend(self._total_lines("סכום כולל: {total:.2f} ₪"))
+        return "\n".join(lines)
+
+    # הצגת הרשימה כהודעת Markdown לטלגרם (לבוט ולממשק הגרפי)
+    def format_telegram(self):
+        """Return the list as a Telegram Markdown message, grouped by category"""
+        return self._cached_render('telegram', self._build_telegram)
+
+    # הודעת הטלגרם מחולקת לעמודים שכל אחד מהם נכנס בהודעה אחת
+    def format_telegram_pages(self, limit=MESSAGE_LIMIT):
+        """Return format_telegram() split into message-sized pages (cached like the full text)"""
+        return self._cached_render(('telegram_pages', limit), lambda: split_message(self.format_telegram(), limit))
+
+    def _build_telegram(self):
+        if not self.items:
+            return "📝 הרשימה ריקה"
+        lines = ["📝 *רשימת קניות*"]
+        for category, names in self._sorted_groups():
+            lines.append(f"\n*{category or 'ללא קטגוריה'}:*")
+            lines.extend(self._format_telegram_item(name, self.items[name]) for name in names)
+        lines.extend(self._total_lines("💰 *סכום כולל: {total:.2f} ₪*"))
+        return "\n".join(lines)
+
+    # שורת פריט בהודעת הטלגרם, עם המחיר אם יש
+    def _format_telegram_item(self, item_name, item):
+        line = f"• {item_name}: {self.format_quantity(item)}"
+        if item.price is not None:
+            line += f" ({item.total():.2f} ₪)"
+        return line
+
+    # שורות הסכום בסוף הרשימה (רק אם יש פריטים עם מחיר), מהסכומים השוטפים ולא במעבר על הפריטים
+    def _total_lines(self, template):
+        summary = self.summary()
+        if summary.items == summary.unpriced:
+            return []
+        lines = ["\n" + template.format(total=summary.total)]
+        if summary.unpriced:
+            lines.append(f"{summary.unpriced} פריטים בלי מחיר לא נכללים בסכום")
+        return lines
+
+    # הודעת סיכום לטלגרם: סכום כולל וסכום לכל קטגוריה
+    def format_summary(self):
+        """Return the summary as a Telegram Markdown message"""
+        return self._cached_render('summary', self._build_summary)
+
+    def _build_summary(self):
+        summary = self.summary()
+        if not summary.items:
+            return "📝 הרשימה ריקה"
+        lines = [f"💰 *סכום כולל: {summary.total:.2f} ₪*", f"{summary.items} פריטים ברשימה"]
+        # אותו סדר כמו ברשימה: לפי הא"ב, ופריטים בלי קטגוריה בסוף
+        order = sorted(c for c in summary.categories if c is not None)
+        if None in summary.categories:
+            order.append(None)
+        for category in order:
+            category_summary = summary.categories[category]
+            lines.append(f"• {category or 'ללא קטגוריה'}: {category_summary.total:.2f} ₪ "
+                         f"({category_summary.items} פריטים)")
+        if summary.unpriced:
+            lines.append(f"\n{summary.unpriced} פריטים בלי מחיר לא נכללים בסכום")
+        return "\n".join(lines)
+
+    # כמות עם יחידת המידה, למשל "2" או "1.5 ק"ג"
+    @staticmethod
+    def format_quantity(item):
+        return f"{item.quantity} {item.unit}" if item.unit else str(item.quantity)
 
     # פונקציה עזר לעיצוב פריט בודד
-    def _format_item(self, item_name, details):
+    def _format_item(self, item_name, item):
         """עיצוב פריט בודד לרשימה"""
-        line = f"- {item_name}: {details['quantity']}"
-        if details['price'] is not None:
-            line += f" (מחיר: {details['price']} ₪ ליחידה)"
-        return line + "\n"
+        line = f"- {item_name}: {self.format_quantity(item)}"
+        if item.price is not None:
+            line += f" ({item.total():.2f} ₪)"
+        return line
 
     # פונקציה לשמירת הרשימה לקובץ
-    def save_to_file(self, filename):
-        """Save the shopping list to a file"""
+    def save_to_file(self, filename, fsync=False):
+        """Save the shopping list to a file (binary when filename ends with .bin, JSON otherwise)"""
+        if snapshot_binary.is_binary_filename(filename):
+            snapshot_binary.write_list(filename, self.seq, self.items, fsync=fsync)
+            return
         data = {
-            'items': self.items,
-            'categories': self.categories
+            'version': SCHEMA_VERSION,
+            'seq': self.seq,
+            'items': {name: item.to_dict() for name, item in self.items.items()},
         }
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        write_json_atomic(filename, data, fsync=fsync)
 
     # פונקציה לטעינת רשימה מקובץ
     @classmethod
     def load_from_file(cls, filename):
-        """Load a shopping list from a file"""
+        """Load a shopping list from a file, replaying its journal if there is one"""
         shopping_list = cls()
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                shopping_list.items = data.get('items', {})
-                shopping_list.categories = data.get('categories', {})
+            if snapshot_binary.is_binary_filename(filename):
+                shopping_list.seq, shopping_list.items = snapshot_binary.read_list(filename)
+            else:
+                shopping_list._load_json(filename)
         except FileNotFoundError:
             pass
+        # רשומות שכבר נכללות ב-snapshot מדולגות (למשל קריסה בין הדחיסה לקיצוץ היומן)
+        for record in read_journal(journal_filename(filename)):
+            if record['seq'] > shopping_list.seq:
+                shopping_list.apply_record(record)
         return shopping_list
 
+    def _load_json(self, filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            # קבצים בפורמט ישן מומרים לפורמט הנוכחי (הם נכתבים מחדש בשמירה הבאה)
+            data = json.load(f)
+        self.loaded_version = data.get('version', 1)
+        data = migrate_snapshot(data)
+        self.items = {name: Item.from_dict(item) for name, item in data['items'].items()}
+        self.seq = data['seq']
+
+
+# השלמת שם פריט בזמן הקלדה: קודם פריטים שכבר ברשימה, ואחריהם פריטים מוכרים ממילון הקטגוריות
+def complete_item_names(prefix, shopping_list, categories=None, limit=DEFAULT_COMPLETIONS):
+    """Return up to limit Completions for the item names that start with prefix"""
+    completions = []
+    for name in shopping_list.complete(prefix, limit):
+        item = shopping_list.items[name]
+        completions.append(Completion(name, item.category, item.quantity))
+    if categories is not None and len(completions) < limit:
+        for name in categories.complete(prefix, limit):
+            if name not in shopping_list.items:
+                completions.append(Completion(name, categories[name], None))
+                if len(completions) == limit:
+                    break
+    return completions
+
 # דוגמת שימוש בקוד
 if __name__ == "__main__":
     # יצירת אובייקט חדש של רשימת קניות
     shopping_list = ShoppingList()
     
     # הוספת פריטים לרשימה עם קטגוריות ומחירים
-    shopping_list.add_item("חלב", 2, "מוצרי חלב")  # הוספת 2 חלב בקטגוריית מוצרי חלב
-    shopping_list.add_item("לחם", 1, "מאפים")     # הוספת לחם בקטגוריית מאפים
+    shopping_list.add_item("חלב", 2, "מוצרי חלב", 6.5)  # הוספת 2 חלב בקטגוריית מוצרי חלב
+    shopping_list.add_item("לחם", 1, "מאפים", 9.9)     # הוספת לחם בקטגוריית מאפים
     shopping_list.add_item("ביצים", 12, "מוצרי חלב")  # הוספת 12 ביצים בקטגוריית מוצרי חלב
-    shopping_list.add_item("עגבניות", 5, "ירקות")  # הוספת 5 עגבניות בקטגוריית ירקות
+    shopping_list.add_item("עגבניות", 1.5, "ירקות", 7, 'ק"ג')  # הוספת 1.5 ק"ג עגבניות בקטגוריית ירקות
     
     # הדפסת הרשימה המעוצבת
     print(shopping_list.format_list())
+    print(f"\nסכום כולל: {shopping_list.calculate_total():.2f} ₪")
     
     # שמירת הרשימה לקובץ
-    filename = shopping_list.save_to_file()
+    filename = "shopping_list_example.json"
+    shopping_list.save_to_file(filename)
     print(f"\nהרשימה נשמרה בקובץ: {filename}")
     
     # טעינת הרשימה מהקובץ
@@ -1,20 +1,54 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from shopping_list import ShoppingList
+from shopping_list import ShoppingList, CategoryDictionary, CHANGE_CLEARED, complete_item_names, load_categories_file
 import json
+import os
 from datetime import datetime
-from telegram import Bot
-import asyncio
 import threading
 
+# כמה שורות מוכנסות לטבלה בכל פעם - שאר הרשימה נטענת כשגוללים לקראת הסוף
+ROWS_CHUNK = 500
+# מתי לטעון את החלק הבא: כשהחלק התחתון של המסך עובר את החלק הזה של מה שכבר נטען
+LOAD_MORE_AT = 0.9
+# כל כמה מילישניות בודקים אם עבודה ברקע הסתיימה
+POLL_MS = 100
+# כמה הצעות השלמה מוצגות מתחת לשדה שם הפריט
+AUTOCOMPLETE_ROWS = 8
+# מקשים שמנווטים בהצעות ולא משנים את הטקסט
+NAVIGATION_KEYS = ('Up', 'Down', 'Return', 'Escape', 'Tab')
+# סנכרון עם הרשימה של הבוט דרך תיקייה משותפת (כבוי כש-SYNC_DIR לא מוגדר)
+SYNC_DIR = os.getenv('SYNC_DIR')
+SYNC_REPLICA = os.getenv('SYNC_REPLICA', 'gui')
+SYNC_INTERVAL_MS = int(os.getenv('SYNC_INTERVAL_MS', '1000'))
+
 class ShoppingListGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("רשימת קניות")
         self.root.geometry("800x600")
         
-        # יצירת רשימת קניות חדשה
-        self.shopping_list = ShoppingList()
+        # עבודה איטית (קבצים, רשת) רצה ב-thread ברקע כדי שהחלון לא ייתקע.
+        # התוצאות חוזרות ל-thread של Tk דרך root.after - אסור לגעת בווידג'טים מה-thread השני.
+        # ה-executor נוצר בשימוש הראשון, כדי לא להאט את פתיחת החלון
+        self.executor = None
+        
+        self.shopping_list = None
+        
+        # מילון הקטגוריות הקבועות של הבוט (להשלמת שמות), נטען בהקלדה הראשונה
+        self.categories = None
+        self._completions = []
+        
+        # שורות הטבלה: שם פריט -> מזהה שורה, ולהפך
+        self._rows = {}
+        self._names = {}
+        self._all_loaded = True  # האם כל הפריטים כבר מוצגים בטבלה
+        self._dirty = set()  # פריטים שהשתנו ועוד לא עודכנו בטבלה
+        self._refresh_scheduled = False
+        
+        # תור שליחה לטלגרם: בוט אחד ולולאה אחת ב-thread ברקע, שנשמרים בין לחיצות
+        self.outbound = None
+        self.outbound_token = None
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # יצירת מסגרת ראשית
         self.main_frame = ttk.Frame(root, padding="10")
@@ -32,6 +66,16 @@ class ShoppingListGUI:
         # יצירת אזור הגדרות טלגרם
         self.create_telegram_frame()
         
+        # יצירת רשימת קניות חדשה, או הרשימה המשותפת עם הבוט כשהסנכרון מופעל
+        self.list_sync = None
+        if SYNC_DIR:
+            from list_sync import ListSync
+            self.list_sync = ListSync(SYNC_DIR, SYNC_REPLICA)
+            self.set_list(self.list_sync.materialize())
+            self.root.after(SYNC_INTERVAL_MS, self.sync_list)
+        else:
+            self.set_list(ShoppingList())
+        
         # הגדרת הרחבה של החלון
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
@@ -48,6 +92,15 @@ class ShoppingListGUI:
         self.item_name = ttk.Entry(add_frame)
         self.item_name.grid(row=0, column=1, padx=5, pady=5)
         
+        # הצעות השלמה שנפתחות מתחת לשדה בזמן ההקלדה (חץ למטה כדי לבחור, Enter לאישור)
+        self.suggestions = tk.Listbox(add_frame, height=AUTOCOMPLETE_ROWS, exportselection=False)
+        self.item_name.bind("<KeyRelease>", self.on_item_name_key)
+        self.item_name.bind("<Down>", self.focus_suggestions)
+        self.item_name.bind("<Escape>", self.hide_suggestions)
+        self.suggestions.bind("<Return>", self.choose_suggestion)
+        self.suggestions.bind("<Double-Button-1>", self.choose_suggestion)
+        self.suggestions.bind("<Escape>", self.hide_suggestions)
+        
         ttk.Label(add_frame, text="כמות:").grid(row=1, column=0, padx=5, pady=5)
         self.quantity = ttk.Spinbox(add_frame, from_=1, to=100, width=5)
         self.quantity.grid(row=1, column=1, padx=5, pady=5)
@@ -76,10 +129,10 @@ class ShoppingListGUI:
         self.tree.heading("מחיר", text="מחיר")
         self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-        # הוספת scrollbar
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # הוספת scrollbar (כל גלילה בודקת גם אם צריך לטעון עוד שורות)
+        self.scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=self.on_scroll)
         
         # הגדרת הרחבה של העץ
         list_frame.columnconfigure(0, weight=1)
@@ -125,10 +178,11 @@ class ShoppingListGUI:
                 messagebox.showerror("שגיאה", "חובה להזין שם פריט")
                 return
             
+            # הטבלה מתעדכנת מאירוע השינוי של הרשימה
             self.shopping_list.add_item(name, quantity, category, price)
-            self.update_list_display()
             
             # ניקוי השדות
+            self.hide_suggestions()
             self.item_name.delete(0, tk.END)
             self.quantity.delete(0, tk.END)
             self.quantity.insert(0, "1")
@@ -138,18 +192,152 @@ class ShoppingListGUI:
         except ValueError:
             messagebox.showerror("שגיאה", "נא להזין ערכים תקינים")
 
+    def get_categories(self):
+        # טעינת מילון הקטגוריות בפעם הראשונה שצריך אותו, ולא בפתיחת החלון
+        if self.categories is None:
+            filename = os.getenv('CATEGORIES_FILENAME', "categories.json")
+            try:
+                self.categories = load_categories_file(filename)
+            except FileNotFoundError:
+                self.categories = CategoryDictionary()
+            except (OSError, ValueError) as e:
+                print(f"Error loading categories: {str(e)}")
+                self.categories = CategoryDictionary()
+        return self.categories
+
+    def on_item_name_key(self, event):
+        # עדכון ההצעות אחרי כל הקשה - חיפוש בינארי באינדקס, מהיר מספיק גם למילון גדול
+        if event.keysym in NAVIGATION_KEYS:
+            return
+        prefix = self.item_name.get()
+        self._completions = complete_item_names(prefix, self.shopping_list, self.get_categories(), AUTOCOMPLETE_ROWS)
+        if not self._completions:
+            self.hide_suggestions()
+            return
+        self.suggestions.delete(0, tk.END)
+        for completion in self._completions:
+            self.suggestions.insert(tk.END, completion.name)
+        self.suggestions.configure(height=len(self._completions))
+        self.suggestions.place(in_=self.item_name, relx=0, rely=1, relwidth=1)
+        self.suggestions.lift()
+
+    def focus_suggestions(self, event=None):
+        if not self.suggestions.winfo_ismapped():
+            return None
+        self.suggestions.focus_set()
+        self.suggestions.selection_clear(0, tk.END)
+        self.suggestions.selection_set(0)
+        self.suggestions.activate(0)
+        return "break"
+
+    def choose_suggestion(self, event=None):
+        # מילוי שם הפריט שנבחר, ושל הקטגוריה שלו אם השדה ריק
+        selected = self.suggestions.curselection()
+        if not selected:
+            return "break"
+        completion = self._completions[selected[0]]
+        self.item_name.delete(0, tk.END)
+        self.item_name.insert(0, completion.name)
+        if completion.category and not self.category.get():
+            self.category.insert(0, completion.category)
+        self.hide_suggestions()
+        self.item_name.focus_set()
+        self.item_name.icursor(tk.END)
+        return "break"
+
+    def hide_suggestions(self, event=None):
+        self.suggestions.place_forget()
+        self._completions = []
+
+    def set_list(self, shopping_list):
+        # החלפת הרשימה המוצגת והרשמה לאירועי השינוי שלה
+        if self.shopping_list is not None:
+            self.shopping_list.unsubscribe(self.on_list_change)
+        self.shopping_list = shopping_list
+        shopping_list.subscribe(self.on_list_change)
+        if self.list_sync is not None:
+            # רשימה שנטענה מקובץ מתמזגת עם הרשימה המשותפת: פריטים חדשים ושינויים נשלחים לשאר
+            # העותקים, ופריטים שחסרים בקובץ נשארים ברשימה ולא נמחקים אצל כולם
+            self.list_sync.attach(shopping_list, merge=True)
+        self.update_list_display()
+
+    def sync_list(self):
+        # שליחת השינויים המקומיים וקבלת השינויים של הבוט; הטבלה מתעדכנת מאירועי השינוי
+        try:
+            self.list_sync.sync()
+        except (OSError, ValueError) as e:
+            print(f"Error syncing shopping list: {str(e)}")
+        self.root.after(SYNC_INTERVAL_MS, self.sync_list)
+
     def update_list_display(self):
-        # עדכון תצוגת הרשימה
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        for item_name, details in self.shopping_list.items.items():
-            self.tree.insert("", tk.END, values=(
-                item_name,
-                details['quantity'],
-                details['category'] or "",
-                f"{details['price']} ₪" if details['price'] is not None else ""
-            ))
+        # בנייה מחדש של הטבלה - רק החלק הראשון של הרשימה, השאר נטען בגלילה
+        self.tree.delete(*self.tree.get_children())
+        self._rows.clear()
+        self._names.clear()
+        self._dirty.clear()
+        self._all_loaded = False
+        self.load_more_rows()
+
+    def row_values(self, item_name, item):
+        return (
+            item_name,
+            self.shopping_list.format_quantity(item),
+            item.category or "",
+            f"{item.price} ₪" if item.price is not None else ""
+        )
+
+    def insert_row(self, item_name):
+        row = self.tree.insert("", tk.END, values=self.row_values(item_name, self.shopping_list.items[item_name]))
+        self._rows[item_name] = row
+        self._names[row] = item_name
+
+    def load_more_rows(self):
+        # הוספת החלק הבא של הפריטים שעוד לא מוצגים
+        added = 0
+        for item_name in self.shopping_list.items:
+            if added == ROWS_CHUNK:
+                return
+            if item_name not in self._rows:
+                self.insert_row(item_name)
+                added += 1
+        self._all_loaded = True
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if not self._all_loaded and float(last) >= LOAD_MORE_AT:
+            self.load_more_rows()
+
+    def on_list_change(self, change):
+        # שינויים נאספים ומוחלים על הטבלה פעם אחת, כשהחלון פנוי
+        if change.kind == CHANGE_CLEARED:
+            self._dirty.clear()
+            self.tree.delete(*self.tree.get_children())
+            self._rows.clear()
+            self._names.clear()
+            self._all_loaded = True
+            return
+        self._dirty.add(change.name)
+        if not self._refresh_scheduled:
+            self._refresh_scheduled = True
+            self.root.after_idle(self.apply_changes)
+
+    def apply_changes(self):
+        # עדכון רק של השורות שהשתנו במקום בנייה מחדש של כל הטבלה
+        self._refresh_scheduled = False
+        dirty, self._dirty = self._dirty, set()
+        for item_name in dirty:
+            item = self.shopping_list.items.get(item_name)
+            row = self._rows.get(item_name)
+            if item is None:
+                if row is not None:
+                    self.tree.delete(row)
+                    del self._rows[item_name]
+                    del self._names[row]
+            elif row is not None:
+                self.tree.item(row, values=self.row_values(item_name, item))
+            elif self._all_loaded:
+                # פריט חדש נוסף בסוף הרשימה; אם הסוף עוד לא נטען, הוא יוצג בגלילה
+                self.insert_row(item_name)
 
     def remove_selected_item(self):
         # הסרת פריט נבחר
@@ -158,9 +346,8 @@ class ShoppingListGUI:
             messagebox.showwarning("אזהרה", "נא לבחור פריט להסרה")
             return
         
-        item_name = self.tree.item(selected[0])['values'][0]
-        self.shopping_list.remove_item(item_name)
-        self.update_list_display()
+        # השם נלקח מהמיפוי ולא מערכי השורה (Tk ממיר שמות כמו "7" למספרים)
+        self.shopping_list.remove_item(self._names[selected[0]])
 
     def save_list(self):
         # שמירת הרשימה לקובץ
@@ -173,18 +360,59 @@ class ShoppingListGUI:
         try:
             filename = tk.filedialog.askopenfilename(
                 title="בחר קובץ רשימה",
-                filetypes=[("JSON files", "*.json")]
+                filetypes=[("JSON files", "*.json"), ("Binary snapshots", "*.bin")]
             )
             if filename:
-                self.shopping_list = ShoppingList.load_from_file(filename)
-                self.update_list_display()
+                # הקריאה והפענוח של הקובץ ברקע; הטבלה מוחלפת כשהם מסתיימים
+                self.run_in_background(
+                    lambda: ShoppingList.load_from_file(filename),
+                    self.set_list,
+                    lambda e: messagebox.showerror("שגיאה", f"שגיאה בטעינת הקובץ: {str(e)}"),
+                )
         except Exception as e:
             messagebox.showerror("שגיאה", f"שגיאה בטעינת הקובץ: {str(e)}")
 
     def show_total(self):
         # הצגת הסכום הכולל
-        total = self.shopping_list.calculate_total()
-        messagebox.showinfo("סכום כולל", f"הסכום הכולל: {total:.2f} ₪")
+        summary = self.shopping_list.summary()
+        lines = [f"הסכום הכולל: {summary.total:.2f} ₪"]
+        for category, category_summary in summary.categories.items():
+            lines.append(f"{category or 'ללא קטגוריה'}: {category_summary.total:.2f} ₪")
+        if summary.unpriced:
+            lines.append(f"{summary.unpriced} פריטים בלי מחיר")
+        messagebox.showinfo("סכום כולל", "\n".join(lines))
+
+    def run_in_background(self, work, on_done, on_error):
+        # הרצת work() ב-thread ברקע; on_done(תוצאה) או on_error(שגיאה) נקראים ב-thread של Tk
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-io")
+        future = self.executor.submit(work)
+        self.root.after(POLL_MS, self.check_done, future, on_done, on_error)
+
+    def check_done(self, future, on_done, on_error):
+        # בדיקה מחזורית אם העבודה ברקע הסתיימה
+        if not future.done():
+            self.root.after(POLL_MS, self.check_done, future, on_done, on_error)
+            return
+        error = future.exception()
+        if error is None:
+            on_done(future.result())
+        else:
+            on_error(error)
+
+    def get_outbound(self, token):
+        # בוט חדש נוצר רק כשהטוקן משתנה (נקרא מה-thread שברקע - האתחול פונה לשרת של טלגרם)
+        if self.outbound is None or self.outbound_token != token:
+            # python-telegram-bot נטען רק בשליחה הראשונה - פתיחת החלון לא ממתינה לו
+            from telegram.ext import ExtBot
+            from outbound import OutboundQueue, TelegramRateLimiter
+            if self.outbound is not None:
+                self.outbound.stop()
+            bot = ExtBot(token=token, rate_limiter=TelegramRateLimiter())
+            self.outbound = OutboundQueue(bot).start()
+            self.outbound_token = token
+        return self.outbound
 
     def send_to_telegram(self):
         # שליחה לטלגרם
@@ -196,41 +424,41 @@ class ShoppingListGUI:
                 messagebox.showerror("שגיאה", "חובה להזין טוקן ו-ID צ'אט")
                 return
             
-            # יצירת בוט
-            bot = Bot(token=token)
-            
-            # יצירת הודעה
-            message = "📝 *רשימת קניות*\n\n"
+            # יצירת הודעה (התצוגה שמורה ברשימה ונבנית מחדש רק אחרי שינוי).
+            # רשימה ארוכה נשלחת בכמה הודעות. הטקסט נבנה כאן, כי אסור לקרוא את הרשימה מה-thread שברקע
+            pages = self.shopping_list.format_telegram_pages()
             
-            # מיון לפי קטגוריות
-            if self.shopping_list.categories:
-                for category in sorted(self.shopping_list.categories):
-                    message += f"*{category}:*\n"
-                    for item_name, details in self.shopping_list.items.items():
-                        if details['category'] == category:
-                            message += self._format_telegram_item(item_name, details)
-            else:
-                for item_name, details in self.shopping_list.items.items():
-                    message += self._format_telegram_item(item_name, details)
+            # אתחול הבוט והשליחה ברקע - החלון ממשיך להגיב עד שמגיעה תשובה
+            def send():
+                outbound = self.get_outbound(token)
+                futures = [outbound.send_message(chat_id=chat_id, text=page, parse_mode='Markdown') for page in pages]
+                for future in futures:
+                    future.result()
             
-            # הוספת סכום כולל
-            total = self.shopping_list.calculate_total()
-            if total > 0:
-                message += f"\n*סכום כולל:* {total:.2f} ₪"
-            
-            # שליחת ההודעה
-            asyncio.run(bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown'))
-            messagebox.showinfo("הצלחה", "הרשימה נשלחה בהצלחה לטלגרם")
+            self.run_in_background(
+                send,
+                lambda result: messagebox.showinfo("הצלחה", "הרשימה נשלחה בהצלחה לטלגרם"),
+                lambda e: messagebox.showerror("שגיאה", f"שגיאה בשליחה לטלגרם: {str(e)}"),
+            )
             
         except Exception as e:
             messagebox.showerror("שגיאה", f"שגיאה בשליחה לטלגרם: {str(e)}")
 
-    def _format_telegram_item(self, item_name, details):
-        """עיצוב פריט בודד להודעה בטלגרם"""
-        line = f"• {item_name}: {details['quantity']}"
-        if details['price'] is not None:
-            line += f" (מחיר: {details['price']} ₪ ליחידה)"
-        return line + "\n"
+    def on_close(self):
+        # שליחת מה שעוד בתור לפני סגירת החלון
+        if self.list_sync is not None:
+            try:
+                self.list_sync.sync()
+            except (OSError, ValueError) as e:
+                print(f"Error syncing shopping list: {str(e)}")
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        if self.outbound is not None:
+            try:
+                self.outbound.stop()
+            except Exception as e:
+                print(f"Error stopping outbound queue: {str(e)}")
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+
+DEFAULT_COMPACT_BYTES = 256 * 1024
+
+
+# שם קובץ היומן שמתאים לקובץ snapshot
+def journal_filename(filename):
+    return f"{filename}.log"
+
+
+# קריאת רשומות היומן מקובץ. שורה פגומה (למשל חתוכה אחרי קריסה) מדולגת, והקריאה ממשיכה -
+# כך רשומות שנכתבו אחריה לא הולכות לאיבוד
+def read_journal(filename):
+    """Yield the records stored in a journal file, oldest first"""
+    if not os.path.exists(filename):
+        return
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping a corrupt journal line in {filename}")
+                continue
+            yield record
+
+
+# חיתוך שורה אחרונה שנכתבה חלקית, כדי שהרשומה הבאה לא תידבק אליה. מחזיר את הגודל אחרי החיתוך
+def _drop_torn_tail(filename):
+    try:
+        with open(filename, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+            return end
+    except FileNotFoundError:
+        return 0
+
+
+# פתיחה מחדש של היומן אחרי כתיבה שנכשלה, בלי מה שנכתב ממנה חלקית
+def _reopen_at(file, filename, size):
+    try:
+        file.close()
+    except OSError:
+        pass
+    try:
+        os.truncate(filename, size)
+    except OSError as e:
+        print(f"Error truncating journal: {str(e)}")
+    return open(filename, 'a', encoding='utf-8')
+
+
+# יומן פעולות שנכתב רק בהוספה (append-only) לצד קובץ ה-snapshot
+class Journal:
+    def __init__(self, filename, fsync=False, compact_bytes=DEFAULT_COMPACT_BYTES):
+        self.filename = filename
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._pending = []
+        _drop_torn_tail(filename)
+        self._file = open(filename, 'a', encoding='utf-8')
+        self.size = self._file.tell()
+
+    def append(self, record):
+        """Queue one operation record; it reaches the disk on the next flush"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._pending.append(line)
+
+    def flush(self):
+        """Write the queued records to the end of the journal file"""
+        with self._lock:
+            if not self._pending:
+                return
+            data = "".join(self._pending)
+            try:
+                self._file.write(data)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError:
+                # הרשומות נשארות בתור לניסיון הבא, ומה שנכתב חלקית נחתך
+                self._file = _reopen_at(self._file, self.filename, self.size)
+                raise
+            self._pending.clear()
+            self.size += len(data.encode('utf-8'))
+
+    def needs_compaction(self):
+        return self.size >= self.compact_bytes
+
+    def truncate(self):
+        """Drop every record already folded into a snapshot"""
+        with self._lock:
+            self._file.truncate(0)
+            self._file.seek(0)
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.size = 0
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._file.close()
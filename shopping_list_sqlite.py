@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+from decimal import Decimal
+from shopping_list import ShoppingList, CategoryDictionary
+from item_model import Item, SCHEMA_VERSION
+
+DEFAULT_DATABASE_FILENAME = "shopping_lists.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    household TEXT NOT NULL,
+    name TEXT NOT NULL,
+    quantity NUMERIC NOT NULL,
+    category TEXT,
+    price REAL,
+    unit TEXT,
+    added_by TEXT,
+    added_at INTEGER,
+    updated_at INTEGER,
+    PRIMARY KEY (household, name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS category_dictionary (
+    household TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (household, item_name)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS category_dictionary_by_category
+    ON category_dictionary (household, category);
+
+CREATE TABLE IF NOT EXISTS households (
+    household TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# שאילתות קבועות - sqlite3 שומר אותן מוכנות (prepared) במטמון של החיבור
+ITEM_COLUMNS = ('quantity', 'category', 'price', 'unit', 'added_by', 'added_at', 'updated_at')
+SELECT_ITEMS = f"SELECT name, {', '.join(ITEM_COLUMNS)} FROM items WHERE household = ?"
+SELECT_DICTIONARY = "SELECT item_name, category FROM category_dictionary WHERE household = ?"
+UPSERT_ITEM = (
+    f"INSERT INTO items (household, name, {', '.join(ITEM_COLUMNS)}) VALUES (?, ?, {', '.join('?' * len(ITEM_COLUMNS))}) "
+    f"ON CONFLICT (household, name) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in ITEM_COLUMNS)}"
+)
+DELETE_ITEM = "DELETE FROM items WHERE household = ? AND name = ?"
+DELETE_ITEMS = "DELETE FROM items WHERE household = ?"
+UPSERT_DICTIONARY = (
+    "INSERT INTO category_dictionary (household, item_name, category) VALUES (?, ?, ?) "
+    "ON CONFLICT (household, item_name) DO UPDATE SET category = excluded.category"
+)
+DELETE_DICTIONARY = "DELETE FROM category_dictionary WHERE household = ? AND item_name = ?"
+# מספר הפעולה האחרונה של כל משק בית, כדי ש-seq ימשיך ממנו אחרי טעינה מחדש
+SELECT_SEQ = "SELECT seq FROM households WHERE household = ?"
+UPSERT_SEQ = (
+    "INSERT INTO households (household, seq) VALUES (?, ?) "
+    "ON CONFLICT (household) DO UPDATE SET seq = excluded.seq"
+)
+
+
+# sqlite3 לא יודע לשמור Decimal. מחרוזת שנשמרת בעמודה מספרית נשמרת כמספר, כמו float.
+def _bindable(value):
+    return str(value) if isinstance(value, Decimal) else value
+
+
+# מסד נתונים אחד לכל משקי הבית - כל שינוי נוגע רק בשורות של הפריט שהשתנה
+class SQLiteBackend:
+    def __init__(self, filename=DEFAULT_DATABASE_FILENAME, fsync=False):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._connection.executescript(SCHEMA)
+        self._connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self._connection.commit()
+
+    def load_list(self, household):
+        """Build the ShoppingList of one household; its later mutations are written back row by row"""
+        shopping_list = ShoppingList()
+        with self._lock:
+            shopping_list.items = {
+                row[0]: Item(*row[1:]) for row in self._connection.execute(SELECT_ITEMS, (household,))
+            }
+            row = self._connection.execute(SELECT_SEQ, (household,)).fetchone()
+            shopping_list.seq = row[0] if row else 0
+        shopping_list.attach_journal(_HouseholdJournal(self, household, shopping_list))
+        return shopping_list
+
+    def load_categories(self, household):
+        """Build the item -> category dictionary of one household"""
+        with self._lock:
+            categories = CategoryDictionary(self._connection.execute(SELECT_DICTIONARY, (household,)))
+
+        def write_category(item_name, category):
+            if category is None:
+                self.execute(DELETE_DICTIONARY, (household, item_name))
+            else:
+                self.execute(UPSERT_DICTIONARY, (household, item_name, category))
+
+        categories.subscribe(write_category)
+        return categories
+
+    def execute(self, sql, params):
+        with self._lock:
+            self._connection.execute(sql, params)
+
+    def commit(self):
+        with self._lock:
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+
+# מתרגם את רשומות היומן של ShoppingList לעדכוני שורות במסד הנתונים
+class _HouseholdJournal:
+    def __init__(self, backend, household, shopping_list):
+        self.backend = backend
+        self.household = household
+        self.shopping_list = shopping_list
+
+    def append(self, record):
+        self.backend.execute(UPSERT_SEQ, (self.household, record['seq']))
+        if record['op'] == 'clear':
+            self.backend.execute(DELETE_ITEMS, (self.household,))
+            return
+        # כותבים את המצב הנוכחי של הפריט, כך שאין צורך לחשב כמויות ב-SQL
+        name = record['name']
+        item = self.shopping_list.items.get(name)
+        if item is None:
+            self.backend.execute(DELETE_ITEM, (self.household, name))
+        else:
+            row = (self.household, name) + tuple(_bindable(getattr(item, column)) for column in ITEM_COLUMNS)
+            self.backend.execute(UPSERT_ITEM, row)
@@ -0,0 +1,320 @@
+import asyncio
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from shopping_list import ShoppingList, CategoryDictionary, MappedCategoryDictionary, load_categories_file, save_categories_file
+from item_model import SCHEMA_VERSION
+from shopping_list_journal import Journal, journal_filename, DEFAULT_COMPACT_BYTES
+import metrics
+
+LIST_FILENAME = "shared_shopping_list.json"
+CATEGORIES_FILENAME = "categories.json"
+
+# מצבי עמידות: כתיבה מיידית עם fsync, או צבירת שינויים וכתיבה כל N מילישניות
+DURABILITY_FSYNC = 'fsync'
+DURABILITY_INTERVAL = 'interval'
+DEFAULT_FLUSH_INTERVAL_MS = 500
+
+# אופן שמירת הרשימה: כתיבה מלאה של הקובץ, יומן פעולות עם דחיסה תקופתית,
+# או מסד SQLite עם רשימה נפרדת לכל משק בית
+BACKEND_JSON = 'json'
+BACKEND_JOURNAL = 'journal'
+BACKEND_SQLITE = 'sqlite'
+
+# בקבצי JSON יש רשימה אחת בלבד, המשותפת לכל הצ'אטים המורשים. ב-SQLite זה משק הבית של
+# PARTNER_CHAT_ID כשלא הוגדר HOUSEHOLDS.
+SHARED_HOUSEHOLD = 'shared'
+
+# ב-SQLite: כמה משקי בית נשמרים בזיכרון; מעבר לזה משקי בית שלא בשימוש יוצאים מהזיכרון
+DEFAULT_MAX_HOUSEHOLDS = 1000
+
+
+# מיפוי צ'אט -> משק בית מתוך HOUSEHOLDS: קבוצות צ'אטים מופרדות ב-; והצ'אטים בקבוצה בפסיקים,
+# למשל "111,222;333". כל קבוצה היא משק בית אחד שנקרא על שם הצ'אט הראשון בה.
+# בלי HOUSEHOLDS כל ה-partners הם משק בית אחד (SHARED_HOUSEHOLD).
+def parse_households(spec, partners=()):
+    """Return {chat id: household} for a HOUSEHOLDS spec, or for one shared household of partners"""
+    if not spec:
+        return {chat_id.strip(): SHARED_HOUSEHOLD for chat_id in partners if chat_id.strip()}
+    households = {}
+    for group in spec.split(';'):
+        chat_ids = [chat_id.strip() for chat_id in group.split(',') if chat_id.strip()]
+        for chat_id in chat_ids:
+            households[chat_id] = chat_ids[0]
+    return households
+
+
+# גודל קובץ בבתים (0 אם הוא לא קיים) - לספירת הבתים שנקראו ונכתבו
+def _file_size(filename):
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+# מאגר בזיכרון לרשימות הקניות ולמילוני הקטגוריות, עם כתיבה מושהית לדיסק
+class ShoppingListStore:
+    def __init__(self, list_filename=LIST_FILENAME, categories_filename=CATEGORIES_FILENAME,
+                 durability=DURABILITY_INTERVAL, flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS,
+                 backend=BACKEND_JOURNAL, compact_bytes=DEFAULT_COMPACT_BYTES, database_filename=None,
+                 households=None, max_households=DEFAULT_MAX_HOUSEHOLDS):
+        if durability not in (DURABILITY_FSYNC, DURABILITY_INTERVAL):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        if backend not in (BACKEND_JSON, BACKEND_JOURNAL, BACKEND_SQLITE):
+            raise ValueError(f"Unknown storage backend: {backend}")
+        self.list_filename = list_filename
+        self.categories_filename = categories_filename
+        self.durability = durability
+        self.flush_interval = flush_interval_ms / 1000
+        self.backend = backend
+        self.compact_bytes = compact_bytes
+        self.households = households or {}  # צ'אט -> משק בית (ב-SQLite); צ'אט שלא מופיע הוא משק בית לבד
+        self.max_households = max_households
+        self._database = None
+        if backend == BACKEND_SQLITE:
+            from shopping_list_sqlite import SQLiteBackend, DEFAULT_DATABASE_FILENAME
+            self._database = SQLiteBackend(
+                database_filename or DEFAULT_DATABASE_FILENAME,
+                fsync=durability == DURABILITY_FSYNC,
+            )
+        self._journal = None
+        self._lock = threading.RLock()
+        self._lists = {}
+        self._categories = {}
+        self._dirty_lists = set()
+        self._dirty_categories = set()
+        self._timer = None
+        self._household_locks = {}
+        self._recent = OrderedDict()  # משקי הבית שבזיכרון, מהשימוש הישן לחדש
+
+    def household(self, household):
+        """Map a household id (a chat id) to the key its data is stored under"""
+        if self._database is None:
+            return SHARED_HOUSEHOLD
+        return self.households.get(str(household), str(household))
+
+    def lock(self, household=SHARED_HOUSEHOLD):
+        """Return the asyncio.Lock that serializes updates to one household's list"""
+        household = self.household(household)
+        with self._lock:
+            self._touch(household)
+            lock = self._household_locks.get(household)
+            if lock is None:
+                lock = self._household_locks[household] = asyncio.Lock()
+            return lock
+
+    # ב-SQLite משקי בית נטענים לפי הצורך, והנתונים שלהם כבר במסד. כשיש יותר מ-max_households
+    # בזיכרון, משקי הבית הכי פחות בשימוש יוצאים ממנו (הרשימה, המילון והנעילה) - חוץ מאלה
+    # שהנעילה שלהם תפוסה, שיש בהם שינוי שעוד לא נכתב או שמישהו מאזין לרשימה שלהם.
+    def _touch(self, household):
+        if self._database is None:
+            return
+        self._recent[household] = None
+        self._recent.move_to_end(household)
+        for idle in list(self._recent):
+            if len(self._recent) <= self.max_households:
+                break
+            if idle != household and self._is_idle(idle):
+                del self._recent[idle]
+                self._lists.pop(idle, None)
+                self._categories.pop(idle, None)
+                self._household_locks.pop(idle, None)
+
+    def _is_idle(self, household):
+        lock = self._household_locks.get(household)
+        shopping_list = self._lists.get(household)
+        return not (
+            (lock is not None and lock.locked())
+            or household in self._dirty_lists
+            or household in self._dirty_categories
+            or (shopping_list is not None and shopping_list.watched)
+        )
+
+    def get_list(self, household=SHARED_HOUSEHOLD):
+        """Return the resident shopping list of a household, loading it on first use"""
+        household = self.household(household)
+        with self._lock:
+            self._touch(household)
+            shopping_list = self._lists.get(household)
+            if shopping_list is None:
+                shopping_list = self._load_list(household)
+                self._lists[household] = shopping_list
+            return shopping_list
+
+    def _load_list(self, household):
+        if self._database is not None:
+            return self._database.load_list(household)
+        # גם בלי snapshot (לפני הדחיסה הראשונה) היומן מכיל את כל הרשימה, ולכן תמיד טוענים דרך
+        # load_from_file - הוא מתעלם מ-snapshot חסר ומריץ מחדש את היומן
+        shopping_list = ShoppingList.load_from_file(self.list_filename)
+        metrics.bytes_read.inc(
+            _file_size(self.list_filename) + _file_size(journal_filename(self.list_filename)),
+            file=os.path.basename(self.list_filename),
+        )
+        if self.backend == BACKEND_JOURNAL:
+            self._journal = Journal(
+                journal_filename(self.list_filename),
+                fsync=self.durability == DURABILITY_FSYNC,
+                compact_bytes=self.compact_bytes,
+            )
+            shopping_list.attach_journal(self._journal)
+        if shopping_list.loaded_version < SCHEMA_VERSION:
+            # קובץ בפורמט ישן נכתב מחדש מיד בפורמט הנוכחי (יחד עם מה שהיה ביומן)
+            shopping_list.save_to_file(self.list_filename, fsync=self.durability == DURABILITY_FSYNC)
+            if self._journal is not None:
+                self._journal.truncate()
+        return shopping_list
+
+    def get_categories(self, household=SHARED_HOUSEHOLD):
+        """Return the resident item -> category dictionary of a household"""
+        household = self.household(household)
+        with self._lock:
+            self._touch(household)
+            categories = self._categories.get(household)
+            if categories is None:
+                categories = self._load_categories(household)
+                self._categories[household] = categories
+            return categories
+
+    def _load_categories(self, household):
+        if self._database is not None:
+            return self._database.load_categories(household)
+        if os.path.exists(self.categories_filename):
+            metrics.bytes_read.inc(_file_size(self.categories_filename), file=os.path.basename(self.categories_filename))
+            return load_categories_file(self.categories_filename)
+        return CategoryDictionary()
+
+    def mark_list_dirty(self, household=SHARED_HOUSEHOLD):
+        """Record that a shopping list changed and schedule it for writing"""
+        with self._lock:
+            self._dirty_lists.add(self.household(household))
+        self._after_change()
+
+    def mark_categories_dirty(self, household=SHARED_HOUSEHOLD):
+        """Record that a category dictionary changed and schedule it for writing"""
+        with self._lock:
+            self._dirty_categories.add(self.household(household))
+        self._after_change()
+
+    def _after_change(self):
+        if self.durability == DURABILITY_FSYNC:
+            self.flush()
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # בלי לולאת אירועים אין מי שיריץ את הכתיבה המושהית, ולכן כותבים מיד
+            self.flush()
+            return
+        # הכתיבה המושהית רצה בלולאת האירועים עצמה, בין הטיפול בהודעות, ולא בחוט נפרד -
+        # כך היא אף פעם לא קוראת רשימה או מילון בזמן שמטפל אחר משנה אותם
+        with self._lock:
+            if self._timer is None:
+                self._timer = loop.call_later(self.flush_interval, self._flush_from_timer)
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error in store flush: {str(e)}")
+            # השינויים נשארו מסומנים, וננסה לכתוב אותם שוב בעוד מרווח
+            self._after_change()
+
+    @metrics.timed(metrics.persistence_seconds, operation='flush')
+    def flush(self):
+        """Write every dirty piece of state to disk"""
+        fsync = self.durability == DURABILITY_FSYNC
+        with self._lock:
+            dirty_lists, self._dirty_lists = self._dirty_lists, set()
+            dirty_categories, self._dirty_categories = self._dirty_categories, set()
+            try:
+                self._write(dirty_lists, dirty_categories, fsync)
+            except Exception:
+                # מה שלא נכתב מסומן שוב, כדי שה-flush הבא (או close) ינסה לכתוב אותו
+                self._dirty_lists |= dirty_lists
+                self._dirty_categories |= dirty_categories
+                raise
+
+    def _write(self, dirty_lists, dirty_categories, fsync):
+        if self._database is not None:
+            # השורות כבר עודכנו בזמן השינוי, נשאר רק לבצע commit
+            if dirty_lists or dirty_categories:
+                self._database.commit()
+            return
+        if dirty_lists and SHARED_HOUSEHOLD in self._lists:
+            if self._journal is None:
+                self._lists[SHARED_HOUSEHOLD].save_to_file(self.list_filename, fsync=fsync)
+                self._count_written(self.list_filename)
+            else:
+                size = self._journal.size
+                self._journal.flush()
+                metrics.bytes_written.inc(self._journal.size - size, file=os.path.basename(self._journal.filename))
+                if self._journal.needs_compaction():
+                    self.compact()
+        if dirty_categories and SHARED_HOUSEHOLD in self._categories:
+            save_categories_file(self.categories_filename, self._categories[SHARED_HOUSEHOLD], fsync=fsync)
+            self._count_written(self.categories_filename)
+
+    def _count_written(self, filename):
+        metrics.bytes_written.inc(_file_size(filename), file=os.path.basename(filename))
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and start a new, empty journal"""
+        with self._lock:
+            if self._journal is None:
+                return
+            self._journal.flush()
+            self._lists[SHARED_HOUSEHOLD].save_to_file(self.list_filename, fsync=self.durability == DURABILITY_FSYNC)
+            self._count_written(self.list_filename)
+            self._journal.truncate()
+
+    def list_sizes(self):
+        """Return {household: number of items} for the lists loaded in memory"""
+        with self._lock:
+            return {household: len(shopping_list.items) for household, shopping_list in self._lists.items()}
+
+    def close(self):
+        """Cancel the pending timer and write whatever is still dirty"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._database is not None:
+                self._database.close()
+                self._database = None
+            self._lists.clear()
+            self._recent.clear()
+            for categories in self._categories.values():
+                if isinstance(categories, MappedCategoryDictionary):
+                    categories.close()
+            self._categories.clear()
+
+
+_store = None
+
+
+# קבלת המאגר המשותף לתהליך (נוצר בפעם הראשונה לפי משתני הסביבה)
+def get_store():
+    global _store
+    if _store is None:
+        _store = ShoppingListStore(
+            list_filename=os.getenv('LIST_FILENAME', LIST_FILENAME),
+            categories_filename=os.getenv('CATEGORIES_FILENAME', CATEGORIES_FILENAME),
+            durability=os.getenv('STORE_DURABILITY', DURABILITY_INTERVAL),
+            flush_interval_ms=int(os.getenv('STORE_FLUSH_MS', DEFAULT_FLUSH_INTERVAL_MS)),
+            backend=os.getenv('STORAGE_BACKEND', BACKEND_JOURNAL),
+            compact_bytes=int(os.getenv('JOURNAL_COMPACT_BYTES', DEFAULT_COMPACT_BYTES)),
+            database_filename=os.getenv('DATABASE_FILENAME'),
+            households=parse_households(os.getenv('HOUSEHOLDS'), os.getenv('PARTNER_CHAT_ID', '').split(',')),
+            max_households=int(os.getenv('MAX_HOUSEHOLDS', DEFAULT_MAX_HOUSEHOLDS)),
+        )
+        atexit.register(_store.close)
+    return _store
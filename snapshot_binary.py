@@ -0,0 +1,284 @@
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from item_model import Item, SCHEMA_VERSION, migrate_snapshot
+
+# קבצי snapshot בינאריים מזוהים לפי הסיומת; כל שם אחר נשמר כ-JSON
+BINARY_EXTENSION = '.bin'
+
+MAGIC = b'SLB1'
+FORMAT_VERSION = 1
+KIND_LIST = 1
+KIND_CATEGORIES = 2
+
+# מבנה הקובץ (little-endian):
+#   כותרת: MAGIC, גרסת פורמט, סוג (רשימה/קטגוריות), seq, מספר מחרוזות, מספר רשומות
+#   טבלת היסטים של המחרוזות: מספר מחרוזות + 1 ערכי uint32 (סוף המחרוזת i הוא תחילת i+1)
+#   רשומות באורך קבוע שמפנות למחרוזות לפי מספר
+#   כל המחרוזות ב-UTF-8 ואחרי כל אחת תו NUL, כל מחרוזת פעם אחת בלבד (שמות קטגוריות חוזרים
+#   על עצמם הרבה). ה-NUL מאפשר לפענח את כל הטבלה בקריאה אחת ל-decode ו-split.
+HEADER = struct.Struct('<4sHHQII')
+OFFSET = struct.Struct('<I')
+# שם, קטגוריה, יחידה, מי הוסיף, כמות, מחיר, זמן הוספה, זמן עדכון
+LIST_RECORD = struct.Struct('<IIIIddqq')
+# שם פריט, קטגוריה
+CATEGORY_RECORD = struct.Struct('<II')
+
+NO_STRING = 0xFFFFFFFF
+
+
+def is_binary_filename(filename):
+    return filename.endswith(BINARY_EXTENSION)
+
+
+# טבלת מחרוזות: כל מחרוזת מקבלת מספר בפעם הראשונה שהיא מופיעה
+class _StringTable:
+    def __init__(self):
+        self._ids = {}
+        self._encoded = []
+
+    def id(self, value):
+        if value is None:
+            return NO_STRING
+        string_id = self._ids.get(value)
+        if string_id is None:
+            if '\0' in value:
+                raise ValueError(f"Can't store a string with a NUL character: {value!r}")
+            string_id = self._ids[value] = len(self._encoded)
+            self._encoded.append(value.encode('utf-8') + b'\0')
+        return string_id
+
+    def __len__(self):
+        return len(self._encoded)
+
+    def pack(self):
+        offsets = bytearray()
+        position = 0
+        for data in self._encoded:
+            offsets += OFFSET.pack(position)
+            position += len(data)
+        offsets += OFFSET.pack(position)
+        return bytes(offsets), b''.join(self._encoded)
+
+
+def _write(filename, kind, seq, strings, records, fsync=False):
+    offsets, blob = strings.pack()
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, kind, seq, len(strings), len(records)))
+        f.write(offsets)
+        f.write(b''.join(records))
+        f.write(blob)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+# קובץ snapshot בינארי ממופה לזיכרון, לקריאה בלבד.
+# על Windows אי אפשר להחליף קובץ ממופה, ולכן צריך לסגור (close או with) לפני שמירה מחדש.
+class MappedSnapshot:
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.kind, self.seq, self._string_count, self.record_count = \
+                HEADER.unpack_from(self._map)
+        except struct.error:
+            self._map.close()
+            raise ValueError(f"{filename} is not a binary shopping list snapshot")
+        if magic != MAGIC or version > FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"{filename} is not a supported binary snapshot (version {version})")
+        self._record = LIST_RECORD if self.kind == KIND_LIST else CATEGORY_RECORD
+        self._offsets = HEADER.size
+        self._records = self._offsets + OFFSET.size * (self._string_count + 1)
+        self._strings = self._records + self._record.size * self.record_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        start, end = struct.unpack_from('<II', self._map, self._offsets + OFFSET.size * string_id)
+        return self._map[self._strings + start:self._strings + end - 1].decode('utf-8')
+
+    def strings(self):
+        """Decode the whole string table at once (much faster than string() for full loads)"""
+        if not self._string_count:
+            return []
+        return self._map[self._strings:].decode('utf-8').split('\0')[:-1]
+
+    def record_bytes(self):
+        return self._map[self._records:self._strings]
+
+    def record(self, index):
+        return self._record.unpack_from(self._map, self._records + self._record.size * index)
+
+    def records(self):
+        return self._record.iter_unpack(self.record_bytes())
+
+
+# רצף "וירטואלי" של שמות הרשומות, בשביל bisect
+class _RecordNames:
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return self._snapshot.record_count
+
+    def __getitem__(self, index):
+        return self._snapshot.string(self._snapshot.record(index)[0])
+
+
+# מילון קטגוריות לקריאה בלבד ישירות מהקובץ: הרשומות ממוינות לפי שם הפריט, ולכן חיפוש פריט
+# הוא חיפוש בינארי שמפענח O(log n) מחרוזות בלי לטעון את כל הקובץ
+class MappedCategories(MappedSnapshot):
+    def __init__(self, filename):
+        super().__init__(filename)
+        if self.kind != KIND_CATEGORIES:
+            self.close()
+            raise ValueError(f"{filename} is not a binary category dictionary")
+
+    def find(self, name):
+        """Return the index of the record named name, or None"""
+        names = _RecordNames(self)
+        index = bisect_left(names, name)
+        if index < self.record_count and names[index] == name:
+            return index
+        return None
+
+    def get(self, name, default=None):
+        index = self.find(name)
+        if index is None:
+            return default
+        return self.string(self.record(index)[1])
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def __len__(self):
+        return self.record_count
+
+    def to_dict(self):
+        """Decode every record at once into a plain dict"""
+        strings = self.strings()
+        # כל רשומה היא זוג מספרי מחרוזות, ולכן כל הרשומות נקראות כמערך אחד של uint32
+        ids = array('I', self.record_bytes())
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        categories = ids[1::2]
+        if NO_STRING in categories:
+            # פריט בלי קטגוריה (נדיר) - רק אז יש צורך בבדיקה לכל רשומה
+            categories = [None if string_id == NO_STRING else strings[string_id] for string_id in categories]
+        else:
+            categories = map(strings.__getitem__, categories)
+        return dict(zip(map(strings.__getitem__, ids[0::2]), categories))
+
+
+def _optional(value):
+    return None if math.isnan(value) else value
+
+
+# שמירת רשימה בפורמט הבינארי
+def write_list(filename, seq, items, fsync=False):
+    """Write seq and {name: Item} as a binary list snapshot"""
+    strings = _StringTable()
+    records = [
+        LIST_RECORD.pack(
+            strings.id(name), strings.id(item.category), strings.id(item.unit), strings.id(item.added_by),
+            item.quantity, item.price if item.price is not None else math.nan, item.added_at, item.updated_at,
+        )
+        for name, item in items.items()
+    ]
+    _write(filename, KIND_LIST, seq, strings, records, fsync)
+
+
+def read_list(filename):
+    """Return (seq, {name: Item}) from a binary list snapshot"""
+    with MappedSnapshot(filename) as snapshot:
+        if snapshot.kind != KIND_LIST:
+            raise ValueError(f"{filename} is not a binary shopping list")
+        strings = snapshot.strings()
+
+        def string(string_id):
+            return strings[string_id] if string_id != NO_STRING else None
+
+        items = {}
+        for name, category, unit, added_by, quantity, price, added_at, updated_at in snapshot.records():
+            # כמויות שלמות נשמרות כ-double וחוזרות כ-int, כדי שיוצגו "2" ולא "2.0"
+            quantity = int(quantity) if quantity.is_integer() else quantity
+            items[strings[name]] = Item(quantity, string(category), _optional(price), string(unit),
+                                        string(added_by), added_at, updated_at)
+        return snapshot.seq, items
+
+
+# שמירת מילון קטגוריות בפורמט הבינארי, ממוין לפי שם (אותו מילון נשמר תמיד לאותו קובץ)
+def write_categories(filename, categories, fsync=False):
+    strings = _StringTable()
+    records = [CATEGORY_RECORD.pack(strings.id(name), strings.id(categories[name])) for name in sorted(categories)]
+    _write(filename, KIND_CATEGORIES, 0, strings, records, fsync)
+
+
+def read_categories(filename):
+    """Return the binary category dictionary as a plain dict"""
+    with MappedCategories(filename) as categories:
+        return categories.to_dict()
+
+
+# המרה בין JSON לפורמט הבינארי. סוג הקובץ (רשימה או מילון קטגוריות) מזוהה מהתוכן.
+def export_binary(json_filename, binary_filename):
+    """Convert a JSON list snapshot or categories.json to the binary format"""
+    with open(json_filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if _is_list_snapshot(data):
+        data = migrate_snapshot(data)
+        write_list(binary_filename, data['seq'],
+                   {name: Item.from_dict(item) for name, item in data['items'].items()})
+    else:
+        write_categories(binary_filename, data)
+
+
+def import_binary(binary_filename, json_filename):
+    """Convert a binary snapshot back to the JSON format it was made from"""
+    with MappedSnapshot(binary_filename) as snapshot:
+        kind = snapshot.kind
+    if kind == KIND_LIST:
+        seq, items = read_list(binary_filename)
+        data = {'version': SCHEMA_VERSION, 'seq': seq, 'items': {name: item.to_dict() for name, item in items.items()}}
+    else:
+        data = read_categories(binary_filename)
+    # ייבוא מקומי כדי למנוע ייבוא מעגלי (shopping_list משתמש במודול הזה)
+    from shopping_list import write_json_atomic
+    write_json_atomic(json_filename, data)
+
+
+# snapshot של רשימה תמיד מכיל items (בכל הגרסאות); categories.json הוא מילון שטוח של מחרוזות
+def _is_list_snapshot(data):
+    return isinstance(data.get('items'), dict)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert shopping list snapshots between JSON and binary")
+    parser.add_argument('source')
+    parser.add_argument('destination')
+    args = parser.parse_args()
+    if is_binary_filename(args.source):
+        import_binary(args.source, args.destination)
+    else:
+        export_binary(args.source, args.destination)
+    print(f"{args.source} -> {args.destination}")
@@ -1,9 +1,8 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-from shopping_list import ShoppingList
-import json
+import asyncio
+import contextvars
+import functools
+import inspect
 import os
-import re
 from dotenv import load_dotenv
 
 # טעינת משתני הסביבה
@@ -15,94 +14,454 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 # קבלת מזהי המשתמשים המורשים ממשתנה הסביבה (רשימה מופרדת בפסיק)
 PARTNER_CHAT_IDS = os.getenv('PARTNER_CHAT_ID', '').split(',')
 
-# טעינת רשימת הקניות מהקובץ או יצירת חדשה
-def load_shopping_list():
-    filename = "shared_shopping_list.json"
-    if os.path.exists(filename):
-        return ShoppingList.load_from_file(filename)
-    return ShoppingList()
-
-# שמירת רשימת הקניות לקובץ
-def save_shopping_list(shopping_list):
-    filename = "shared_shopping_list.json"
-    shopping_list.save_to_file(filename)
-
-# טעינת קטגוריות קבועות
-def load_categories():
-    if os.path.exists("categories.json"):
-        with open("categories.json", 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-# שמירת קטגוריות קבועות
-def save_categories(categories):
-    with open("categories.json", 'w', encoding='utf-8') as f:
-        json.dump(categories, f, ensure_ascii=False, indent=4)
-
-# פונקציה לזיהוי כמות מהטקסט
-def extract_quantity(text):
-    # אם אין מספרים בטקסט, מחזיר 1
-    if not re.search(r'\d+', text):
-        return 1
-    
-    # אם יש מספרים, מחזיר את הראשון
-    numbers = re.findall(r'\d+', text)
-    return int(numbers[0]) if numbers else 1
-
-# פונקציה לזיהוי פעולה מהטקסט
-def detect_action(text):
-    text = text.lower()
-    remove_words = ['קניתי', 'קנית', 'קנו', 'קנתה', 'קנו', 'מחק', 'הסר', 'הסרתי', 'הסיר', 'קנה', 'קנתה']
-    if any(word in text for word in remove_words):
-        return 'remove'
-    return 'add'
+# אופן קבלת העדכונים: polling (ברירת מחדל) או webhook.
+# ב-Procfile יש תהליך worker (polling) ותהליך web (webhook, מאזין ל-PORT); מפעילים רק אחד מהם,
+# למשל heroku ps:scale worker=0 web=1, כי polling מוחק את ה-webhook ולהפך.
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+
+# בדיקת ההגדרות שבלעדיהן אי אפשר להפעיל את הבוט; מחזירה הודעת שגיאה או None
+def config_error():
+    if not BOT_TOKEN:
+        return "Error: BOT_TOKEN not found in environment variables"
+    if not PARTNER_CHAT_IDS:
+        return "Error: PARTNER_CHAT_ID not found in environment variables"
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        return "Error: WEBHOOK_URL not found in environment variables"
+    # בלי סוד כל מי שמכיר את הכתובת יכול לשלוח לבוט עדכונים בשם המשתמשים המורשים
+    if BOT_MODE == 'webhook' and not WEBHOOK_SECRET:
+        return "Error: WEBHOOK_SECRET not found in environment variables"
+    return None
+
+# בהרצה ישירה עם הגדרות חסרות יוצאים מיד, לפני טעינת python-telegram-bot (רוב זמן ההפעלה)
+if __name__ == "__main__" and config_error():
+    print(config_error())
+    raise SystemExit(1)
+
+from telegram import (  # noqa: E402
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent,
+)
+from telegram.error import TelegramError  # noqa: E402
+from telegram.ext import (  # noqa: E402
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, InlineQueryHandler, ContextTypes, filters,
+)
+from shopping_list_store import get_store, SHARED_HOUSEHOLD  # noqa: E402
+from shopping_list import complete_item_names  # noqa: E402
+from fuzzy_index import FOLDED_MATCH_SCORE  # noqa: E402
+from pagination import page_slice, split_message  # noqa: E402
+from callback_registry import CallbackRegistry  # noqa: E402
+from outbound import OutboundQueue, TelegramRateLimiter  # noqa: E402
+from live_list import LiveListMessages, DEFAULT_DEBOUNCE_MS  # noqa: E402
+from conversation_state import get_conversations, expire_periodically, PROMPT_CATEGORY  # noqa: E402
+from purchase_history import get_history, KIND_BOUGHT, KIND_REMOVED  # noqa: E402
+from list_sync import ListSync, sync_periodically  # noqa: E402
+import metrics  # noqa: E402
+from intent_parser import (  # noqa: E402
+    parse_message, parse_items, ACTION_ADD, ACTION_BUY, ACTION_SET_CATEGORY, COMMAND_LIST, COMMAND_CLEAR,
+    COMMAND_CATEGORIES, COMMAND_CHANGE_CATEGORY, COMMAND_DELETE_CATEGORY, COMMAND_SUMMARY, COMMAND_SUGGEST,
+)
+
+# שליחת התראה לשאר השותפים כשמישהו משנה את הרשימה המשותפת
+NOTIFY_PARTNERS = os.getenv('NOTIFY_PARTNERS', '1') != '0'
+
+# הודעת רשימה חיה: הרשימה האחרונה שנשלחה לצ'אט מוצמדת ומתעדכנת בעריכה אחרי כל שינוי
+LIVE_LIST = os.getenv('LIVE_LIST', '1') != '0'
+LIVE_LIST_DEBOUNCE_MS = int(os.getenv('LIVE_LIST_DEBOUNCE_MS', DEFAULT_DEBOUNCE_MS))
+
+# ניחוש קטגוריה לפריט חדש: מעל הביטחון הזה הקטגוריה נקבעת בלי לשאול (1 ומעלה - תמיד שואלים)
+AUTO_CATEGORY_CONFIDENCE = float(os.getenv('AUTO_CATEGORY_CONFIDENCE', '0.9'))
+
+# מצב inline: כמה השלמות מוחזרות לכל שאילתה (טלגרם מגביל ל-50), וכמה שניות טלגרם שומר אותן
+INLINE_RESULTS = int(os.getenv('INLINE_RESULTS', '20'))
+INLINE_CACHE_SECONDS = int(os.getenv('INLINE_CACHE_SECONDS', '5'))
+
+# סנכרון הרשימה עם הממשק הגרפי דרך תיקייה משותפת (כבוי כש-SYNC_DIR לא מוגדר).
+# הרשימה שמסונכרנת היא של SYNC_CHAT_ID (ברירת מחדל: השותף הראשון)
+SYNC_DIR = os.getenv('SYNC_DIR')
+SYNC_REPLICA = os.getenv('SYNC_REPLICA', 'bot')
+SYNC_CHAT_ID = os.getenv('SYNC_CHAT_ID') or next(
+    (id.strip() for id in PARTNER_CHAT_IDS if id.strip()), SHARED_HOUSEHOLD
+)
+SYNC_INTERVAL_SECONDS = float(os.getenv('SYNC_INTERVAL_SECONDS', '2'))
+
+# מדדים במצב webhook: עם METRICS_TOKEN נקודת /metrics נמצאת בפורט הציבורי ודורשת את הטוקן,
+# ובלעדיו היא בשרת נפרד על 127.0.0.1:METRICS_PORT. והדפסה תקופתית ללוג כל N שניות (0 - כבוי)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9090'))
+METRICS_LOG_INTERVAL = int(os.getenv('METRICS_LOG_INTERVAL', '0'))
+
+# קבלת רשימת הקניות של הצ'אט מהמאגר שבזיכרון
+# (בקבצי JSON כל הצ'אטים חולקים רשימה אחת, ב-SQLite הרשימה של משק הבית של הצ'אט - HOUSEHOLDS)
+@metrics.timed(metrics.persistence_seconds, operation='load_list')
+def load_shopping_list(chat_id):
+    return get_store().get_list(chat_id)
+
+# סימון רשימת הקניות לשמירה (הכתיבה לדיסק מתבצעת ברקע לפי מצב העמידות)
+@metrics.timed(metrics.persistence_seconds, operation='save_list')
+def save_shopping_list(shopping_list, chat_id):
+    get_store().mark_list_dirty(chat_id)
+
+# קבלת הקטגוריות הקבועות של הצ'אט מהמאגר שבזיכרון
+@metrics.timed(metrics.persistence_seconds, operation='load_categories')
+def load_categories(chat_id):
+    return get_store().get_categories(chat_id)
+
+# סימון הקטגוריות הקבועות לשמירה
+@metrics.timed(metrics.persistence_seconds, operation='save_categories')
+def save_categories(categories, chat_id):
+    get_store().mark_categories_dirty(chat_id)
+
+# פרופיילינג שאפשר להפעיל לצ'אט אחד בזמן ריצה עם /profile
+profiler = metrics.ChatProfiler()
+
+# עטיפה למטפל: מדידת זמן (כולל המתנה לנעילה), ספירת שגיאות, ופרופיילינג אם הופעל לצ'אט
+def instrumented(name):
+    def decorator(handler):
+        timed_handler = metrics.timed(metrics.handler_seconds, metrics.handler_errors, handler=name)(handler)
+
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            with profiler.profile(update.effective_chat.id):
+                return await timed_handler(update, context)
+        return wrapper
+    return decorator
+
+# השליחות שהמטפל הנוכחי ביקש, עד לשחרור הנעילה של משק הבית
+_unlocked_sends = contextvars.ContextVar('unlocked_sends', default=None)
+
+# שליחה לטלגרם מתוך מטפל שרץ בנעילה: נשמרת ומתבצעת רק אחרי שחרור הנעילה
+# (מחוץ לנעילה - מיד)
+async def send_after_unlock(send, *args, **kwargs):
+    sends = _unlocked_sends.get()
+    if sends is None:
+        result = send(*args, **kwargs)
+        if inspect.isawaitable(result):
+            await result
+        return
+    sends.append(functools.partial(send, *args, **kwargs))
+
+# עטיפה למטפל: עדכונים של אותו משק בית מעובדים אחד אחרי השני, כך שקריאה-שינוי-שמירה
+# לא נדרסת על ידי עדכון מקביל. עדכונים של משקי בית שונים רצים במקביל.
+# הנעילה מוחזקת רק לקריאה-שינוי-שמירה: התשובות וההתראות נשלחות אחרי השחרור, כך
+# שהמתנה לרשת או למגביל הקצב לא מעכבת את העדכון הבא של אותו משק בית.
+def serialized_per_household(handler):
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        sends = []
+        token = _unlocked_sends.set(sends)
+        try:
+            async with get_store().lock(update.effective_chat.id):
+                result = await handler(update, context)
+        finally:
+            _unlocked_sends.reset(token)
+        for send in sends:
+            sent = send()
+            if inspect.isawaitable(sent):
+                await sent
+        return result
+    return wrapper
+
+# תור השליחה של הבוט - נוצר בפעם הראשונה על הלולאה שמריצה את הבוט
+def get_outbound(application):
+    outbound = application.bot_data.get('outbound')
+    if outbound is None:
+        outbound = OutboundQueue(application.bot).start(asyncio.get_running_loop())
+        application.bot_data['outbound'] = outbound
+    return outbound
+
+# התראה לשאר השותפים של אותו משק בית על שינוי ברשימה - נכנסת לתור ולא מעכבת את התשובה למשתמש
+def notify_partners(application, chat_id, user):
+    store = get_store()
+    household = store.household(chat_id)
+    partners = [
+        id.strip() for id in PARTNER_CHAT_IDS
+        if id.strip() and id.strip() != str(chat_id) and store.household(id.strip()) == household
+    ]
+    if partners:
+        name = user.first_name if user and user.first_name else "השותף/ה שלך"
+        get_outbound(application).broadcast(partners, f"🔔 {name} עדכן/ה את רשימת הקניות")
+
+# ההודעות החיות של הצ'אטים - נטענות בפעם הראשונה על הלולאה שמריצה את הבוט
+def get_live_lists(application):
+    live_lists = application.bot_data.get('live_lists')
+    if live_lists is None:
+        live_lists = LiveListMessages(
+            get_outbound(application), load_shopping_list, list_page, debounce_ms=LIVE_LIST_DEBOUNCE_MS
+        )
+        application.bot_data['live_lists'] = live_lists
+    return live_lists
+
+# הפיכת הודעת רשימה שנשלחה להודעה החיה של הצ'אט: הצמדה, והסרת ההודעה החיה הקודמת
+async def make_live_list(application, chat_id, sent_message, text, reply_markup):
+    previous = get_live_lists(application).attach(chat_id, sent_message.message_id, text, reply_markup)
+    try:
+        await sent_message.pin(disable_notification=True)
+        if previous is not None and previous != sent_message.message_id:
+            await application.bot.delete_message(chat_id, previous)
+    except TelegramError as e:
+        # למשל אין הרשאה להצמיד בקבוצה, או שההודעה הקודמת כבר נמחקה
+        print(f"Error updating live list message: {str(e)}")
+
+# שליחת הרשימה כתשובה להודעה, והפיכתה להודעה החיה של הצ'אט אם האפשרות פעילה
+async def send_list(application, message, chat_id, text, reply_markup):
+    sent = await message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    if LIVE_LIST:
+        await make_live_list(application, chat_id, sent, text, reply_markup)
+
+# לפני עצירת הבוט - שליחת כל מה שעוד ממתין בתור
+async def drain_outbound(application):
+    outbound = application.bot_data.get('outbound')
+    if outbound is not None:
+        await outbound.drain()
+
+# עטיפה למטפל: אם הרשימה המשותפת השתנתה במהלך הטיפול, השותפים האחרים מקבלים התראה.
+# צריכה לרוץ בתוך הנעילה של משק הבית כדי שההשוואה תתייחס רק לשינויים של המטפל הזה.
+def notify_partners_on_change(handler):
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        if not NOTIFY_PARTNERS:
+            return await handler(update, context)
+        seq = load_shopping_list(chat_id).seq
+        result = await handler(update, context)
+        if load_shopping_list(chat_id).seq != seq:
+            await send_after_unlock(notify_partners, context.application, chat_id, update.effective_user)
+        return result
+    return wrapper
+
+# טבלת האסימונים של הכפתורים: callback_data הוא אסימון קצר, והנתונים עצמם נשמרים בשרת
+callbacks = CallbackRegistry()
+
+# יצירת כפתור שהלחיצה עליו מפעילה את action עם הנתונים הנתונים
+def callback_button(text, action, **payload):
+    return InlineKeyboardButton(text, callback_data=callbacks.register(action, **payload))
+
+# כמות עם יחידת המידה שלה, אם יש ("1.5 ליטר")
+def format_amount(quantity, unit=None):
+    return f"{quantity} {unit}" if unit else str(quantity)
 
 # פונקציה ליצירת מקלדת אישור
-def create_confirmation_keyboard(item_name, quantity):
+def create_confirmation_keyboard(item_name, quantity, unit=None):
     keyboard = [
         [
-            InlineKeyboardButton("✅ כן, הוסף", callback_data=f"confirm_add_{item_name}_{quantity}"),
-            InlineKeyboardButton("❌ לא, אל תוסיף", callback_data="cancel_add")
+            callback_button("✅ כן, הוסף", "confirm_add", item_name=item_name, quantity=quantity, unit=unit),
+            callback_button("❌ לא, אל תוסיף", "cancel_add")
         ]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+# בחירה בין הוספה לפריט דומה שכבר ברשימה לבין הוספה כפריט חדש
+def create_similar_add_keyboard(item_name, similar, quantity, unit=None):
+    keyboard = [
+        [
+            callback_button(f"➕ הוסף ל{similar}", "confirm_add", item_name=similar, quantity=quantity, unit=unit),
+            callback_button(f"🆕 {item_name} כפריט חדש", "confirm_add", item_name=item_name, quantity=quantity,
+                            unit=unit),
+        ],
+        [callback_button("❌ לא, אל תוסיף", "cancel_add")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+# אישור הסרה של פריט ששמו רק דומה למה שנכתב
+def create_remove_confirmation_keyboard(item_name, quantity, action):
+    keyboard = [
+        [
+            callback_button(f"✅ כן, הסר {item_name}", "confirm_remove", item_name=item_name, quantity=quantity,
+                            intent_action=action),
+            callback_button("❌ לא", "cancel_remove"),
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+# מספר הפריטים שמוצגים בעמוד אחד של קטגוריה
+CATEGORY_PAGE_SIZE = 50
+
+# הוספת שורת ניווט בין עמודים למקלדת (רק כשיש יותר מעמוד אחד)
+def add_page_navigation(keyboard, kind, page, pages, context_value=None):
+    if pages <= 1:
+        return keyboard
+    row = []
+    if page > 0:
+        row.append(callback_button("◀️ הקודם", "page", kind=kind, page=page - 1, context_value=context_value))
+    row.append(callback_button(f"{page + 1}/{pages}", "noop"))
+    if page < pages - 1:
+        row.append(callback_button("הבא ▶️", "page", kind=kind, page=page + 1, context_value=context_value))
+    keyboard.append(row)
+    return keyboard
+
 # פונקציה ליצירת מקלדת קטגוריות
-def create_categories_keyboard(categories):
+def create_categories_keyboard(categories, page=0):
+    categories = sorted(categories)
+    page_categories, page, pages = page_slice(categories, len(categories), page)
     keyboard = []
-    for category in categories:
-        keyboard.append([InlineKeyboardButton(category, callback_data=f"show_category_{category}")])
-    return InlineKeyboardMarkup(keyboard)
+    for category in page_categories:
+        keyboard.append([callback_button(category, "show_category", category=category)])
+    return InlineKeyboardMarkup(add_page_navigation(keyboard, 'cats', page, pages))
 
 # פונקציה ליצירת מקלדת פריטים לשינוי קטגוריה
-def create_items_keyboard(items):
+def create_items_keyboard(items, page=0):
+    page_items, page, pages = page_slice(items, len(items), page)
     keyboard = []
-    for item_name in items:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"change_category_{item_name}")])
-    return InlineKeyboardMarkup(keyboard)
+    for item_name in page_items:
+        keyboard.append([callback_button(item_name, "change_category", item_name=item_name)])
+    return InlineKeyboardMarkup(add_page_navigation(keyboard, 'items', page, pages))
 
 # פונקציה ליצירת מקלדת קטגוריות לשינוי קטגוריה של פריט
-def create_category_change_keyboard(item_name):
+def create_category_change_keyboard(item_name, chat_id, page=0):
     keyboard = []
     # קבלת כל הקטגוריות הייחודיות מהקטגוריות הקבועות
-    all_categories = set(load_categories().values())
-    for category in all_categories:
-        keyboard.append([InlineKeyboardButton(category, callback_data=f"update_category_{item_name}_{category}")])
-    return InlineKeyboardMarkup(keyboard)
+    all_categories = sorted(set(load_categories(chat_id).values()))
+    page_categories, page, pages = page_slice(all_categories, len(all_categories), page)
+    for category in page_categories:
+        keyboard.append([callback_button(category, "update_category", item_name=item_name, category=category)])
+    return InlineKeyboardMarkup(add_page_navigation(keyboard, 'catchange', page, pages, item_name))
 
 # פונקציה ליצירת מקלדת קטגוריות למחיקה
-def create_delete_categories_keyboard():
+def create_delete_categories_keyboard(chat_id, page=0):
     keyboard = []
-    categories = load_categories()
-    for item_name, category in categories.items():
-        keyboard.append([InlineKeyboardButton(f"{item_name} ({category})", callback_data=f"delete_category_{item_name}")])
-    return InlineKeyboardMarkup(keyboard)
+    categories = load_categories(chat_id)
+    page_entries, page, pages = page_slice(categories.items(), len(categories), page)
+    for item_name, category in page_entries:
+        keyboard.append([callback_button(f"{item_name} ({category})", "delete_category", item_name=item_name)])
+    return InlineKeyboardMarkup(add_page_navigation(keyboard, 'delcat', page, pages))
+
+# עמוד אחד של הרשימה: (טקסט, מקלדת ניווט או None)
+def list_page(shopping_list, page=0):
+    pages = shopping_list.format_telegram_pages()
+    page = min(max(page, 0), len(pages) - 1)
+    keyboard = add_page_navigation([], 'list', page, len(pages))
+    return pages[page], InlineKeyboardMarkup(keyboard) if keyboard else None
+
+# עמוד אחד של הפריטים בקטגוריה: (טקסט, מקלדת ניווט או None)
+def category_page(shopping_list, category, page=0):
+    group = shopping_list.grouped_items().get(category, {})
+    if not group:
+        return f"📝 אין פריטים בקטגוריה {category}", None
+    names, page, pages = page_slice(group, len(group), page, CATEGORY_PAGE_SIZE)
+    lines = [f"📝 *פריטים בקטגוריה {category}:*\n"]
+    lines.extend(
+        f"• {item_name}: {shopping_list.format_quantity(shopping_list.items[item_name])}" for item_name in names
+    )
+    keyboard = add_page_navigation([], 'catitems', page, pages, category)
+    # שמות ארוכים במיוחד עלולים לחרוג ממגבלת ההודעה
+    return split_message("\n".join(lines))[0], InlineKeyboardMarkup(keyboard) if keyboard else None
+
+# התאמת שם פריט לפריט שכבר נמצא ברשימה. רק שם ששונה בכתיב בלבד (ניקוד, רווחים, אותיות
+# סופיות) נחשב לאותו פריט. יחיד/רבים ("פירות" מול "פירה") או שם דומה ("מיץ תפוחים" מול
+# "מיץ תפוזים") רק מוצעים, והמשתמש מאשר בכפתור.
+# מחזיר (השם ברשימה או השם כפי שנכתב, פריט דומה ברשימה להצעה או None)
+def resolve_list_item(shopping_list, item_name):
+    if item_name in shopping_list.items:
+        return item_name, None
+    match, score = shopping_list.find_item(item_name)
+    if match is None:
+        return item_name, None
+    if score >= FOLDED_MATCH_SCORE:
+        return match, None
+    return item_name, match
+
+# הקטגוריה הקבועה של פריט, גם אם נשמרה תחת כתיב אחר של השם
+def lookup_category(categories, item_name):
+    if item_name in categories:
+        return categories[item_name]
+    match, _ = categories.find(item_name)
+    return categories[match] if match is not None else None
+
+# קטגוריה לפריט חדש: הקטגוריה הקבועה, או ניחוש של המסווג אם הוא בטוח מספיק.
+# מחזיר (קטגוריה, האם נוחשה); קטגוריה שנוחשה לא נשמרת כקבועה
+def guess_category(categories, item_name):
+    category = lookup_category(categories, item_name)
+    if category is not None:
+        return category, False
+    if AUTO_CATEGORY_CONFIDENCE < 1:
+        category, confidence = categories.predict(item_name)
+        if confidence >= AUTO_CATEGORY_CONFIDENCE:
+            return category, True
+    return None, False
+
+# רישום של פריטים שנקנו ("קניתי") או נמחקו בהיסטוריית הקניות.
+# תקלה בהיסטוריה לא מפילה את הטיפול בהודעה - הרשימה עצמה כבר עודכנה
+def record_history(chat_id, entries, action):
+    history = get_history()
+    if history is None or not entries:
+        return
+    try:
+        history.record(get_store().household(chat_id), entries, KIND_BOUGHT if action == ACTION_BUY else KIND_REMOVED)
+    except Exception as e:
+        print(f"Error recording purchase history: {str(e)}")
+
+# הצעות "בדרך כלל אתם קונים" מתוך הסיכומים של היסטוריית הקניות (בלי פריטים שכבר ברשימה)
+def format_suggestions(chat_id, shopping_list):
+    history = get_history()
+    suggestions = []
+    if history is not None:
+        suggestions = history.suggestions(get_store().household(chat_id), exclude=shopping_list.items)
+    if not suggestions:
+        return "🛒 אין עדיין מספיק היסטוריית קניות כדי להציע פריטים"
+    lines = ["🛒 בדרך כלל אתם קונים:"]
+    for suggestion in suggestions:
+        lines.append(f"• {suggestion.name} - בערך כל {suggestion.interval_days:.0f} ימים "
+                     f"(נקנה לפני {suggestion.days_since} ימים)")
+    return "\n".join(lines)
+
+# ביצוע הודעה עם כמה פריטים והחזרת הודעת סיכום אחת
+def apply_bulk_intents(shopping_list, categories, intents, added_by=None, chat_id=None):
+    similar = {}
+    resolved = []
+    for intent in intents:
+        item_name, match = resolve_list_item(shopping_list, intent.item)
+        if match is not None:
+            similar[item_name] = match
+        resolved.append(intent._replace(item=item_name))
+    intents = resolved
+    if intents[0].action == ACTION_ADD:
+        # פריטים חדשים מקבלים את הקטגוריה הקבועה שלהם, או קטגוריה מנוחשת אם יש כזו
+        shopping_list.add_items(
+            (
+                (intent.item, intent.quantity, guess_category(categories, intent.item)[0], intent.unit)
+                for intent in intents
+            ),
+            added_by=added_by,
+        )
+        lines = [f"✅ הוספתי {len(intents)} פריטים לרשימה:"]
+        uncategorized = []
+        for intent in intents:
+            category = shopping_list.get_category(intent.item) or lookup_category(categories, intent.item)
+            if category is None:
+                uncategorized.append(intent.item)
+            line = f"• {intent.item}: {format_amount(intent.quantity, intent.unit)} ({category or 'ללא קטגוריה'})"
+            if intent.item in similar:
+                line += f" - יש ברשימה גם {similar[intent.item]}"
+            lines.append(line)
+        if uncategorized:
+            lines.append(
+                f"\nאפשר להגדיר קטגוריה ל-{', '.join(uncategorized)} "
+                "בהודעה בצורה 'פריט: קטגוריה'"
+            )
+        return "\n".join(lines)
+
+    missing = shopping_list.remove_items((intent.item, intent.quantity) for intent in intents)
+    removed = [intent.item for intent in intents if intent.item not in missing]
+    if chat_id is not None:
+        record_history(chat_id, [(intent.item, intent.quantity) for intent in intents if intent.item not in missing],
+                       intents[0].action)
+    lines = []
+    if removed:
+        lines.append(f"✅ הסרתי מהרשימה: {', '.join(removed)}")
+    if missing:
+        # פריט דומה לא מוסר בלי אישור - רק מוצע
+        lines.append("❌ לא נמצאו ברשימה: " + ", ".join(
+            f"{name} (אולי {similar[name]}?)" if name in similar else name for name in missing
+        ))
+    return "\n".join(lines)
 
 # פונקציה לטיפול בפקודת /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    shopping_list = load_shopping_list()
-    context.user_data['categories'] = load_categories()
+    shopping_list = load_shopping_list(chat_id)
     
     # הוספת הודעה שמציגה את מזהה הצ'אט
     chat_id_message = f"מזהה הצ'אט שלך הוא: {chat_id}\n\n"
@@ -114,6 +473,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• כתוב שם פריט להוספה (למשל: 'חלב' או 'חלב 2')\n"
         "• כתוב 'קניתי' או 'מחק' ואחריו שם הפריט (למשל: 'קניתי חלב' או 'מחק חלב 2')\n"
         "• כתוב 'רשימה' כדי לראות את כל הפריטים\n"
+        "• כתוב 'סכום' כדי לראות את הסכום הכולל ולפי קטגוריה\n"
+        "• כתוב 'מה חסר' כדי לקבל הצעות לפי מה שאתם קונים בדרך כלל\n"
         "• כתוב 'מחק רשימה' כדי לנקות את כל הרשימה\n\n"
         "אם תנסה להוסיף פריט שכבר קיים, אשאל אותך אם להוסיף אותו בכל זאת!\n\n"
         "הרשימה משותפת עם בן/בת הזוג שלך!"
@@ -121,7 +482,50 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(welcome_message)
 
+# הפעלה/כיבוי של פרופיילינג לצ'אט הנוכחי; בכיבוי נשלח דוח של הפונקציות הכבדות
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = str(update.effective_chat.id)
+    if chat_id not in [id.strip() for id in PARTNER_CHAT_IDS if id.strip()]:
+        await update.message.reply_text("❌ לא מורשה להשתמש בבוט.")
+        return
+    report = profiler.toggle(chat_id)
+    if report is None:
+        await update.message.reply_text("🔬 הפרופיילינג הופעל לצ'אט הזה. שלח /profile שוב כדי לקבל דוח.")
+        return
+    print(report)
+    await update.message.reply_text(split_message(report)[0])
+
+# השלמה אוטומטית במצב inline ("@הבוט חל"): שמות פריטים מהרשימה וממילון הקטגוריות.
+# בחירה בתוצאה שולחת את שם הפריט כהודעה רגילה, שמוסיפה אותו לרשימה.
+# לשאילתת inline אין צ'אט, ולכן המשק בית הוא של הצ'אט הפרטי של המשתמש (אותו מזהה).
+@metrics.timed(metrics.handler_seconds, metrics.handler_errors, handler='inline_query')
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    user_id = str(query.from_user.id)
+    if user_id not in [id.strip() for id in PARTNER_CHAT_IDS if id.strip()] or not query.query.strip():
+        await query.answer([], cache_time=INLINE_CACHE_SECONDS, is_personal=True)
+        return
+    shopping_list = load_shopping_list(user_id)
+    completions = complete_item_names(query.query, shopping_list, load_categories(user_id), INLINE_RESULTS)
+    results = []
+    for completion in completions:
+        details = []
+        if completion.quantity is not None:
+            details.append(f"ברשימה: {shopping_list.format_quantity(shopping_list.items[completion.name])}")
+        if completion.category:
+            details.append(completion.category)
+        results.append(InlineQueryResultArticle(
+            id=str(len(results)),
+            title=completion.name,
+            description=" · ".join(details) or None,
+            input_message_content=InputTextMessageContent(completion.name),
+        ))
+    await query.answer(results, cache_time=INLINE_CACHE_SECONDS, is_personal=True)
+
 # פונקציה לטיפול בהודעות טקסט
+@instrumented('handle_message')
+@serialized_per_household
+@notify_partners_on_change
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """מטפל בהודעות טקסט"""
     if not update.message or not update.message.text:
@@ -129,271 +533,461 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     user_id = str(update.effective_user.id)
     chat_id = str(update.effective_chat.id)
+    added_by = update.effective_user.first_name
     
     # בדיקה אם המשתמש מורשה
     if str(chat_id) not in [id.strip() for id in PARTNER_CHAT_IDS if id.strip()]:
-        await update.message.reply_text("❌ לא מורשה להשתמש בבוט.")
+        await send_after_unlock(update.message.reply_text, "❌ לא מורשה להשתמש בבוט.")
         return
 
     try:
         # טען תמיד את הרשימה המשותפת מהקובץ
-        shopping_list = load_shopping_list()
-        categories = load_categories()
+        shopping_list = load_shopping_list(chat_id)
+        categories = load_categories(chat_id)
 
-        # בדיקה אם זו תשובה לקטגוריה
-        if context.user_data.get('waiting_for_category'):
-            item_name = context.user_data['current_item']
+        # בדיקה אם זו תשובה לשאלה על קטגוריה (השאלה נשמרת לכל משתמש בנפרד)
+        prompt = get_conversations().pending(chat_id, user_id)
+        if prompt is not None and prompt.kind == PROMPT_CATEGORY:
+            item_name = prompt.data['item']
             category = update.message.text.strip()
             
             # שמירת הקטגוריה בקבוע
             categories[item_name] = category
-            save_categories(categories)
+            save_categories(categories, chat_id)
             
             # עדכון הקטגוריה בפריט (ללא הוספה מחדש)
-            shopping_list.categories[item_name] = category
-            save_shopping_list(shopping_list)
+            shopping_list.set_category(item_name, category)
+            save_shopping_list(shopping_list, chat_id)
             
-            # ניקוי משתנים זמניים
-            del context.user_data['current_item']
-            del context.user_data['waiting_for_category']
+            # השאלה נענתה
+            get_conversations().resolve(chat_id, user_id)
             
             message = f"✅ שמרתי את הקטגוריה של {item_name} כ-{category}"
-            await update.message.reply_text(message)
+            await send_after_unlock(update.message.reply_text, message)
             return
 
+        # פענוח ההודעה במעבר אחד: פקודה, פעולה, פריט, כמות וקטגוריה
+        intent = parse_message(update.message.text)
+
         # בדיקה אם זו פקודה מיוחדת
-        if update.message.text.lower() in ['רשימה', 'הצג רשימה', 'הראה רשימה']:
+        if intent.command == COMMAND_LIST:
             if not shopping_list.items:
-                await update.message.reply_text("📝 הרשימה ריקה")
+                await send_after_unlock(update.message.reply_text, "📝 הרשימה ריקה")
                 return
             
-            message = "📝 *רשימת קניות*\n\n"
-            for item_name, quantity in shopping_list.items.items():
-                category = shopping_list.get_category(item_name) or categories.get(item_name)
-                message += f"• {item_name} ({category or 'ללא קטגוריה'}): {quantity}\n"
-            
-            await update.message.reply_text(message, parse_mode='Markdown')
+            # התצוגה שמורה ברשימה ונבנית מחדש רק אחרי שינוי
+            # רשימה ארוכה נשלחת בעמודים - רק העמוד הראשון נשלח עכשיו
+            message, reply_markup = list_page(shopping_list)
+            await send_after_unlock(send_list, context.application, update.message, chat_id, message, reply_markup)
             return
         
-        elif update.message.text.lower() in ['מחק רשימה', 'נקה רשימה', 'אפס רשימה']:
+        elif intent.command == COMMAND_SUMMARY:
+            # הסכומים מתעדכנים בכל שינוי ברשימה, כך שהסיכום לא עובר על כל הפריטים
+            await send_after_unlock(update.message.reply_text, shopping_list.format_summary(), parse_mode='Markdown')
+            return
+
+        elif intent.command == COMMAND_SUGGEST:
+            await send_after_unlock(update.message.reply_text, format_suggestions(chat_id, shopping_list))
+            return
+
+        elif intent.command == COMMAND_CLEAR:
             shopping_list.clear_list()
-            save_shopping_list(shopping_list)
+            save_shopping_list(shopping_list, chat_id)
             message = "✅ הרשימה נוקתה בהצלחה!"
-            await update.message.reply_text(message)
+            await send_after_unlock(update.message.reply_text, message)
             return
         
-        elif update.message.text.lower() in ['קטגוריות', 'הצג קטגוריות', 'הראה קטגוריות']:
+        elif intent.command == COMMAND_CATEGORIES:
             all_categories = set(categories.values())
             if not all_categories:
-                await update.message.reply_text("📝 אין קטגוריות מוגדרות")
+                await send_after_unlock(update.message.reply_text, "📝 אין קטגוריות מוגדרות")
                 return
             
-            await update.message.reply_text(
+            await send_after_unlock(
+                update.message.reply_text,
                 "📝 בחר קטגוריה כדי לראות את הפריטים שלה:",
                 reply_markup=create_categories_keyboard(all_categories)
             )
             return
         
-        elif update.message.text.lower() in ['החלף קטגוריה', 'שנה קטגוריה', 'עדכן קטגוריה']:
+        elif intent.command == COMMAND_CHANGE_CATEGORY:
             if not shopping_list.items:
-                await update.message.reply_text("📝 הרשימה ריקה")
+                await send_after_unlock(update.message.reply_text, "📝 הרשימה ריקה")
                 return
             
-            await update.message.reply_text(
+            await send_after_unlock(
+                update.message.reply_text,
                 "📝 בחר פריט לשינוי קטגוריה:",
                 reply_markup=create_items_keyboard(shopping_list.items.keys())
             )
             return
         
-        elif update.message.text.lower() in ['מחק קטגוריה', 'הסר קטגוריה', 'הסר קטגוריות']:
+        elif intent.command == COMMAND_DELETE_CATEGORY:
             if not categories:
-                await update.message.reply_text("📝 אין קטגוריות מוגדרות")
+                await send_after_unlock(update.message.reply_text, "📝 אין קטגוריות מוגדרות")
                 return
             
-            await update.message.reply_text(
+            await send_after_unlock(
+                update.message.reply_text,
                 "📝 בחר פריט למחיקת הקטגוריה שלו:",
-                reply_markup=create_delete_categories_keyboard()
+                reply_markup=create_delete_categories_keyboard(chat_id)
+            )
+            return
+
+        # הודעה בלי שם פריט (למשל רק "5" או רק "קניתי") - לא מוסיפים פריט עם שם ריק
+        if not intent.item:
+            await send_after_unlock(
+                update.message.reply_text,
+                "❓ לא הבנתי איזה פריט. כתוב שם פריט ואפשר גם כמות, למשל: 'חלב 2' או 'קניתי חלב'"
             )
             return
 
         # בדיקה אם ההודעה מכילה קטגוריה
-        if ':' in update.message.text:
-            item_name, category = update.message.text.split(':', 1)
-            item_name = item_name.strip()
-            category = category.strip()
+        if intent.action == ACTION_SET_CATEGORY:
+            item_name = intent.item
+            category = intent.category
             
             # הוספת פריט עם קטגוריה
             if item_name not in shopping_list.items:
-                shopping_list.add_item(item_name, 1)
-            shopping_list.categories[item_name] = category
-            save_shopping_list(shopping_list)
+                shopping_list.add_item(item_name, 1, added_by=added_by)
+            shopping_list.set_category(item_name, category)
+            save_shopping_list(shopping_list, chat_id)
             message = f"✅ הוספתי {item_name} לרשימה עם הקטגוריה: {category}"
-            await update.message.reply_text(message)
+            await send_after_unlock(update.message.reply_text, message)
             return
         
-        # זיהוי פעולה
-        action = detect_action(update.message.text)
-        
-        # הסרת מילות פעולה מהטקסט
-        clean_text = re.sub(r'קניתי|קנית|קנו|קנתה|קנו|מחק|הסר|הסרתי|הסיר|קנה|קנתה', '', update.message.text, flags=re.IGNORECASE).strip()
-        
-        if action == 'add':
+        # הודעה עם כמה פריטים - מבוצעת כפעולה אחת עם שמירה אחת ותשובה מסכמת אחת
+        intents = parse_items(
+            update.message.text,
+            is_known=lambda name: name in categories or name in shopping_list.items,
+        )
+        # כמות 0 (או כמות שלילית) - לא מוסיפים ולא מסירים כלום
+        if any(item_intent.quantity is None for item_intent in intents):
+            await send_after_unlock(
+                update.message.reply_text,
+                "❓ הכמות צריכה להיות גדולה מאפס, למשל: 'חלב 2' או 'חלב 1,5 ליטר'"
+            )
+            return
+        if len(intents) > 1:
+            message = apply_bulk_intents(shopping_list, categories, intents, added_by, chat_id)
+            save_shopping_list(shopping_list, chat_id)
+            await send_after_unlock(update.message.reply_text, message)
+            return
+
+        # שם שנכתב אחרת מפריט שכבר ברשימה (למשל "עגבניה" מול "עגבניות") מתייחס לאותו פריט
+        item_name, similar = resolve_list_item(shopping_list, intent.item)
+        quantity = intent.quantity
+        unit = intent.unit
+
+        if intent.action == ACTION_ADD:
             # הוספת פריט
-            quantity = extract_quantity(clean_text)
-            item_name = clean_text.replace(str(quantity), '').strip()
-            
-            if item_name not in shopping_list.items:
-                # אם יש קטגוריה קבועה, הוסף עם הקטגוריה
-                if item_name in categories:
-                    shopping_list.add_item(item_name, quantity)
-                    shopping_list.categories[item_name] = categories[item_name]
-                    save_shopping_list(shopping_list)
-                    message = f"✅ הוספתי {item_name} לרשימה עם הקטגוריה: {categories[item_name]}"
-                    await update.message.reply_text(message)
+            if item_name not in shopping_list.items and similar is not None:
+                # שם דומה לפריט שכבר ברשימה - המשתמש בוחר אם להוסיף אליו או פריט חדש
+                await send_after_unlock(
+                    update.message.reply_text,
+                    f"⚠️ ברשימה כבר יש {similar} ({shopping_list.format_quantity(shopping_list.items[similar])}).\n"
+                    f"להוסיף {format_amount(quantity, unit)} ל{similar} או להוסיף את {item_name} כפריט חדש?",
+                    reply_markup=create_similar_add_keyboard(item_name, similar, quantity, unit)
+                )
+            elif item_name not in shopping_list.items:
+                # אם יש קטגוריה קבועה (או ניחוש בטוח), הוסף עם הקטגוריה
+                category, predicted = guess_category(categories, item_name)
+                if category is not None:
+                    shopping_list.add_item(item_name, quantity, category=category, unit=unit, added_by=added_by)
+                    save_shopping_list(shopping_list, chat_id)
+                    message = f"✅ הוספתי {item_name} לרשימה עם הקטגוריה: {category}"
+                    if predicted:
+                        message += f"\n(זיהוי אוטומטי - לשינוי כתוב '{item_name}: קטגוריה')"
+                    await send_after_unlock(update.message.reply_text, message)
                 else:
                     # אין קטגוריה קבועה, הוסף ואז שאל על קטגוריה
-                    shopping_list.add_item(item_name, quantity)
-                    save_shopping_list(shopping_list)
-                    context.user_data['current_item'] = item_name
-                    context.user_data['waiting_for_category'] = True
-                    await update.message.reply_text(f"✅ הוספתי {item_name} לרשימה!\nמה הקטגוריה של {item_name}?")
+                    shopping_list.add_item(item_name, quantity, unit=unit, added_by=added_by)
+                    save_shopping_list(shopping_list, chat_id)
+                    get_conversations().ask(chat_id, user_id, PROMPT_CATEGORY, item=item_name)
+                    await send_after_unlock(update.message.reply_text, f"✅ הוספתי {item_name} לרשימה!\nמה הקטגוריה של {item_name}?")
             else:
                 # אם הפריט כבר קיים, שואל את המשתמש אם להוסיף
-                current_quantity = shopping_list.items[item_name]
-                await update.message.reply_text(
-                    f"⚠️ {item_name} כבר קיים ברשימה ({current_quantity} יחידות).\n"
-                    f"האם להוסיף עוד {quantity} יחידות?",
-                    reply_markup=create_confirmation_keyboard(item_name, quantity)
+                current_item = shopping_list.items[item_name]
+                await send_after_unlock(
+                    update.message.reply_text,
+                    f"⚠️ {item_name} כבר קיים ברשימה ({format_amount(current_item.quantity, current_item.unit or 'יחידות')}).\n"
+                    f"האם להוסיף עוד {format_amount(quantity, unit or 'יחידות')}?",
+                    reply_markup=create_confirmation_keyboard(item_name, quantity, unit)
                 )
         else:
             # הסרת פריט
-            item_name = clean_text
             if item_name in shopping_list.items:
-                shopping_list.remove_item(item_name)
-                save_shopping_list(shopping_list)
+                shopping_list.remove_item(item_name, quantity)
+                save_shopping_list(shopping_list, chat_id)
+                record_history(chat_id, [(item_name, quantity)], intent.action)
                 message = f"✅ הסרתי {item_name} מהרשימה"
-                await update.message.reply_text(message)
+                await send_after_unlock(update.message.reply_text, message)
+            elif similar is not None:
+                # פריט עם שם דומה מוסר רק אחרי אישור
+                await send_after_unlock(
+                    update.message.reply_text,
+                    f"❌ {item_name} לא נמצא ברשימה. האם התכוונת ל{similar}?",
+                    reply_markup=create_remove_confirmation_keyboard(similar, quantity, intent.action),
+                )
             else:
-                await update.message.reply_text(f"❌ {item_name} לא נמצא ברשימה")
+                await send_after_unlock(update.message.reply_text, f"❌ {item_name} לא נמצא ברשימה")
     except Exception as e:
         print(f"Error in handle_message: {str(e)}")
-        await update.message.reply_text("❌ אירעה שגיאה בעיבוד ההודעה. אנא נסה שוב.")
+        metrics.record_error('handle_message', e)
+        await send_after_unlock(update.message.reply_text, "❌ אירעה שגיאה בעיבוד ההודעה. אנא נסה שוב.")
 
-# פונקציה לטיפול בלחיצות על כפתורים
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    chat_id = update.effective_chat.id
-    shopping_list = load_shopping_list()
-    categories = load_categories()
-    
-    if query.data.startswith("show_category_"):
-        category = query.data.replace("show_category_", "")
-        items_in_category = []
-        
-        for item_name, quantity in shopping_list.items.items():
-            item_category = shopping_list.get_category(item_name) or categories.get(item_name)
-            if item_category == category:
-                items_in_category.append(f"• {item_name}: {quantity}")
-        
-        if items_in_category:
-            message = f"📝 *פריטים בקטגוריה {category}:*\n\n" + "\n".join(items_in_category)
-        else:
-            message = f"📝 אין פריטים בקטגוריה {category}"
-        
-        await query.message.edit_text(message, parse_mode='Markdown')
-    
-    elif query.data.startswith("change_category_"):
-        item_name = query.data.replace("change_category_", "")
-        await query.message.edit_text(
-            f"📝 בחר קטגוריה חדשה עבור {item_name}:",
-            reply_markup=create_category_change_keyboard(item_name)
+# הצגת הפריטים של קטגוריה
+async def on_show_category(query, context, chat_id, category):
+    shopping_list = load_shopping_list(chat_id)
+    message, reply_markup = category_page(shopping_list, category)
+    await send_after_unlock(query.message.edit_text, message, parse_mode='Markdown', reply_markup=reply_markup)
+
+# מעבר בין עמודים - נבנה רק העמוד המבוקש
+async def on_page(query, context, chat_id, kind, page, context_value=None):
+    shopping_list = load_shopping_list(chat_id)
+    if kind == 'list':
+        message, reply_markup = list_page(shopping_list, page)
+        await send_after_unlock(query.message.edit_text, message, parse_mode='Markdown', reply_markup=reply_markup)
+        if LIVE_LIST:
+            get_live_lists(context.application).set_page(
+                chat_id, query.message.message_id, message, reply_markup, page
+            )
+    elif kind == 'catitems':
+        message, reply_markup = category_page(shopping_list, context_value, page)
+        await send_after_unlock(query.message.edit_text, message, parse_mode='Markdown', reply_markup=reply_markup)
+    elif kind == 'cats':
+        await send_after_unlock(
+            query.message.edit_reply_markup,
+            reply_markup=create_categories_keyboard(set(load_categories(chat_id).values()), page)
         )
-    
-    elif query.data.startswith("update_category_"):
-        _, _, item_name, new_category = query.data.split("_")
-        
-        # עדכון הקטגוריה בקבוע
-        categories[item_name] = new_category
-        save_categories(categories)
-        
-        # עדכון הקטגוריה בפריט
+    elif kind == 'items':
+        await send_after_unlock(
+            query.message.edit_reply_markup,
+            reply_markup=create_items_keyboard(shopping_list.items.keys(), page)
+        )
+    elif kind == 'catchange':
+        await send_after_unlock(
+            query.message.edit_reply_markup,
+            reply_markup=create_category_change_keyboard(context_value, chat_id, page)
+        )
+    elif kind == 'delcat':
+        await send_after_unlock(
+            query.message.edit_reply_markup,
+            reply_markup=create_delete_categories_keyboard(chat_id, page)
+        )
+
+# בחירת פריט לשינוי קטגוריה
+async def on_change_category(query, context, chat_id, item_name):
+    await send_after_unlock(
+        query.message.edit_text,
+        f"📝 בחר קטגוריה חדשה עבור {item_name}:",
+        reply_markup=create_category_change_keyboard(item_name, chat_id)
+    )
+
+# עדכון קטגוריה של פריט
+async def on_update_category(query, context, chat_id, item_name, category):
+    shopping_list = load_shopping_list(chat_id)
+    categories = load_categories(chat_id)
+
+    # עדכון הקטגוריה בקבוע
+    categories[item_name] = category
+    save_categories(categories, chat_id)
+
+    # עדכון הקטגוריה בפריט
+    if item_name in shopping_list.items:
+        shopping_list.set_category(item_name, category)
+        save_shopping_list(shopping_list, chat_id)
+
+    await send_after_unlock(query.message.edit_text, f"✅ שיניתי את הקטגוריה של {item_name} ל-{category}")
+
+# מחיקת הקטגוריה הקבועה של פריט
+async def on_delete_category(query, context, chat_id, item_name):
+    shopping_list = load_shopping_list(chat_id)
+    categories = load_categories(chat_id)
+
+    if item_name in categories:
+        # מחיקת הקטגוריה מהפריט
+        del categories[item_name]
+        save_categories(categories, chat_id)
+
+        # עדכון הפריט ברשימה
         if item_name in shopping_list.items:
-            # שמירת הכמות הנוכחית
-            current_quantity = shopping_list.items[item_name]
-            # מחיקת הפריט הישן
-            del shopping_list.items[item_name]
-            # הוספת הפריט מחדש עם הקטגוריה החדשה
-            shopping_list.add_item(item_name, current_quantity, category=new_category)
-        
-        save_shopping_list(shopping_list)
-        
-        await query.message.edit_text(f"✅ שיניתי את הקטגוריה של {item_name} ל-{new_category}")
-    
-    elif query.data.startswith("delete_category_"):
-        item_name = query.data.replace("delete_category_", "")
-        
-        if item_name in categories:
-            # מחיקת הקטגוריה מהפריט
-            del categories[item_name]
-            save_categories(categories)
-            
-            # עדכון הפריט ברשימה
-            if item_name in shopping_list.items:
-                current_quantity = shopping_list.items[item_name]
-                del shopping_list.items[item_name]
-                shopping_list.add_item(item_name, current_quantity)
-            
-            save_shopping_list(shopping_list)
-            
-            await query.message.edit_text(f"✅ מחקתי את הקטגוריה של {item_name}")
-        else:
-            await query.message.edit_text(f"❌ לא נמצאה קטגוריה עבור {item_name}")
-    
-    elif query.data.startswith("confirm_add_"):
-        # חילוץ המידע מהנתונים
-        _, _, item_name, quantity = query.data.split("_")
-        quantity = int(quantity)
-        
-        # הוספת הפריט
-        shopping_list.add_item(item_name, quantity)
-        save_shopping_list(shopping_list)
-        
-        # בדיקה אם יש קטגוריה קבועה לפריט
-        if item_name in categories:
-            category = categories[item_name]
-            shopping_list.categories[item_name] = category
-            await query.message.edit_text(f"✅ הוספתי {quantity} {item_name} לרשימה עם הקטגוריה: {category}")
-        else:
-            await query.message.edit_text(
-                f"✅ הוספתי {quantity} {item_name} לרשימה!\n"
-                f"מה הקטגוריה של {item_name}?"
-            )
-            context.user_data['current_item'] = item_name
-            context.user_data['waiting_for_category'] = True
-    
-    elif query.data == "cancel_add":
-        await query.message.edit_text("❌ ביטלתי את ההוספה.")
+            shopping_list.set_category(item_name, None)
+            save_shopping_list(shopping_list, chat_id)
 
-def main():
-    if not BOT_TOKEN:
-        print("Error: BOT_TOKEN not found in environment variables")
+        await send_after_unlock(query.message.edit_text, f"✅ מחקתי את הקטגוריה של {item_name}")
+    else:
+        await send_after_unlock(query.message.edit_text, f"❌ לא נמצאה קטגוריה עבור {item_name}")
+
+# אישור הוספה של פריט שכבר קיים ברשימה
+async def on_confirm_add(query, context, chat_id, item_name, quantity, unit=None):
+    shopping_list = load_shopping_list(chat_id)
+    categories = load_categories(chat_id)
+
+    # הוספת הפריט
+    shopping_list.add_item(item_name, quantity, unit=unit, added_by=query.from_user.first_name)
+
+    # בדיקה אם יש קטגוריה קבועה לפריט
+    if item_name in categories:
+        category = categories[item_name]
+        shopping_list.set_category(item_name, category)
+        save_shopping_list(shopping_list, chat_id)
+        await send_after_unlock(query.message.edit_text, f"✅ הוספתי {format_amount(quantity, unit)} {item_name} לרשימה עם הקטגוריה: {category}")
+    else:
+        save_shopping_list(shopping_list, chat_id)
+        await send_after_unlock(
+            query.message.edit_text,
+            f"✅ הוספתי {format_amount(quantity, unit)} {item_name} לרשימה!\n"
+            f"מה הקטגוריה של {item_name}?"
+        )
+        get_conversations().ask(chat_id, query.from_user.id, PROMPT_CATEGORY, item=item_name)
+
+async def on_cancel_add(query, context, chat_id):
+    await send_after_unlock(query.message.edit_text, "❌ ביטלתי את ההוספה.")
+
+# אישור הסרה של פריט דומה ("קניתי" או "מחק")
+async def on_confirm_remove(query, context, chat_id, item_name, quantity, intent_action):
+    shopping_list = load_shopping_list(chat_id)
+    if item_name not in shopping_list.items:
+        await send_after_unlock(query.message.edit_text, f"❌ {item_name} כבר לא נמצא ברשימה")
         return
-    
-    if not PARTNER_CHAT_IDS:
-        print("Error: PARTNER_CHAT_ID not found in environment variables")
+    shopping_list.remove_item(item_name, quantity)
+    save_shopping_list(shopping_list, chat_id)
+    record_history(chat_id, [(item_name, quantity)], intent_action)
+    await send_after_unlock(query.message.edit_text, f"✅ הסרתי {item_name} מהרשימה")
+
+async def on_cancel_remove(query, context, chat_id):
+    await send_after_unlock(query.message.edit_text, "❌ לא הסרתי כלום.")
+
+async def on_noop(query, context, chat_id):
+    pass
+
+# מיפוי פעולה -> מטפל
+CALLBACK_HANDLERS = {
+    'show_category': on_show_category,
+    'page': on_page,
+    'change_category': on_change_category,
+    'update_category': on_update_category,
+    'delete_category': on_delete_category,
+    'confirm_add': on_confirm_add,
+    'cancel_add': on_cancel_add,
+    'confirm_remove': on_confirm_remove,
+    'cancel_remove': on_cancel_remove,
+    'noop': on_noop,
+}
+
+# פונקציה לטיפול בלחיצות על כפתורים
+@instrumented('button_handler')
+@serialized_per_household
+@notify_partners_on_change
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await send_after_unlock(query.answer)
+
+    chat_id = update.effective_chat.id
+    resolved = callbacks.resolve(query.data)
+    if resolved is None:
+        # האסימון פג תוקף (או שהבוט הופעל מחדש מאז שהכפתור נשלח)
+        await send_after_unlock(query.message.edit_text, "⌛ הכפתור הזה כבר לא פעיל, נסה שוב.")
         return
-        
-    application = Application.builder().token(BOT_TOKEN).build()
+
+    action, payload = resolved
+    await CALLBACK_HANDLERS[action](query, context, chat_id, **payload)
+
+# עדכון המדדים שמחושבים רק בזמן הקריאה: גודל הרשימות ועומק התורים
+def collect_metrics(application):
+    sizes = get_store().list_sizes().values()
+    metrics.lists_loaded.set(len(sizes))
+    metrics.list_items.set(sum(sizes))
+    metrics.list_items_max.set(max(sizes, default=0))
+    metrics.queue_depth.set(application.update_queue.qsize(), queue='updates')
+    outbound = application.bot_data.get('outbound')
+    if outbound is not None:
+        metrics.queue_depth.set(outbound.pending(), queue='outbound')
+
+# משימות רקע שרצות כל זמן שהבוט פועל: הדפסת המדדים (אם הופעלה) וניקוי שאלות שפג תוקפן
+# (לא דרך application.create_task - עצירת ה-Application ממתינה למשימות כאלה עד שיסתיימו)
+async def start_background_tasks(application):
+    loop = asyncio.get_running_loop()
+    tasks = application.bot_data['background_tasks'] = [
+        loop.create_task(expire_periodically(get_conversations())),
+    ]
+    if METRICS_LOG_INTERVAL > 0:
+        tasks.append(loop.create_task(metrics.log_metrics_periodically(METRICS_LOG_INTERVAL)))
+    if SYNC_DIR:
+        shopping_list = load_shopping_list(SYNC_CHAT_ID)
+        list_sync = application.bot_data['list_sync'] = ListSync(SYNC_DIR, SYNC_REPLICA)
+        list_sync.attach(shopping_list)
+        tasks.append(loop.create_task(sync_periodically(
+            list_sync, get_store().lock(SYNC_CHAT_ID),
+            functools.partial(save_shopping_list, shopping_list, SYNC_CHAT_ID), SYNC_INTERVAL_SECONDS,
+        )))
+
+# אחרי עצירת הבוט: עצירת משימות הרקע ושליחת מה שעוד ממתין בתור
+async def on_stop(application):
+    for task in application.bot_data.pop('background_tasks', []):
+        task.cancel()
+    list_sync = application.bot_data.pop('list_sync', None)
+    if list_sync is not None:
+        # השינויים האחרונים של הבוט נכתבים לפני היציאה
+        try:
+            list_sync.sync()
+        except (OSError, ValueError) as e:
+            print(f"Error syncing shopping list: {str(e)}")
+    await drain_outbound(application)
+
+# בניית ה-Application עם כל המטפלים
+def build_application(token, builder=None, use_updater=True, rate_limiter=None):
+    # עיבוד עדכונים במקביל - הנעילה לפי משק בית שומרת על עקביות הרשימה.
+    # כל הקריאות ל-API (גם התשובות של המטפלים) עוברות דרך מגביל הקצב.
+    builder = (
+        (builder or Application.builder())
+        .token(token)
+        .concurrent_updates(True)
+        .rate_limiter(rate_limiter or TelegramRateLimiter())
+        .post_init(start_background_tasks)
+        .post_stop(on_stop)
+    )
+    if not use_updater:
+        # במצב webhook העדכונים מגיעים מהשרת שלנו ולא מ-getUpdates
+        builder = builder.updater(None)
+    application = builder.build()
+    metrics.REGISTRY.add_collector(functools.partial(collect_metrics, application))
     
     # הוספת מטפלי פקודות
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("profile", profile_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(InlineQueryHandler(inline_query))
+    return application
+
+def main():
+    error = config_error()
+    if error:
+        print(error)
+        return
+    
+    application = build_application(BOT_TOKEN, use_updater=BOT_MODE != 'webhook')
     
     # הפעלת הבוט
-    application.run_polling()
+    try:
+        if BOT_MODE == 'webhook':
+            from webhook_server import serve_webhook
+            asyncio.run(serve_webhook(
+                application,
+                WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                port=WEBHOOK_PORT,
+                webhook_path=WEBHOOK_PATH,
+                metrics_token=METRICS_TOKEN,
+                metrics_port=METRICS_PORT,
+            ))
+        else:
+            application.run_polling()
+    finally:
+        # כתיבת שינויים שעדיין לא נשמרו לפני יציאה
+        get_store().close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
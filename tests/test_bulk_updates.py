@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_parser import parse_items  # noqa: E402
+from shopping_list import ShoppingList, CategoryDictionary  # noqa: E402
+from telegram_bot import apply_bulk_intents  # noqa: E402
+
+
+def make_list(*names):
+    shopping_list = ShoppingList()
+    for name in names:
+        shopping_list.add_item(name)
+    return shopping_list
+
+
+def test_add_items_returns_only_new_names():
+    shopping_list = make_list("חלב")
+    new_items = shopping_list.add_items([("חלב", 2, "מוצרי חלב", None), ("לחם", 1, "מאפים", "כיכר")])
+    assert new_items == ["לחם"]
+    assert shopping_list.items["חלב"].quantity == 3
+    # הקטגוריה של פריט שכבר ברשימה לא משתנה
+    assert shopping_list.items["חלב"].category is None
+    assert (shopping_list.items["לחם"].category, shopping_list.items["לחם"].unit) == ("מאפים", "כיכר")
+
+
+def test_remove_items_returns_missing_names():
+    shopping_list = make_list("חלב", "לחם")
+    assert shopping_list.remove_items([("חלב", 1), ("ביצים", 1)]) == ["ביצים"]
+    assert list(shopping_list.items) == ["לחם"]
+
+
+def test_bulk_message_is_one_change_per_item():
+    shopping_list = ShoppingList()
+    changes = []
+    shopping_list.subscribe(changes.append)
+    categories = CategoryDictionary({"חלב": "מוצרי חלב"})
+    message = apply_bulk_intents(shopping_list, categories, parse_items("חלב 2, לחם, ביצים 12"))
+    assert [change.name for change in changes] == ["חלב", "לחם", "ביצים"]
+    assert {name: item.quantity for name, item in shopping_list.items.items()} == {"חלב": 2, "לחם": 1, "ביצים": 12}
+    assert shopping_list.items["חלב"].category == "מוצרי חלב"
+    assert message.startswith("✅ הוספתי 3 פריטים לרשימה:")
+    assert "לחם, ביצים" in message
+
+
+def test_bulk_purchase_reports_missing_items():
+    shopping_list = make_list("חלב", "לחם")
+    message = apply_bulk_intents(shopping_list, CategoryDictionary(), parse_items("קניתי חלב, גבינה"))
+    assert list(shopping_list.items) == ["לחם"]
+    assert message == "✅ הסרתי מהרשימה: חלב\n❌ לא נמצאו ברשימה: גבינה"
@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import callback_registry  # noqa: E402
+from callback_registry import CallbackRegistry, CALLBACK_DATA_LIMIT  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_resolves_to_action_and_payload():
+    registry = CallbackRegistry()
+    token = registry.register("confirm_add", item_name="שוקולד מריר 70% של עלית", quantity=2)
+    assert len(token.encode('utf-8')) <= CALLBACK_DATA_LIMIT
+    assert registry.resolve(token) == ("confirm_add", {"item_name": "שוקולד מריר 70% של עלית", "quantity": 2})
+    assert registry.resolve("unknown") is None
+
+
+def test_same_button_reuses_its_token():
+    registry = CallbackRegistry()
+    token = registry.register("remove", item_name="חלב")
+    assert registry.register("remove", item_name="חלב") == token
+    assert registry.register("remove", item_name="לחם") != token
+    assert len(registry) == 2
+
+
+def test_oldest_token_is_evicted_when_full():
+    registry = CallbackRegistry(max_entries=2)
+    first = registry.register("a")
+    second = registry.register("b")
+    # רישום מחדש מרענן את האסימון, ולכן second הוא עכשיו הישן ביותר
+    registry.register("a")
+    third = registry.register("c")
+    assert registry.resolve(second) is None
+    assert registry.resolve(first) == ("a", {})
+    assert registry.resolve(third) == ("c", {})
+    # אסימון שנזרק מקבל אסימון חדש ברישום הבא
+    assert registry.register("b") != second
+
+
+def test_token_expires_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(callback_registry.time, 'monotonic', clock)
+    registry = CallbackRegistry(ttl_seconds=60)
+    token = registry.register("cancel_add")
+    clock.now += 59
+    assert registry.resolve(token) == ("cancel_add", {})
+    clock.now += 2
+    assert registry.resolve(token) is None
+    assert len(registry) == 0
+
+
+def test_registering_again_extends_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(callback_registry.time, 'monotonic', clock)
+    registry = CallbackRegistry(ttl_seconds=60)
+    token = registry.register("cancel_add")
+    clock.now += 50
+    registry.register("cancel_add")
+    clock.now += 50
+    assert registry.resolve(token) == ("cancel_add", {})
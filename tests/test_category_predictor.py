@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from category_predictor import CategoryPredictor  # noqa: E402
+
+TRAIN = {
+    'מוצרי חלב': ['חלב', 'חלב 3%', 'גבינה לבנה', 'גבינה צהובה', 'גבינת שמנת', 'יוגורט', 'יוגורט פירות', 'שמנת מתוקה', 'חמאה', 'קוטג'],
+    'ירקות': ['עגבניות', 'מלפפונים', 'בצל', 'בצל ירוק', 'גזר', 'פלפל אדום', 'פלפל ירוק', 'חסה', 'תפוחי אדמה', 'קישואים'],
+    'פירות': ['תפוחים', 'בננות', 'תפוזים', 'ענבים', 'אבטיח', 'מלון', 'אגסים', 'שזיפים', 'קלמנטינות', 'אפרסקים'],
+    'מאפים': ['לחם', 'לחם מלא', 'לחמניות', 'פיתות', 'חלה', 'באגט', 'עוגה', 'עוגיות', 'קרואסון', 'לחם שיפון'],
+    'ניקיון': ['אקונומיקה', 'סבון כלים', 'נוזל כביסה', 'מרכך כביסה', 'שקיות זבל', 'ספוג', 'נייר טואלט', 'מגבונים', 'סבון ידיים', 'מטליות'],
+}
+TEST = {
+    'מוצרי חלב': ['חלב 1%', 'גבינה בולגרית', 'יוגורט וניל', 'שמנת חמוצה', 'חלב סויה'],
+    'ירקות': ['עגבניות שרי', 'פלפל צהוב', 'בצל סגול', 'גזר גמדי', 'חסה ערבית'],
+    'פירות': ['תפוחים ירוקים', 'ענבים אדומים', 'תפוזי דם', 'בננות בשלות', 'שזיפים צהובים'],
+    'מאפים': ['לחמניות מלאות', 'פיתות מלאות', 'עוגת שוקולד', 'עוגיות חמאה', 'חלה מתוקה'],
+    'ניקיון': ['סבון רצפה', 'נוזל כלים', 'שקיות זבל גדולות', 'מרכך כביסה לבן', 'נייר מגבת'],
+}
+
+
+def trained(**kwargs):
+    return CategoryPredictor(((name, category) for category, names in TRAIN.items() for name in names), **kwargs)
+
+
+def test_accuracy_on_unseen_items():
+    predictor = trained()
+    guesses = [(predictor.predict(name)[0], category) for category, names in TEST.items() for name in names]
+    answered = [(guess, category) for guess, category in guesses if guess is not None]
+    correct = sum(guess == category for guess, category in answered)
+    assert len(answered) >= 0.8 * len(guesses)
+    assert correct >= 0.8 * len(answered)
+
+
+def test_no_guess_without_shared_features():
+    predictor = trained()
+    for name in ("סוללות", "קפה", "xyz"):
+        assert predictor.predict(name) == (None, 0.0)
+
+
+def test_no_guess_from_too_little_data():
+    few_items = CategoryPredictor([("חלב", "מוצרי חלב"), ("לחם", "מאפים"), ("עגבניות", "ירקות")])
+    assert few_items.predict("חלב 3%") == (None, 0.0)
+    one_category = CategoryPredictor((name, "מוצרי חלב") for name in TRAIN["מוצרי חלב"])
+    assert one_category.predict("חלב 1%") == (None, 0.0)
+
+
+def test_learning_incrementally_matches_training_at_once():
+    predictor = CategoryPredictor()
+    for category, names in TRAIN.items():
+        for name in names:
+            predictor.learn(name, "ירקות")
+            predictor.learn(name, category)
+    predictor.learn("שוקולד", "ממתקים")
+    predictor.forget("שוקולד")
+    expected = trained()
+    assert len(predictor) == len(expected)
+    for names in TEST.values():
+        for name in names:
+            category, confidence = expected.predict(name)
+            assert predictor.predict(name) == (category, pytest.approx(confidence))
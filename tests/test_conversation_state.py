@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import conversation_state  # noqa: E402
+from conversation_state import ConversationState, PROMPT_CATEGORY  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conversation_state.time, 'time', clock)
+    return clock
+
+
+def test_each_user_has_their_own_question(clock):
+    state = ConversationState()
+    state.ask(1, 10, PROMPT_CATEGORY, item="חלב")
+    state.ask(1, 20, PROMPT_CATEGORY, item="לחם")
+    assert state.pending(1, 10).data == {"item": "חלב"}
+    assert state.pending("1", "20").data == {"item": "לחם"}
+    assert state.pending(2, 10) is None
+    assert state.resolve(1, 10).kind == PROMPT_CATEGORY
+    assert state.pending(1, 10) is None
+    assert len(state) == 1
+
+
+def test_question_expires_after_ttl(clock):
+    state = ConversationState(ttl=60)
+    state.ask(1, 10, PROMPT_CATEGORY, item="חלב")
+    clock.now += 59
+    assert state.pending(1, 10) is not None
+    clock.now += 1
+    assert state.pending(1, 10) is None
+    assert len(state) == 0
+
+
+def test_asking_again_restarts_the_ttl(clock):
+    state = ConversationState(ttl=60)
+    state.ask(1, 10, PROMPT_CATEGORY, item="חלב")
+    clock.now += 50
+    state.ask(1, 10, PROMPT_CATEGORY, item="לחם")
+    clock.now += 50
+    assert state.pending(1, 10).data == {"item": "לחם"}
+
+
+def test_expire_drops_only_expired_questions(clock):
+    state = ConversationState(ttl=60)
+    state.ask(1, 10, PROMPT_CATEGORY, item="חלב")
+    clock.now += 30
+    state.ask(1, 20, PROMPT_CATEGORY, item="לחם")
+    clock.now += 40
+    assert state.expire() == 1
+    assert state.pending(1, 20) is not None
+
+
+def test_oldest_question_is_dropped_when_full(clock):
+    state = ConversationState(max_entries=2)
+    for user_id in (10, 20, 30):
+        state.ask(1, user_id, PROMPT_CATEGORY, item=str(user_id))
+    assert state.pending(1, 10) is None
+    assert len(state) == 2
+
+
+@pytest.mark.parametrize('filename', ["conversations.json", "conversations.db"])
+def test_questions_survive_a_restart_until_they_expire(tmp_path, clock, filename):
+    filename = str(tmp_path / filename)
+    state = ConversationState(filename, ttl=60)
+    state.ask(-100, 10, PROMPT_CATEGORY, item="חלב")
+    clock.now += 30
+    state.ask(-100, 20, PROMPT_CATEGORY, item="לחם")
+    state.close()
+
+    state = ConversationState(filename, ttl=60)
+    assert state.pending(-100, 10).data == {"item": "חלב"}
+    state.close()
+
+    clock.now += 40
+    state = ConversationState(filename, ttl=60)
+    assert state.pending(-100, 10) is None
+    assert state.pending(-100, 20).data == {"item": "לחם"}
+    state.close()
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_parser import (  # noqa: E402
+    parse_message, parse_items, ACTION_ADD, ACTION_REMOVE, ACTION_BUY, ACTION_SET_CATEGORY, ACTION_COMMAND,
+    COMMAND_LIST, COMMAND_CLEAR,
+)
+
+
+@pytest.mark.parametrize('text, action, item, quantity', [
+    ("חלב", ACTION_ADD, "חלב", 1),
+    ("חלב 2", ACTION_ADD, "חלב", 2),
+    ("3 ביצים", ACTION_ADD, "ביצים", 3),
+    ("קניתי חלב", ACTION_BUY, "חלב", 1),
+    ("מחק לחם 2", ACTION_REMOVE, "לחם", 2),
+    ("הסר ביצים 12", ACTION_REMOVE, "ביצים", 12),
+    ("7up 6", ACTION_ADD, "7up", 6),
+    ("חלב 3% 2", ACTION_ADD, "חלב 3%", 2),
+])
+def test_single_item(text, action, item, quantity):
+    intent = parse_message(text)
+    assert (intent.action, intent.item, intent.quantity) == (action, item, quantity)
+
+
+def test_commands_ignore_spacing():
+    assert parse_message("  הצג   רשימה ").command == COMMAND_LIST
+    assert parse_message("נקה רשימה") == (ACTION_COMMAND, None, None, None, COMMAND_CLEAR, None)
+
+
+def test_item_with_category():
+    intent = parse_message("גבינה: מוצרי חלב")
+    assert (intent.action, intent.item, intent.category) == (ACTION_SET_CATEGORY, "גבינה", "מוצרי חלב")
+
+
+@pytest.mark.parametrize('text, quantity', [
+    ("חלב 1.5", 1.5),
+    ("חלב 1,5", 1.5),
+    ("חלב 0", None),
+    ("חלב 0,0", None),
+])
+def test_quantity(text, quantity):
+    assert parse_message(text).quantity == quantity
+    assert [intent.quantity for intent in parse_items(text)] == [quantity]
+
+
+@pytest.mark.parametrize('text, item, quantity, unit', [
+    ("חלב 2 ליטר", "חלב", 2, "ליטר"),
+    ("1,5 קילו עגבניות", "עגבניות", 1.5, 'ק"ג'),
+    ('עגבניות 2 ק"ג', "עגבניות", 2, 'ק"ג'),
+    ("ביצים 12 יחידות", "ביצים", 12, "יחידות"),
+    ("חלב 2", "חלב", 2, None),
+    ("ליטר חלב", "ליטר חלב", 1, None),
+])
+def test_unit(text, item, quantity, unit):
+    intent = parse_message(text)
+    assert (intent.item, intent.quantity, intent.unit) == (item, quantity, unit)
+
+
+def test_bulk_items():
+    intents = parse_items("חלב 2, לחם\nביצים 12")
+    assert [(intent.action, intent.item, intent.quantity) for intent in intents] == [
+        (ACTION_ADD, "חלב", 2), (ACTION_ADD, "לחם", 1), (ACTION_ADD, "ביצים", 12),
+    ]
+
+
+def test_bulk_decimal_comma_is_not_a_separator():
+    intents = parse_items("חלב 1,5 ליטר, לחם 2,גבינה")
+    assert [(intent.item, intent.quantity, intent.unit) for intent in intents] == [
+        ("חלב", 1.5, "ליטר"), ("לחם", 2, None), ("גבינה", 1, None),
+    ]
+
+
+def test_bulk_remove_word_applies_to_every_item():
+    assert {intent.action for intent in parse_items("קניתי חלב, לחם")} == {ACTION_BUY}
+
+
+def test_bulk_splits_known_items_on_vav():
+    known = {"חלב", "לחם", "ופל"}
+    assert [intent.item for intent in parse_items("חלב ולחם", known.__contains__)] == ["חלב", "לחם"]
+    assert [intent.item for intent in parse_items("חלב ופל", known.__contains__)] == ["חלב ופל"]
@@ -0,0 +1,110 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from list_sync import ListSync  # noqa: E402
+from shopping_list import ShoppingList  # noqa: E402
+
+
+def replica(directory, name, shopping_list=None, merge=False):
+    sync = ListSync(str(directory), name)
+    shopping_list = shopping_list if shopping_list is not None else sync.materialize()
+    sync.attach(shopping_list, merge=merge)
+    return sync, shopping_list
+
+
+def sync_all(*syncs):
+    # שני סבבים: כל עותק כותב את השינויים שלו, ואז כל עותק קורא את של האחרים
+    for _ in range(2):
+        for sync in syncs:
+            sync.sync()
+
+
+def contents(shopping_list):
+    return {name: (item.quantity, item.category) for name, item in shopping_list.items.items()}
+
+
+def test_replicas_converge(tmp_path):
+    bot, bot_list = replica(tmp_path, "bot")
+    gui, gui_list = replica(tmp_path, "gui")
+    bot_list.add_item("חלב", 2, "מוצרי חלב")
+    gui_list.add_item("לחם")
+    sync_all(bot, gui)
+    assert contents(bot_list) == contents(gui_list) == {"חלב": (2, "מוצרי חלב"), "לחם": (1, None)}
+
+
+def test_higher_lamport_clock_wins(tmp_path):
+    bot, bot_list = replica(tmp_path, "bot")
+    gui, gui_list = replica(tmp_path, "gui")
+    bot_list.add_item("חלב")
+    sync_all(bot, gui)
+    # שני שינויים בבוט מול שינוי אחד בממשק: החותמת של הבוט גבוהה יותר
+    bot_list.add_item("חלב", 1)
+    bot_list.add_item("חלב", 1)
+    gui_list.add_item("חלב", 9)
+    sync_all(bot, gui)
+    assert contents(bot_list) == contents(gui_list) == {"חלב": (3, None)}
+
+
+def test_equal_clocks_are_broken_by_replica_id(tmp_path):
+    bot, bot_list = replica(tmp_path, "bot")
+    gui, gui_list = replica(tmp_path, "gui")
+    bot_list.add_item("חלב", 2)
+    gui_list.add_item("חלב", 5)
+    sync_all(bot, gui)
+    assert contents(bot_list) == contents(gui_list) == {"חלב": (5, None)}
+
+
+def test_tombstone_is_not_overwritten_by_an_older_state(tmp_path):
+    bot, bot_list = replica(tmp_path, "bot")
+    gui, gui_list = replica(tmp_path, "gui")
+    gui_list.add_item("חלב")
+    sync_all(gui, bot)
+    bot_list.add_item("חלב", 1)
+    bot_list.remove_item("חלב", 2)
+    gui_list.set_category("חלב", "מוצרי חלב")
+    sync_all(bot, gui)
+    assert bot_list.items == gui_list.items == {}
+    # הוספה חדשה אחרי המחיקה גוברת עליה
+    gui_list.add_item("חלב")
+    sync_all(gui, bot)
+    assert "חלב" in bot_list.items
+
+
+def test_concurrent_removals_do_not_go_negative(tmp_path):
+    bot, bot_list = replica(tmp_path, "bot")
+    gui, gui_list = replica(tmp_path, "gui")
+    bot_list.add_item("חלב", 2)
+    sync_all(bot, gui)
+    bot_list.remove_item("חלב", 2)
+    gui_list.remove_item("חלב", 2)
+    sync_all(bot, gui)
+    assert bot_list.items == gui_list.items == {}
+
+
+def test_state_survives_a_restart(tmp_path):
+    bot, bot_list = replica(tmp_path, "bot")
+    gui, gui_list = replica(tmp_path, "gui")
+    bot_list.add_item("חלב")
+    sync_all(bot, gui)
+    gui_list.add_item("לחם")
+    gui.sync()
+
+    bot, bot_list = replica(tmp_path, "bot")
+    assert contents(bot_list) == {"חלב": (1, None)}
+    assert bot.sync() == 1
+    assert contents(bot_list) == {"חלב": (1, None), "לחם": (1, None)}
+
+
+def test_attach_with_merge_keeps_remote_items(tmp_path):
+    bot, bot_list = replica(tmp_path, "bot")
+    gui, _ = replica(tmp_path, "gui")
+    bot_list.add_item("חלב")
+    sync_all(bot, gui)
+
+    loaded = ShoppingList()
+    loaded.add_item("לחם")
+    gui.attach(loaded, merge=True)
+    sync_all(gui, bot)
+    assert contents(loaded) == contents(bot_list) == {"לחם": (1, None), "חלב": (1, None)}
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbound  # noqa: E402
+from outbound import OutboundQueue, TelegramRateLimiter, TokenBucket  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(outbound.time, 'monotonic', clock)
+    return clock
+
+
+# בוט מזויף: רושם כל קריאה, ונכשל לפי התור failures של כל פעולה
+class FakeBot:
+    def __init__(self, **failures):
+        self.calls = []
+        self.failures = {method: list(errors) for method, errors in failures.items()}
+
+    async def _call(self, method, **kwargs):
+        self.calls.append((method, kwargs))
+        errors = self.failures.get(method)
+        if errors:
+            raise errors.pop(0)
+        return len(self.calls)
+
+    async def send_message(self, **kwargs):
+        return await self._call('send_message', **kwargs)
+
+    async def edit_message_text(self, **kwargs):
+        return await self._call('edit_message_text', **kwargs)
+
+
+def test_token_bucket_allows_a_burst_then_paces(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.delay() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.delay() == 0.5
+    assert bucket.delay() == 1.0
+    clock.now += 10
+    assert bucket.refilled(clock.now)
+    assert bucket.delay() == 0.0
+
+
+def run_limited(limiter, callback, chat_id=1, rate_limit_args=None):
+    async def run():
+        return await limiter.process_request(callback, (), {}, 'sendMessage', {'chat_id': chat_id}, rate_limit_args)
+    return asyncio.run(run())
+
+
+def test_rate_limiter_retries_after_429():
+    attempts = []
+
+    async def callback():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RetryAfter(0)
+        return "sent"
+
+    assert run_limited(TelegramRateLimiter(), callback) == "sent"
+    assert len(attempts) == 3
+
+
+def test_rate_limiter_gives_up_after_max_retries():
+    attempts = []
+
+    async def callback():
+        attempts.append(1)
+        raise RetryAfter(0)
+
+    with pytest.raises(RetryAfter):
+        run_limited(TelegramRateLimiter(max_retries=1), callback)
+    assert len(attempts) == 2
+
+
+def test_rate_limiter_does_not_retry_other_errors():
+    attempts = []
+
+    async def callback():
+        attempts.append(1)
+        raise NetworkError("down")
+
+    with pytest.raises(NetworkError):
+        run_limited(TelegramRateLimiter(), callback)
+    assert len(attempts) == 1
+
+
+def test_refilled_chat_buckets_are_dropped(clock):
+    limiter = TelegramRateLimiter()
+    for chat_id in range(100):
+        limiter._chat_bucket(str(chat_id)).delay()
+    clock.now += 60
+    limiter._chat_bucket("new")
+    assert list(limiter._chat_buckets) == ["new"]
+
+
+def run_queue(bot, submit):
+    """Run submit(queue) on a queue bound to a fresh loop and wait for every job"""
+    async def run():
+        queue = OutboundQueue(bot, backoff=0).start(asyncio.get_running_loop())
+        futures = submit(queue)
+        await queue.drain()
+        return futures
+    return asyncio.run(run())
+
+
+def test_queue_sends_each_chat_in_order():
+    bot = FakeBot()
+    run_queue(bot, lambda queue: [queue.send_message(1, "א"), queue.send_message(2, "ב"), queue.send_message(1, "ג")])
+    assert [kwargs['text'] for _, kwargs in bot.calls if kwargs['chat_id'] == 1] == ["א", "ג"]
+
+
+def test_queue_coalesces_pending_edits():
+    bot = FakeBot()
+    futures = run_queue(bot, lambda queue: [queue.edit_message_text(1, 7, text) for text in ("1", "2", "3")])
+    assert [kwargs['text'] for _, kwargs in bot.calls] == ["3"]
+    assert {future.result() for future in futures} == {1}
+
+
+def test_queue_retries_network_errors_only():
+    bot = FakeBot(send_message=[NetworkError("timeout"), NetworkError("timeout")])
+    [future] = run_queue(bot, lambda queue: [queue.send_message(1, "חלב")])
+    assert future.result() == 3
+
+    bot = FakeBot(send_message=[BadRequest("chat not found")])
+    [future] = run_queue(bot, lambda queue: [queue.send_message(1, "חלב")])
+    with pytest.raises(BadRequest):
+        future.result()
+    assert len(bot.calls) == 1
@@ -0,0 +1,64 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefix_index import PrefixIndex  # noqa: E402
+
+ITEMS = [
+    ("גבינה צהובה", "מוצרי חלב"),
+    ("גבינה לבנה", "מוצרי חלב"),
+    ("גזר", "ירקות"),
+    ("חלב", "מוצרי חלב"),
+    ("לחם", "מאפים"),
+]
+
+
+def test_complete_by_prefix_of_any_word():
+    index = PrefixIndex(ITEMS)
+    assert index.complete("גב") == ["גבינה לבנה", "גבינה צהובה"]
+    assert index.complete("צה") == ["גבינה צהובה"]
+    assert index.complete("ג", limit=2) == ["גבינה לבנה", "גבינה צהובה"]
+    assert index.complete("") == []
+    assert index.complete("קפה") == []
+
+
+def test_label_matches_come_after_name_matches():
+    index = PrefixIndex(ITEMS)
+    assert index.complete("מוצ") == ["גבינה לבנה", "גבינה צהובה", "חלב"]
+    assert index.complete("ח") == ["חלב", "גבינה לבנה", "גבינה צהובה"]
+
+
+def test_complete_folds_final_letters_and_spacing():
+    index = PrefixIndex([("לחם מלא", None)])
+    assert index.complete("לחמ") == ["לחם מלא"]
+    assert index.complete("לחם  מ") == ["לחם מלא"]
+
+
+def test_insert_and_delete():
+    index = PrefixIndex(ITEMS)
+    index.add("גבינת שמנת", "מוצרי חלב")
+    assert index.complete("גבינ") == ["גבינה לבנה", "גבינה צהובה", "גבינת שמנת"]
+    index.discard("גבינה לבנה")
+    assert index.complete("גבינ") == ["גבינה צהובה", "גבינת שמנת"]
+    assert "גבינה לבנה" not in index
+    assert len(index) == len(ITEMS)
+    index.discard("לא קיים")
+    assert len(index) == len(ITEMS)
+
+
+def test_adding_again_replaces_the_label():
+    index = PrefixIndex(ITEMS)
+    index.add("גזר", "פירות")
+    assert index.label("גזר") == "פירות"
+    assert index.complete("ירק") == []
+    assert index.complete("פיר") == ["גזר"]
+
+
+def test_incremental_index_matches_bulk_build():
+    incremental = PrefixIndex()
+    for name, label in reversed(ITEMS):
+        incremental.add(name, label)
+    bulk = PrefixIndex(ITEMS)
+    for prefix in ("ג", "גב", "ח", "מ", "ל", "צ"):
+        assert incremental.complete(prefix) == bulk.complete(prefix)
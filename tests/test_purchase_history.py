@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from purchase_history import PurchaseHistory, KIND_REMOVED, SECONDS_PER_DAY  # noqa: E402
+
+HOUSEHOLD = 'shared'
+
+
+def day(number, hour=12):
+    return number * SECONDS_PER_DAY + hour * 3600
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = PurchaseHistory(str(tmp_path / "history.db"))
+    yield history
+    history.close()
+
+
+def buy(history, name, *days, household=HOUSEHOLD):
+    for number in days:
+        history.record(household, [(name, 1)], at=day(number))
+
+
+def names(suggestions):
+    return [suggestion.name for suggestion in suggestions]
+
+
+def test_item_is_due_after_most_of_its_interval(history):
+    buy(history, "חלב", 0, 7, 14)
+    assert history.suggestions(HOUSEHOLD, now=day(20)) == []
+    [suggestion] = history.suggestions(HOUSEHOLD, now=day(21))
+    assert suggestion == ("חלב", 7.0, 7, 3)
+
+
+def test_item_needs_three_purchase_days(history):
+    buy(history, "חלב", 0, 7)
+    assert history.suggestions(HOUSEHOLD, now=day(30)) == []
+
+
+def test_purchases_on_the_same_day_count_once(history):
+    buy(history, "חלב", 0, 7, 7, 14)
+    [suggestion] = history.suggestions(HOUSEHOLD, now=day(21))
+    assert (suggestion.purchase_days, suggestion.interval_days) == (3, 7.0)
+
+
+def test_removed_items_are_not_purchases(history):
+    buy(history, "חלב", 0, 7)
+    history.record(HOUSEHOLD, [("חלב", 1)], KIND_REMOVED, at=day(14))
+    assert history.suggestions(HOUSEHOLD, now=day(30)) == []
+
+
+def test_most_overdue_first_without_excluded_items(history):
+    buy(history, "חלב", 0, 7, 14)
+    buy(history, "לחם", 10, 12, 14)
+    buy(history, "ביצים", 0, 10, 20)
+    assert names(history.suggestions(HOUSEHOLD, now=day(30))) == ["לחם", "חלב", "ביצים"]
+    assert names(history.suggestions(HOUSEHOLD, exclude={"לחם"}, limit=1, now=day(30))) == ["חלב"]
+
+
+def test_households_are_separate(history):
+    buy(history, "חלב", 0, 7, 14, household='a')
+    assert history.suggestions('b', now=day(30)) == []
+    assert names(history.suggestions('a', now=day(30))) == ["חלב"]
+
+
+def test_rebuild_fixes_events_recorded_out_of_order(history):
+    buy(history, "חלב", 14, 0, 7)
+    history.rebuild_rollups()
+    [suggestion] = history.suggestions(HOUSEHOLD, now=day(21))
+    assert (suggestion.purchase_days, suggestion.interval_days, suggestion.days_since) == (3, 7.0, 7)
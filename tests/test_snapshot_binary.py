@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot_binary  # noqa: E402
+from shopping_list import MappedCategoryDictionary, load_categories_file, save_categories_file  # noqa: E402
+
+
+@pytest.fixture
+def categories_filename(tmp_path):
+    filename = str(tmp_path / "categories.bin")
+    snapshot_binary.write_categories(filename, {"חלב": "מוצרי חלב", "לחם": "מאפים", "תפוח": "פירות"})
+    return filename
+
+
+def test_lookups_do_not_decode_the_whole_file(categories_filename, monkeypatch):
+    categories = load_categories_file(categories_filename)
+    assert isinstance(categories, MappedCategoryDictionary)
+    monkeypatch.setattr(snapshot_binary.MappedCategories, 'to_dict', None)
+    assert categories["חלב"] == "מוצרי חלב"
+    assert categories.get("גבינה") is None
+    assert "לחם" in categories
+    assert len(categories) == 3
+    categories.close()
+
+
+def test_changes_overlay_the_mapped_file(categories_filename):
+    categories = load_categories_file(categories_filename)
+    changes = []
+    categories.subscribe(lambda item_name, category: changes.append((item_name, category)))
+    categories["גבינה"] = "מוצרי חלב"
+    categories["חלב"] = "משקאות"
+    del categories["לחם"]
+    assert dict(categories) == {"גבינה": "מוצרי חלב", "חלב": "משקאות", "תפוח": "פירות"}
+    assert len(categories) == 3
+    assert "לחם" not in categories
+    assert changes == [("גבינה", "מוצרי חלב"), ("חלב", "משקאות"), ("לחם", None)]
+    with pytest.raises(KeyError):
+        del categories["לחם"]
+    categories.close()
+
+
+def test_save_remaps_the_new_file(categories_filename):
+    categories = load_categories_file(categories_filename)
+    categories["גבינה"] = "מוצרי חלב"
+    del categories["לחם"]
+    save_categories_file(categories_filename, categories)
+    assert categories["גבינה"] == "מוצרי חלב"
+    reloaded = load_categories_file(categories_filename)
+    assert dict(reloaded) == dict(categories) == {"גבינה": "מוצרי חלב", "חלב": "מוצרי חלב", "תפוח": "פירות"}
+    reloaded.close()
+    categories.close()
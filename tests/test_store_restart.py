@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shopping_list_journal import Journal, journal_filename, read_journal  # noqa: E402
+from shopping_list_store import ShoppingListStore, BACKEND_JOURNAL  # noqa: E402
+
+
+def run_session(list_filename, *names):
+    """Open the store, add names, close it, and return the items it had"""
+    store = ShoppingListStore(list_filename=list_filename, backend=BACKEND_JOURNAL)
+    shopping_list = store.get_list()
+    for name in names:
+        shopping_list.add_item(name)
+        store.mark_list_dirty()
+    items = list(shopping_list.items)
+    store.close()
+    return items
+
+
+def test_list_survives_restarts_before_first_compaction(tmp_path):
+    list_filename = str(tmp_path / "list.json")
+    run_session(list_filename, "חלב")
+    run_session(list_filename, "לחם")
+    assert not os.path.exists(list_filename)
+    assert run_session(list_filename) == ["חלב", "לחם"]
+    assert [record['seq'] for record in read_journal(journal_filename(list_filename))] == [1, 2]
+
+
+def test_records_after_a_torn_write_are_kept(tmp_path):
+    list_filename = str(tmp_path / "list.json")
+    run_session(list_filename, "חלב")
+    with open(journal_filename(list_filename), 'a', encoding='utf-8') as f:
+        f.write('{"seq": 2, "op": "ad')
+    run_session(list_filename, "לחם")
+    assert run_session(list_filename) == ["חלב", "לחם"]
+
+
+def test_a_corrupt_line_does_not_hide_later_records(tmp_path):
+    list_filename = str(tmp_path / "list.json")
+    run_session(list_filename, "חלב")
+    with open(journal_filename(list_filename), 'a', encoding='utf-8') as f:
+        f.write('not json\n')
+    run_session(list_filename, "לחם")
+    assert run_session(list_filename) == ["חלב", "לחם"]
+
+
+def test_a_failed_flush_is_retried_on_close(tmp_path, monkeypatch):
+    list_filename = str(tmp_path / "list.json")
+    store = ShoppingListStore(list_filename=list_filename, backend=BACKEND_JOURNAL)
+    store.get_list().add_item("חלב")
+    flush = Journal.flush
+
+    def failing_flush(journal):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Journal, 'flush', failing_flush)
+    with pytest.raises(OSError):
+        store.mark_list_dirty()
+    monkeypatch.setattr(Journal, 'flush', flush)
+    store.close()
+    assert run_session(list_filename) == ["חלב"]
+
+
+def test_the_delayed_flush_runs_on_the_event_loop(tmp_path):
+    list_filename = str(tmp_path / "list.json")
+    store = ShoppingListStore(list_filename=list_filename, backend=BACKEND_JOURNAL, flush_interval_ms=10)
+
+    async def change():
+        store.get_list().add_item("חלב")
+        store.mark_list_dirty()
+        assert list(read_journal(journal_filename(list_filename))) == []
+        await asyncio.sleep(0.05)
+        return [record['seq'] for record in read_journal(journal_filename(list_filename))]
+
+    assert asyncio.run(change()) == [1]
+    store.close()
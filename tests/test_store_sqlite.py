@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shopping_list_store import ShoppingListStore, BACKEND_SQLITE, SHARED_HOUSEHOLD, parse_households  # noqa: E402
+
+
+def open_store(tmp_path, **kwargs):
+    return ShoppingListStore(backend=BACKEND_SQLITE, database_filename=str(tmp_path / "lists.db"), **kwargs)
+
+
+def test_partners_share_one_household_by_default(tmp_path):
+    store = open_store(tmp_path, households=parse_households(None, ['111', ' 222', '']))
+    store.get_list(111).add_item("חלב")
+    assert "חלב" in store.get_list('222').items
+    assert store.household(222) == SHARED_HOUSEHOLD
+    assert store.lock(111) is store.lock(222)
+    assert "חלב" not in store.get_list(333).items
+    store.close()
+
+
+def test_households_spec_groups_chats():
+    assert parse_households("111,222; 333", ['111']) == {'111': '111', '222': '111', '333': '333'}
+
+
+def test_decimal_prices_are_stored(tmp_path):
+    store = open_store(tmp_path)
+    store.get_list(1).add_item("גבינה", 2, "מוצרי חלב", Decimal("12.90"))
+    store.mark_list_dirty(1)
+    store.close()
+    store = open_store(tmp_path)
+    assert store.get_list(1).items["גבינה"].total() == Decimal("25.80")
+    store.close()
+
+
+def test_idle_households_are_evicted(tmp_path):
+    store = open_store(tmp_path, max_households=2)
+
+    async def run():
+        lock = store.lock(1)
+        async with lock:
+            store.get_list(1)
+            watched = store.get_list(2)
+            watched.subscribe(lambda change: None)
+            store.get_list(3).add_item("לחם")
+            store.get_list(4)
+            store.get_list(5)
+            # 1 נעול ו-2 מאזינים לו, ולכן רק 3 ו-4 יצאו מהזיכרון
+            assert sorted(store.list_sizes()) == ['1', '2', '5']
+            assert store.get_list(2) is watched
+            assert store.lock(1) is lock
+        assert "לחם" in store.get_list(3).items
+
+    asyncio.run(run())
+    store.close()
+
+
+def test_seq_continues_after_reload(tmp_path):
+    store = open_store(tmp_path)
+    shopping_list = store.get_list(1)
+    shopping_list.add_item("חלב")
+    shopping_list.add_item("לחם")
+    shopping_list.remove_item("לחם")
+    seq = shopping_list.seq
+    store.mark_list_dirty(1)
+    store.close()
+    store = open_store(tmp_path)
+    assert store.get_list(1).seq == seq
+    store.close()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_server import (  # noqa: E402
+    SECRET_TOKEN_HEADER, HEALTH_PATH, METRICS_PATH, create_web_app, create_metrics_app, serve_webhook,
+)
+
+SECRET = 'test-secret'
+UPDATE = {'update_id': 1, 'message': {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': 'חלב'}}
+
+
+# Application מינימלי: רק מה שהשרת משתמש בו
+class FakeApplication:
+    def __init__(self):
+        self.update_queue = asyncio.Queue()
+        self.bot = None
+        self.running = False
+        self.calls = []
+        self.post_init = self._hook('post_init')
+        self.post_stop = self._hook('post_stop')
+        self.post_shutdown = self._hook('post_shutdown')
+
+    def _hook(self, name):
+        async def hook(application):
+            self.calls.append(name)
+        return hook
+
+    async def __aenter__(self):
+        self.calls.append('initialize')
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.calls.append('shutdown')
+
+    async def start(self):
+        self.running = True
+        self.calls.append('start')
+
+    async def stop(self):
+        self.running = False
+        self.calls.append('stop')
+
+
+def run_client(app, session):
+    """Run session(client) against app on a test server and return its result"""
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            return await session(client)
+    return asyncio.run(run())
+
+
+async def status(client, method, path, **kwargs):
+    async with client.request(method, path, **kwargs) as response:
+        return response.status
+
+
+def test_update_without_the_secret_is_rejected():
+    application = FakeApplication()
+
+    async def session(client):
+        assert await status(client, 'POST', '/telegram', json=UPDATE) == 403
+        assert await status(client, 'POST', '/telegram', json=UPDATE, headers={SECRET_TOKEN_HEADER: 'wrong'}) == 403
+
+    run_client(create_web_app(application, SECRET), session)
+    assert application.update_queue.empty()
+
+
+def test_valid_update_is_queued():
+    application = FakeApplication()
+
+    async def session(client):
+        assert await status(client, 'POST', '/telegram', json=UPDATE, headers={SECRET_TOKEN_HEADER: SECRET}) == 200
+
+    run_client(create_web_app(application, SECRET), session)
+    assert application.update_queue.get_nowait().message.text == 'חלב'
+
+
+def test_health_reports_whether_the_application_runs():
+    application = FakeApplication()
+
+    async def session(client):
+        assert await status(client, 'GET', HEALTH_PATH) == 503
+        application.running = True
+        async with client.get(HEALTH_PATH) as response:
+            assert response.status == 200
+            assert (await response.json())['status'] == 'ok'
+
+    run_client(create_web_app(application, SECRET), session)
+
+
+def test_metrics_are_not_on_the_public_app_without_a_token():
+    async def session(client):
+        assert await status(client, 'GET', METRICS_PATH) == 404
+
+    async def metrics_session(client):
+        assert await status(client, 'GET', METRICS_PATH) == 200
+
+    run_client(create_web_app(FakeApplication(), SECRET), session)
+    run_client(create_metrics_app(), metrics_session)
+
+
+def test_metrics_on_the_public_app_require_the_token():
+    async def session(client):
+        assert await status(client, 'GET', METRICS_PATH) == 403
+        assert await status(client, 'GET', METRICS_PATH, headers={'Authorization': 'Bearer wrong'}) == 403
+        assert await status(client, 'GET', METRICS_PATH, headers={'Authorization': 'Bearer metrics-token'}) == 200
+
+    run_client(create_web_app(FakeApplication(), SECRET, metrics_token='metrics-token'), session)
+
+
+def test_serve_webhook_runs_every_lifecycle_hook():
+    application = FakeApplication()
+
+    async def serve():
+        stop_event = asyncio.Event()
+        stop_event.set()
+        await serve_webhook(application, 'https://example.com/telegram', SECRET, host='127.0.0.1', port=0,
+                            register_webhook=False, stop_event=stop_event, metrics_port=0)
+
+    asyncio.run(serve())
+    assert application.calls == ['initialize', 'post_init', 'start', 'stop', 'post_stop', 'shutdown', 'post_shutdown']
@@ -0,0 +1,119 @@
+import asyncio
+import signal
+from aiohttp import web
+from telegram import Update
+import metrics
+
+# הכותרת שבה טלגרם שולח את הסוד שהוגדר ב-setWebhook
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+DEFAULT_WEBHOOK_PATH = '/telegram'
+HEALTH_PATH = '/health'
+METRICS_PATH = '/metrics'
+
+# בלי טוקן, /metrics לא נחשף בפורט הציבורי אלא בשרת נפרד שמאזין רק למחשב עצמו
+METRICS_HOST = '127.0.0.1'
+DEFAULT_METRICS_PORT = 9090
+
+
+# קבלת עדכון מטלגרם: בדיקת הסוד והכנסת העדכון לתור של ה-Application
+async def handle_update(request):
+    application = request.app['application']
+    secret_token = request.app['secret_token']
+    if secret_token and request.headers.get(SECRET_TOKEN_HEADER) != secret_token:
+        return web.Response(status=403)
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+    await application.update_queue.put(Update.de_json(data, application.bot))
+    return web.Response()
+
+
+# בדיקת חיות לשרת (למאזן העומסים או לפלטפורמה)
+async def handle_health(request):
+    application = request.app['application']
+    if not application.running:
+        return web.json_response({'status': 'starting'}, status=503)
+    return web.json_response({'status': 'ok', 'queued_updates': application.update_queue.qsize()})
+
+
+# מדדים בפורמט של Prometheus. בשרת הציבורי נדרשת כותרת Authorization: Bearer עם הטוקן;
+# שרת המדדים המקומי (בלי טוקן) עונה לכל בקשה שמגיעה אליו
+async def handle_metrics(request):
+    metrics_token = request.app['metrics_token']
+    if metrics_token and request.headers.get('Authorization') != f"Bearer {metrics_token}":
+        return web.Response(status=403)
+    return web.Response(text=metrics.REGISTRY.exposition(), content_type='text/plain', charset='utf-8')
+
+
+# בניית שרת ה-HTTP שמקבל עדכונים. /metrics נוסף אליו רק כשיש טוקן שמגן עליו.
+def create_web_app(application, secret_token=None, webhook_path=DEFAULT_WEBHOOK_PATH, metrics_token=None):
+    """Build the aiohttp app that feeds Telegram updates posted to webhook_path into application"""
+    app = web.Application()
+    app['application'] = application
+    app['secret_token'] = secret_token
+    app['metrics_token'] = metrics_token
+    app.router.add_post(webhook_path, handle_update)
+    app.router.add_get(HEALTH_PATH, handle_health)
+    if metrics_token:
+        app.router.add_get(METRICS_PATH, handle_metrics)
+    return app
+
+
+# שרת נפרד ל-/metrics בלבד, בשביל הפעלה בלי טוקן (מאזין ל-METRICS_HOST)
+def create_metrics_app():
+    """Build the aiohttp app that serves /metrics without authentication"""
+    app = web.Application()
+    app['metrics_token'] = None
+    app.router.add_get(METRICS_PATH, handle_metrics)
+    return app
+
+
+# הפעלת הבוט במצב webhook עד לקבלת SIGINT/SIGTERM
+async def serve_webhook(application, webhook_url, secret_token=None, host='0.0.0.0', port=8080,
+                        webhook_path=DEFAULT_WEBHOOK_PATH, register_webhook=True, stop_event=None,
+                        metrics_token=None, metrics_port=DEFAULT_METRICS_PORT):
+    """Run application behind a local HTTP server instead of long polling.
+
+    Without metrics_token, /metrics is served on METRICS_HOST:metrics_port (None turns it off).
+    """
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    runners = [(web.AppRunner(create_web_app(application, secret_token, webhook_path, metrics_token)), host, port)]
+    if not metrics_token and metrics_port is not None:
+        runners.append((web.AppRunner(create_metrics_app()), METRICS_HOST, metrics_port))
+    try:
+        async with application:
+            # כמו ב-run_polling: post_init רץ אחרי האתחול
+            if application.post_init:
+                await application.post_init(application)
+            if register_webhook:
+                await application.bot.set_webhook(
+                    url=webhook_url,
+                    secret_token=secret_token,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            await application.start()
+            try:
+                for runner, runner_host, runner_port in runners:
+                    await runner.setup()
+                    await web.TCPSite(runner, runner_host, runner_port).start()
+                await stop_event.wait()
+            finally:
+                for runner, _, _ in runners:
+                    await runner.cleanup()
+                await application.stop()
+                # כמו ב-run_polling: post_stop רץ אחרי העצירה
+                if application.post_stop:
+                    await application.post_stop(application)
+    finally:
+        # כמו ב-run_polling: post_shutdown רץ אחרי shutdown (היציאה מ-async with)
+        if application.post_shutdown:
+            await application.post_shutdown(application)